@@ -0,0 +1,25 @@
+"""
+Параметры фильтра строк для /analysis/* и /plots/*
+
+    ?genre=Rock,Pop&popularity_min=60&range=tempo:100:140&range=energy:0.5:
+"""
+from fastapi import HTTPException, Query
+from typing import List, Optional
+from backend.services.row_index import RowFilter
+
+
+def row_filter_params(
+        genre: Optional[str] = Query(None, description="Только эти жанры (через запятую)"),
+        popularity_min: Optional[float] = Query(None, description="Популярность не меньше"),
+        popularity_max: Optional[float] = Query(None, description="Популярность не больше"),
+        range: Optional[List[str]] = Query(
+            None, description="Диапазон признака: признак:min:max (границы можно опускать, "
+                              "параметр повторяется), например tempo:100:140"
+        )
+) -> RowFilter:
+    """Фильтр строк из параметров запроса (ошибки формата — 400)"""
+    genres = [value.strip() for value in genre.split(",") if value.strip()] if genre else None
+    try:
+        return RowFilter.parse(genres, popularity_min, popularity_max, range)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
@@ -7,9 +7,15 @@ import logging
 
 from backend.config import (
     API_TITLE, API_VERSION, API_DESCRIPTION,
-    CORS_ORIGINS, DATASET_PATH
+    CORS_ORIGINS, DATASET_PATH, DATASET_CACHE_ENABLED, SHARED_MEMORY_MODE,
+    ANALYSIS_PRECOMPUTE, MODEL_WARM_START
 )
 from backend.services.data_service import data_service
+from backend.services.analysis_service import analysis_service
+from backend.services.plot_service import plot_service
+from backend.services.prediction_batcher import prediction_batcher
+from backend.services.model_service import model_service
+from backend.services.training_pool import training_pool
 from backend.api.routes import data, analysis, plots, model
 
 # Настройка логирования
@@ -48,11 +54,39 @@ async def startup_event():
     """Загрузка данных при старте приложения"""
     logger.info("Запуск приложения...")
 
-    if data_service.load_dataset(DATASET_PATH):
+    # В режиме общей памяти датасет всегда открывается из кэша через mmap
+    use_cache = DATASET_CACHE_ENABLED or SHARED_MEMORY_MODE
+
+    if data_service.load_dataset(DATASET_PATH, use_cache=use_cache):
         logger.info("Датасет успешно загружен")
+
+        if ANALYSIS_PRECOMPUTE:
+            try:
+                analysis_service.precompute(data_service.get_dataframe(), data_service.version)
+                logger.info("Статистики для /analysis/* вычислены заранее")
+            except Exception as e:
+                logger.warning(f"Не удалось заранее вычислить статистики: {e}")
     else:
         logger.warning("Датасет не загружен. Поместите SpotifyFeatures.csv в папку data/")
 
+    if SHARED_MEMORY_MODE and model_service.is_trained():
+        logger.info("Подключены модели из общего хранилища")
+    elif MODEL_WARM_START:
+        # Модели из реестра: /model/predict доступен сразу, без переобучения
+        try:
+            if model_service.load_version():
+                logger.info("Модели загружены из реестра без переобучения")
+        except Exception as e:
+            logger.warning(f"Не удалось загрузить модели из реестра: {e}")
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Остановка пулов отрисовки и обучения и очереди предсказаний"""
+    plot_service.shutdown()
+    training_pool.shutdown()
+    prediction_batcher.shutdown()
+
 
 @app.get("/", tags=["Root"])
 def root():
@@ -64,21 +98,38 @@ def root():
         "dataset_loaded": data_service.is_loaded(),
         "endpoints": {
             "data": {
-                "GET /data/info": "Информация о датасете"
+                "GET /data/info": "Информация о датасете",
+                "POST /data/append": "Добавление треков (CSV) и дообучение моделей на них",
+                "POST /data/ingest?source=...": "Потоковая загрузка большого CSV по партициям жанров",
+                "GET /data/partitions": "Загруженные наборы партиций"
             },
             "analysis": {
-                "GET /analysis/distributions": "Анализ распределений",
-                "GET /analysis/correlations": "Корреляции признаков",
-                "GET /analysis/genres": "Анализ по жанрам"
+                "GET /analysis/distributions": "Анализ распределений (?partitions=<имя> — по партициям, "
+                                               "?genre=Rock&popularity_min=60&range=tempo:100:140 — по фильтру)",
+                "GET /analysis/correlations": "Корреляции признаков (?method=pearson|spearman|kendall, ?by_genre=true, фильтр строк)",
+                "GET /analysis/genres": "Анализ по жанрам (?genres=... — подмножество, ?partitions=<имя> — по партициям)",
+                "GET /analysis/groups?by=genre,mode": "Статистика признаков по группам жанра, тональности, лада, размера"
             },
             "plots": {
+                "GET /plots/*?genre=...&popularity_min=...&range=...": "Графики по строкам, отобранным фильтром",
                 "GET /plots/scatter": "График темп vs популярность",
                 "GET /plots/histogram": "Гистограмма громкости",
-                "GET /plots/heatmap": "Тепловая карта признаков"
+                "GET /plots/heatmap": "Тепловая карта признаков (?method=pearson|spearman|kendall)"
             },
             "model": {
-                "POST /model/train": "Обучение модели регрессии",
-                "GET /model/metrics": "Метрики модели"
+                "GET /model/backends": "Модели, доступные для обучения",
+                "POST /model/train?models=...": "Запуск обучения выбранных моделей (фоновая задача)",
+                "POST /model/train/streaming?source=...": "Потоковое обучение линейной регрессии (файлы больше памяти)",
+                "POST /model/tune": "Подбор гиперпараметров (successive halving, фоновая задача)",
+                "GET /model/tune/runs": "Подборы параметров и их пробы",
+                "GET /model/jobs": "Список задач обучения",
+                "GET /model/jobs/{job_id}": "Статус и прогресс задачи",
+                "POST /model/jobs/{job_id}/cancel": "Отмена задачи",
+                "GET /model/predict/stats": "Статистика микробатчинга и кэша предсказаний",
+                "POST /model/predict/batch": "Пакетное предсказание (JSON, NDJSON, CSV, Arrow)",
+                "GET /model/metrics": "Метрики модели",
+                "GET /model/versions": "Версии моделей в реестре",
+                "POST /model/versions/{version}/activate": "Переключение на сохранённую версию"
             }
         },
         "docs": "/docs",
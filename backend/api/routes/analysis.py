@@ -1,25 +1,55 @@
 """
 Эндпоинты для статистического анализа
 """
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
+from typing import List, Optional
+from backend.api.filters import row_filter_params
 from backend.services.data_service import data_service
 from backend.services.analysis_service import analysis_service
+from backend.services.correlation import CORRELATION_METHODS
+from backend.services.row_index import RowFilter
 
 router = APIRouter(prefix="/analysis", tags=["Analysis"])
 
 
 @router.get("/distributions")
-def analyze_distributions():
-
+def analyze_distributions(
+        partitions: Optional[str] = Query(
+            None, description="Набор партиций из POST /data/ingest (квантили приближённые)"
+        ),
+        row_filter: RowFilter = Depends(row_filter_params)
+):
+    """
+    Распределения громкости, темпа и танцевальности
+
+    С фильтром (?genre=Rock&popularity_min=60&range=tempo:100:140) —
+    только по отобранным строкам
+    """
     try:
+        if partitions is not None and row_filter:
+            raise HTTPException(status_code=400, detail="Фильтр строк не поддерживается для партиций")
+
+        if partitions is not None:
+            try:
+                dataset = data_service.open_partitions(partitions)
+            except FileNotFoundError as e:
+                raise HTTPException(status_code=404, detail=str(e))
+            return analysis_service.cached_partitioned('distributions', dataset)
+
         if not data_service.is_loaded():
             raise HTTPException(status_code=404, detail="Датасет не загружен")
 
+        if row_filter:
+            df = data_service.get_filtered_dataframe(row_filter)
+            return analysis_service.filtered('distributions', df, row_filter.to_dict())
+
         df = data_service.get_dataframe()
-        result = analysis_service.analyze_distributions(df)
+        result = analysis_service.cached('distributions', df, data_service.version)
 
         return result
 
+    except HTTPException:
+        raise
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
@@ -27,36 +57,112 @@ def analyze_distributions():
 
 
 @router.get("/correlations")
-def analyze_correlations():
+def analyze_correlations(
+        method: str = Query("pearson", description="pearson, spearman или kendall (по подвыборке строк)"),
+        by_genre: bool = Query(False, description="Добавить корреляции с популярностью внутри каждого жанра"),
+        row_filter: RowFilter = Depends(row_filter_params)
+):
 
     try:
+        if method not in CORRELATION_METHODS:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Неизвестный метод '{method}'. Доступны: {', '.join(CORRELATION_METHODS)}"
+            )
+
         if not data_service.is_loaded():
             raise HTTPException(status_code=404, detail="Датасет не загружен")
 
+        # Параметры по умолчанию не входят в ключ: совпадает с precompute
+        params = {}
+        if method != 'pearson':
+            params["method"] = method
+        if by_genre:
+            params["by_genre"] = True
+
+        if row_filter:
+            df = data_service.get_filtered_dataframe(row_filter)
+            return analysis_service.filtered('correlations', df, row_filter.to_dict(), **params)
+
         df = data_service.get_dataframe()
-        result = analysis_service.analyze_correlations(df)
+        result = analysis_service.cached('correlations', df, data_service.version, **params)
 
         return result
 
+    except HTTPException:
+        raise
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Внутренняя ошибка: {str(e)}")
 
 
+def _split(values: Optional[str]) -> Optional[List[str]]:
+    """Список из параметра через запятую (None — параметр не задан)"""
+    if not values:
+        return None
+    return [value.strip() for value in values.split(",") if value.strip()] or None
+
+
 @router.get("/genres")
-def analyze_genres():
+def analyze_genres(
+        partitions: Optional[str] = Query(
+            None, description="Набор партиций из POST /data/ingest вместо загруженного датасета"
+        ),
+        genres: Optional[str] = Query(None, description="Только эти жанры (через запятую)")
+):
 
     try:
+        params = {"genres": _split(genres)} if genres else {}
+
+        if partitions is not None:
+            try:
+                dataset = data_service.open_partitions(partitions)
+            except FileNotFoundError as e:
+                raise HTTPException(status_code=404, detail=str(e))
+            return analysis_service.cached_partitioned('genres', dataset, **params)
+
         if not data_service.is_loaded():
             raise HTTPException(status_code=404, detail="Датасет не загружен")
 
         df = data_service.get_dataframe()
-        result = analysis_service.analyze_genres(df)
+        result = analysis_service.cached('genres', df, data_service.version, **params)
 
         return result
 
+    except HTTPException:
+        raise
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Внутренняя ошибка: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Внутренняя ошибка: {str(e)}")
+
+
+@router.get("/groups")
+def analyze_groups(
+        by: str = Query("genre", description="Ключи группировки через запятую: genre, key, mode, time_signature"),
+        genres: Optional[str] = Query(None, description="Только эти жанры (через запятую)"),
+        features: Optional[str] = Query(None, description="Признаки через запятую (по умолчанию — все аудио)")
+):
+    """
+    Статистика признаков по группам: число треков, среднее, std и квартили
+
+    Например, ?by=genre,mode — по жанру и ладу; ?by=key&genres=Pop,Rock —
+    по тональности внутри двух жанров
+    """
+    try:
+        if not data_service.is_loaded():
+            raise HTTPException(status_code=404, detail="Датасет не загружен")
+
+        df = data_service.get_dataframe()
+        return analysis_service.cached(
+            'groups', df, data_service.version,
+            by=_split(by), genres=_split(genres), features=_split(features)
+        )
+
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Внутренняя ошибка: {str(e)}")
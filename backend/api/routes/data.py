@@ -1,10 +1,17 @@
 """
 Эндпоинты для работы с данными
 """
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Query, Request
+from starlette.concurrency import run_in_threadpool
+from backend.config import STREAM_CHUNK_SIZE
 from backend.services.data_service import data_service
+from backend.services.job_service import job_service
+from backend.services.model_service import model_service
+import logging
+import traceback
 
 router = APIRouter(prefix="/data", tags=["Data"])
+logger = logging.getLogger(__name__)
 
 
 @router.get("/info")
@@ -19,4 +26,105 @@ def get_data_info():
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Внутренняя ошибка: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Внутренняя ошибка: {str(e)}")
+
+
+@router.post("/append")
+async def append_data(
+        request: Request,
+        update_model: bool = Query(True, description="Дообучить модели на новых строках")
+):
+    """
+    Добавить новые треки к датасету
+
+    Тело запроса — CSV с колонками основного датасета. Строки сохраняются
+    в data/deltas/ и применяются при следующих запусках. Если модели
+    обучены, они дообучаются только на новых строках фоновой задачей
+    (GET /model/jobs/{job_id}), без полного переобучения. При нескольких
+    воркерах строки дописываются в общий кэш датасета, и остальные воркеры
+    подхватывают их так же, как опубликованные модели
+    """
+    try:
+        if not data_service.is_loaded():
+            raise HTTPException(status_code=404, detail="Датасет не загружен")
+
+        body = await request.body()
+        if not body:
+            raise HTTPException(status_code=400, detail="Пустое тело запроса: ожидается CSV")
+
+        delta, result = await run_in_threadpool(data_service.append_csv, body)
+
+        result["job"] = None
+        if update_model and model_service.is_trained():
+            dataset_version = result["dataset_version"]
+            job = job_service.submit(
+                "update",
+                lambda job: model_service.update_models(
+                    delta, progress=job.update, dataset_version=dataset_version
+                ),
+                params={"rows": int(len(delta)), "dataset_version": dataset_version}
+            )
+            result["job"] = job.to_dict()
+
+        return result
+
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Ошибка добавления строк: {e}")
+        logger.error(traceback.format_exc())
+        raise HTTPException(status_code=500, detail=f"Внутренняя ошибка: {str(e)}")
+
+
+@router.post("/ingest", status_code=202)
+def ingest_data(
+        source: str = Query(..., description="CSV или Parquet в папке data/"),
+        chunk_size: int = Query(STREAM_CHUNK_SIZE, ge=1000, le=10_000_000, description="Строк в порции")
+):
+    """
+    Потоковая загрузка файла, который не помещается в память
+
+    Файл читается порциями, очищается и раскладывается по жанрам
+    в data/partitions/<имя>/. Задача фоновая: прогресс — через
+    GET /model/jobs/{job_id}. Партиции используются в
+    GET /analysis/genres?partitions=<имя> и
+    POST /model/train/streaming?source=partitions/<имя>
+    """
+    try:
+        try:
+            path = data_service.resolve_source(source)
+        except FileNotFoundError as e:
+            raise HTTPException(status_code=404, detail=str(e))
+        if not path.is_file():
+            raise HTTPException(status_code=400, detail="Источник должен быть файлом CSV или Parquet")
+
+        job = job_service.submit(
+            "ingest",
+            lambda job: data_service.ingest_partitioned(
+                path, chunk_size=chunk_size,
+                progress=lambda value, message="": job.update("ingest", value, message)
+            ),
+            params={"source": source, "chunk_size": chunk_size}
+        )
+        return job.to_dict()
+
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Ошибка запуска потоковой загрузки: {e}")
+        logger.error(traceback.format_exc())
+        raise HTTPException(status_code=500, detail=f"Внутренняя ошибка: {str(e)}")
+
+
+@router.get("/partitions")
+def list_partitions():
+    """Наборы партиций, записанные POST /data/ingest"""
+    try:
+        return {"partitions": data_service.list_partitions()}
+
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Внутренняя ошибка: {str(e)}")
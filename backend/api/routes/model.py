@@ -1,12 +1,24 @@
 """
 Эндпоинты для работы с моделями ML
 """
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field
-from typing import Dict
+from starlette.concurrency import run_in_threadpool
+from typing import Dict, Optional, Tuple
+from backend.config import (
+    BATCH_CHUNK_SIZE, PREDICT_BATCHING, TUNING_CANDIDATES, TUNING_ETA, TUNING_MIN_ROWS,
+    DATASET_PATH, STREAM_CHUNK_SIZE
+)
 from backend.services.data_service import data_service
 from backend.services.model_service import model_service
+from backend.services.job_service import job_service
+from backend.services.model_backends import BACKENDS, resolve_models
+from backend.services.prediction_batcher import prediction_batcher
+from backend.services.tuning_service import tuning_service
+from backend.services import batch_predict
 import logging
+import numpy as np
 import traceback
 
 router = APIRouter(prefix="/model", tags=["Model"])
@@ -31,10 +43,54 @@ class PredictRequest(BaseModel):
     duration_ms: float = Field(..., ge=30000, le=600000, description="Длительность в мс")
 
 
-@router.post("/train")
-def train_model():
-    """Обучение модели регрессии популярности"""
+def _feature_ranges() -> Dict[str, Tuple[float, float]]:
+    """Допустимые диапазоны признаков из ограничений PredictRequest"""
+    schema_fn = getattr(PredictRequest, "model_json_schema", None) or PredictRequest.schema
+    ranges = {}
+    for name, field in schema_fn()["properties"].items():
+        ranges[name] = (field.get("minimum", -float("inf")), field.get("maximum", float("inf")))
+    return ranges
+
+
+# Проверка пакетных предсказаний использует те же диапазоны, что и /model/predict
+FEATURE_RANGES = _feature_ranges()
+
+
+@router.get("/backends")
+def list_backends():
+    """Модели, доступные для обучения (config.MODEL_BACKENDS), с параметрами подбора"""
+    applied = tuning_service.applied_params()
+    return {
+        "backends": [
+            {**backend.to_dict(), "params": {**backend.params, **applied.get(backend.key, {})},
+             "tuned": backend.key in applied}
+            for backend in BACKENDS.values()
+        ],
+        "default": [backend.key for backend in resolve_models()]
+    }
+
+
+@router.post("/train", status_code=202)
+def train_model(
+        models: Optional[str] = Query(
+            None, description="Ключи моделей через запятую (по умолчанию — DEFAULT_MODELS)"
+        )
+):
+    """
+    Запуск обучения модели регрессии популярности
+
+    Обучение выполняется в фоне: ответ сразу содержит job_id, а этап,
+    прогресс и результат доступны через GET /model/jobs/{job_id}
+    """
     try:
+        # Проверяем список моделей до постановки задачи в очередь
+        try:
+            keys = [key.strip() for key in models.split(",") if key.strip()] if models else None
+            backends = resolve_models(keys)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        model_keys = [backend.key for backend in backends]
+
         # Проверяем что датасет загружен
         if not data_service.is_loaded():
             logger.error("Попытка обучить модель без загруженного датасета")
@@ -53,34 +109,190 @@ def train_model():
                 detail="Колонка 'popularity' не найдена в датасете"
             )
 
-        logger.info(f"Начало обучения модели на датасете размером {len(df):,} строк")
+        logger.info(f"Запуск обучения модели на датасете размером {len(df):,} строк")
 
-        # Обучаем модель
-        result = model_service.train_models(df)
+        # Параметры, применённые подбором (POST /model/tune?apply=true)
+        tuned = tuning_service.applied_params()
 
-        logger.info(f"Модель успешно обучена. R² = {result['metrics']['random_forest']['r2_score']:.4f}")
+        # Ставим обучение в очередь фоновых задач
+        job = job_service.submit(
+            "train",
+            lambda job: model_service.train_models(
+                df, progress=job.update, dataset_version=data_service.version,
+                models=model_keys, params=tuned
+            ),
+            params={"target": "popularity", "rows": int(len(df)), "models": model_keys,
+                    "tuned_params": tuned}
+        )
 
-        return result
+        return job.to_dict()
 
     except HTTPException:
         raise
 
-    except ValueError as e:
-        logger.error(f"Ошибка валидации данных: {e}")
+    except Exception as e:
+        logger.error(f"Неожиданная ошибка при запуске обучения: {e}")
         logger.error(traceback.format_exc())
         raise HTTPException(
-            status_code=400,
-            detail=f"Ошибка в данных: {str(e)}"
+            status_code=500,
+            detail=f"Внутренняя ошибка сервера: {str(e)}"
+        )
+
+
+@router.post("/train/streaming", status_code=202)
+def train_model_streaming(
+        source: str = Query(
+            DATASET_PATH.name, description="CSV, Parquet или партиции (partitions/<имя>) в папке data/"
+        ),
+        chunk_size: int = Query(STREAM_CHUNK_SIZE, ge=1000, le=10_000_000, description="Строк в порции")
+):
+    """
+    Потоковое обучение линейной регрессии на файле любого размера
+
+    Файл читается порциями за один проход, в памяти накапливаются только
+    XᵀX и Xᵀy. Задача фоновая, как POST /model/train
+    """
+    try:
+        try:
+            path = data_service.resolve_source(source)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        except FileNotFoundError as e:
+            raise HTTPException(status_code=404, detail=str(e))
+
+        job = job_service.submit(
+            "train",
+            lambda job: model_service.train_linear_streaming(
+                path, progress=job.update, chunk_size=chunk_size
+            ),
+            params={"source": source, "chunk_size": chunk_size,
+                    "models": ["linear_regression"], "streaming": True}
+        )
+
+        return job.to_dict()
+
+    except HTTPException:
+        raise
+
+    except Exception as e:
+        logger.error(f"Неожиданная ошибка при запуске потокового обучения: {e}")
+        logger.error(traceback.format_exc())
+        raise HTTPException(status_code=500, detail=f"Внутренняя ошибка сервера: {str(e)}")
+
+
+@router.post("/tune", status_code=202)
+def tune_model(
+        model: str = Query("random_forest", description="Ключ модели из TUNING_SPACES"),
+        candidates: int = Query(TUNING_CANDIDATES, ge=1, le=500, description="Кандидатов на первой ступени"),
+        eta: int = Query(TUNING_ETA, ge=2, le=10, description="Коэффициент сокращения кандидатов"),
+        min_rows: int = Query(TUNING_MIN_ROWS, ge=100, description="Строк на первой ступени"),
+        warm_start: bool = Query(True, description="Использовать пробы прошлых подборов"),
+        apply: bool = Query(False, description="Подставить лучшие параметры в следующие обучения")
+):
+    """
+    Запуск подбора гиперпараметров (successive halving на подвыборках строк)
+
+    Подбор выполняется в фоне как задача обучения: прогресс — через
+    GET /model/jobs/{job_id}, пробы — через GET /model/tune/runs/{run_id}
+    """
+    try:
+        if not data_service.is_loaded():
+            raise HTTPException(
+                status_code=404,
+                detail="Датасет не загружен. Поместите SpotifyFeatures.csv в папку data/"
+            )
+
+        try:
+            tuning_service.check_model(model)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+        df = data_service.get_dataframe()
+        run_id = tuning_service.new_run_id()
+
+        job = job_service.submit(
+            "tune",
+            lambda job: tuning_service.tune(
+                df, model, n_candidates=candidates, eta=eta, min_rows=min_rows,
+                warm_start=warm_start, apply=apply, progress=job.update,
+                dataset_version=data_service.version, run_id=run_id
+            ),
+            params={"model": model, "candidates": candidates, "eta": eta,
+                    "min_rows": min_rows, "warm_start": warm_start, "apply": apply,
+                    "run_id": run_id}
         )
 
+        return job.to_dict()
+
+    except HTTPException:
+        raise
+
     except Exception as e:
-        logger.error(f"Неожиданная ошибка при обучении модели: {e}")
+        logger.error(f"Неожиданная ошибка при запуске подбора параметров: {e}")
         logger.error(traceback.format_exc())
+        raise HTTPException(status_code=500, detail=f"Внутренняя ошибка сервера: {str(e)}")
+
+
+@router.get("/tune/runs")
+def list_tuning_runs():
+    """Подборы параметров (новые первыми)"""
+    try:
+        return {"runs": tuning_service.list_runs()}
+
+    except Exception as e:
+        logger.error(f"Ошибка чтения подборов параметров: {e}")
+        raise HTTPException(status_code=500, detail=f"Внутренняя ошибка: {str(e)}")
+
+
+@router.get("/tune/runs/{run_id}")
+def get_tuning_run(run_id: str):
+    """Подбор параметров со всеми пробами"""
+    try:
+        return tuning_service.get_run(run_id)
+
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Подбор '{run_id}' не найден")
+
+
+@router.get("/jobs")
+def list_jobs():
+    """Список задач обучения (новые первыми)"""
+    return {"jobs": job_service.list_jobs()}
+
+
+@router.get("/jobs/{job_id}")
+def get_job(job_id: str):
+    """Статус, этап, прогресс и результат задачи"""
+    try:
+        return job_service.get(job_id).to_dict()
+
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Задача '{job_id}' не найдена")
+
+
+@router.post("/jobs/{job_id}/cancel")
+def cancel_job(job_id: str):
+    """
+    Отмена задачи
+
+    Выполняющееся обучение останавливается на ближайшей контрольной точке
+    (между этапами и порциями деревьев), текущие модели не меняются
+    """
+    try:
+        job = job_service.get(job_id)
+
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Задача '{job_id}' не найдена")
+
+    if not job.cancel():
         raise HTTPException(
-            status_code=500,
-            detail=f"Внутренняя ошибка сервера: {str(e)}"
+            status_code=409,
+            detail=f"Задача '{job_id}' уже завершена со статусом '{job.status}'"
         )
 
+    logger.info(f"Запрошена отмена задачи {job_id}")
+    return job.to_dict()
+
 
 @router.get("/metrics")
 def get_model_metrics():
@@ -105,12 +317,49 @@ def get_model_metrics():
         )
 
 
+@router.get("/versions")
+def list_model_versions():
+    """Версии моделей в реестре (новые первыми)"""
+    try:
+        return {
+            "current": model_service.model_version,
+            "versions": model_service.list_versions()
+        }
+
+    except Exception as e:
+        logger.error(f"Ошибка чтения реестра моделей: {e}")
+        raise HTTPException(status_code=500, detail=f"Внутренняя ошибка: {str(e)}")
+
+
+@router.post("/versions/{version}/activate")
+def activate_model_version(version: str):
+    """Переключиться на сохранённую версию модели без переобучения"""
+    try:
+        model_service.load_version(version)
+        return {
+            "status": "success",
+            "model_version": model_service.model_version,
+            "best_model": model_service.best_model,
+            "metrics": model_service.get_metrics()
+        }
+
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+    except Exception as e:
+        logger.error(f"Ошибка переключения версии модели: {e}")
+        logger.error(traceback.format_exc())
+        raise HTTPException(status_code=500, detail=f"Внутренняя ошибка: {str(e)}")
+
+
 @router.post("/predict")
-def predict_popularity(request: PredictRequest):
+async def predict_popularity(request: PredictRequest):
     """
     Предсказание популярности трека по его характеристикам
 
-    Принимает аудио-характеристики трека и возвращает предсказанную популярность
+    Принимает аудио-характеристики трека и возвращает предсказанную популярность.
+    Одновременные запросы объединяются в порции (микробатчинг) и считаются
+    одним векторным вызовом модели
     """
     try:
         # Проверяем что модель обучена
@@ -127,7 +376,10 @@ def predict_popularity(request: PredictRequest):
         logger.info(f"Запрос на предсказание с параметрами: {features_dict}")
 
         # Делаем предсказание
-        prediction_result = model_service.predict_single(features_dict)
+        if PREDICT_BATCHING:
+            prediction_result = await prediction_batcher.submit(features_dict)
+        else:
+            prediction_result = await run_in_threadpool(model_service.predict_single, features_dict)
 
         logger.info(f"Предсказание выполнено: {prediction_result['predicted_popularity']:.2f}")
 
@@ -149,4 +401,110 @@ def predict_popularity(request: PredictRequest):
         raise HTTPException(
             status_code=500,
             detail=f"Внутренняя ошибка: {str(e)}"
-        )
\ No newline at end of file
+        )
+
+
+@router.get("/predict/stats")
+def get_predict_stats():
+    """
+    Статистика /model/predict: задержки p50/p99 и размеры порций микробатчинга,
+    попадания и промахи кэша предсказаний
+    """
+    return {
+        "enabled": PREDICT_BATCHING,
+        **prediction_batcher.stats(),
+        "cache": model_service.prediction_cache.stats()
+    }
+
+
+@router.post("/predict/batch")
+async def predict_popularity_batch(
+        request: Request,
+        format: str = Query("ndjson", description="Формат ответа: ndjson, csv или json")):
+    """
+    Пакетное предсказание популярности
+
+    Тело запроса — JSON-массив объектов, NDJSON, CSV или Apache Arrow
+    (формат определяется по Content-Type). Строки проверяются и считаются
+    порциями, результаты отдаются потоком по мере готовности: для каждой
+    строки её номер, track_id (если передан) и предсказание или ошибка
+    """
+    try:
+        if not model_service.is_trained():
+            raise HTTPException(
+                status_code=404,
+                detail="Модель не обучена. Сначала обучите модель через POST /model/train"
+            )
+
+        if format not in batch_predict.OUTPUT_FORMATS:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Неподдерживаемый формат '{format}'. "
+                       f"Доступны: {', '.join(batch_predict.OUTPUT_FORMATS)}"
+            )
+
+        try:
+            input_format = batch_predict.resolve_input_format(request.headers.get("content-type"))
+        except ValueError as e:
+            raise HTTPException(status_code=415, detail=str(e))
+
+        body = await request.body()
+        features, model_used, model_version, predict = model_service.batch_predictor()
+        frames = batch_predict.iter_frames(body, input_format, features, BATCH_CHUNK_SIZE)
+
+        # Первая порция разбирается до начала ответа: ошибки формата
+        # и отсутствующие колонки возвращаются как 400
+        first_frame = await run_in_threadpool(next, frames, None)
+
+        def stream():
+            offset = 0
+            frame = first_frame
+            if format == "json":
+                yield "["
+
+            try:
+                while frame is not None:
+                    X, valid, errors = batch_predict.validate_frame(frame, features, FEATURE_RANGES)
+                    predictions = np.zeros(len(frame), dtype=np.float64)
+                    if valid.any():
+                        predictions[valid] = predict(X[valid])
+
+                    ids = frame[batch_predict.ID_COLUMN].to_numpy() \
+                        if batch_predict.ID_COLUMN in frame.columns else None
+                    yield batch_predict.format_chunk(
+                        format, offset, ids, predictions, errors, first=offset == 0
+                    )
+
+                    offset += len(frame)
+                    frame = next(frames, None)
+
+            except Exception as e:
+                # Статус ответа уже отправлен: ошибка передаётся последней записью
+                logger.error(f"Ошибка пакетного предсказания после {offset} строк: {e}")
+                yield batch_predict.format_error(format, offset, str(e))
+
+            if format == "json":
+                yield "]"
+
+            logger.info(f"Пакетное предсказание: {offset:,} строк (модель: {model_used})")
+
+        return StreamingResponse(
+            stream(),
+            media_type=batch_predict.OUTPUT_FORMATS[format],
+            headers={
+                "X-Model-Used": model_used,
+                "X-Model-Version": str(model_version)
+            }
+        )
+
+    except HTTPException:
+        raise
+
+    except ValueError as e:
+        logger.error(f"Ошибка в данных пакетного предсказания: {e}")
+        raise HTTPException(status_code=400, detail=f"Ошибка в данных: {str(e)}")
+
+    except Exception as e:
+        logger.error(f"Ошибка пакетного предсказания: {e}")
+        logger.error(traceback.format_exc())
+        raise HTTPException(status_code=500, detail=f"Внутренняя ошибка: {str(e)}")
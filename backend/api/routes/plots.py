@@ -1,17 +1,120 @@
 """
 Эндпоинты для генерации графиков
 """
-from fastapi import APIRouter, HTTPException
+import asyncio
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
 from fastapi.responses import JSONResponse
+from typing import Awaitable, Callable, Dict, Optional
+from backend.api.filters import row_filter_params
 from backend.services.data_service import data_service
-from backend.services.plot_service import plot_service
+from backend.services.plot_service import plot_service, IMAGE_FORMATS
 from backend.services.analysis_service import analysis_service
+from backend.services.correlation import CORRELATION_METHODS
+from backend.services.row_index import RowFilter
 
 router = APIRouter(prefix="/plots", tags=["Plots"])
 
+# Формат ответа: JSON с data URI (текущий frontend) или сама картинка
+FORMAT_QUERY = Query(
+    None,
+    description="json (data URI, по умолчанию), png, webp или svg. "
+                "Без параметра формат выбирается по заголовку Accept"
+)
+
+# MIME-типы из Accept, при которых отдаётся картинка без JSON-обёртки
+ACCEPT_FORMATS = {mime: image_format for image_format, mime in IMAGE_FORMATS.items()}
+ACCEPT_FORMATS["image/*"] = "png"
+
+
+def _resolve_format(request: Request, image_format: Optional[str]) -> str:
+    """Выбрать формат ответа по параметру format или заголовку Accept"""
+    if image_format:
+        if image_format != "json" and image_format not in IMAGE_FORMATS:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Неподдерживаемый формат '{image_format}'. "
+                       f"Доступны: json, {', '.join(IMAGE_FORMATS)}"
+            )
+        return image_format
+
+    for item in request.headers.get("accept", "").split(","):
+        mime = item.split(";")[0].strip().lower()
+        if mime in ACCEPT_FORMATS:
+            return ACCEPT_FORMATS[mime]
+        if mime in ("application/json", "*/*"):
+            break
+
+    return "json"
+
+
+def _filter_params(params: Dict, row_filter: RowFilter) -> Dict:
+    """Параметры графика с условиями фильтра (входят в ключ кэша)"""
+    return {**params, "filter": row_filter.to_dict()} if row_filter else params
+
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    """Проверить заголовок If-None-Match (список ETag или *)"""
+    if not if_none_match:
+        return False
+
+    if if_none_match.strip() == "*":
+        return True
+
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    # Для If-None-Match используется слабое сравнение
+    return any((tag[2:] if tag.startswith("W/") else tag) == etag for tag in candidates)
+
+
+async def _cached_image_response(request: Request, name: str, params: Dict,
+                                 render: Callable[[str], Awaitable[bytes]],
+                                 response_format: str = "json", persist: bool = True) -> Response:
+    """
+    Ответ с картинкой из кэша графиков
+
+    Картинка ищется по версии датасета, параметрам графика и формату.
+    Если клиент прислал совпадающий If-None-Match, возвращается 304 без тела.
+
+    Args:
+        request: Запрос
+        name: Имя графика
+        params: Параметры графика
+        render: Асинхронная функция отрисовки, принимает формат картинки
+        response_format: 'json' (data URI с PNG) или формат картинки
+        persist: Сохранять картинку на диск (False — только в памяти)
+    """
+    image_format = "png" if response_format == "json" else response_format
+    version = data_service.version
+    key = plot_service.cache.make_key(version, name, {**params, "format": image_format})
+    # JSON-обёртка и сама картинка — разные представления, у них разные ETag
+    etag_key = f"{key}-json" if response_format == "json" else key
+    headers = {
+        "ETag": plot_service.cache.etag(etag_key),
+        "Cache-Control": "no-cache",
+        "Vary": "Accept"
+    }
+
+    if _etag_matches(request.headers.get("if-none-match", ""), headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+
+    image = plot_service.cache.get(version, key, image_format)
+    if image is None:
+        image = await render(image_format)
+        plot_service.cache.put(version, key, image, image_format, persist=persist)
+
+    if response_format == "json":
+        return JSONResponse(content={"image": plot_service.to_data_uri(image)}, headers=headers)
+
+    return Response(content=image, media_type=IMAGE_FORMATS[image_format], headers=headers)
+
 
 @router.get("/scatter")
-def plot_scatter():
+async def plot_scatter(request: Request, format: Optional[str] = FORMAT_QUERY,
+                       mode: str = Query(
+                           "points",
+                           description="points — выборка 5000 точек, "
+                                       "density — растр плотности по всем трекам"
+                       ),
+                       row_filter: RowFilter = Depends(row_filter_params)):
     """График scatter: темп vs популярность"""
     try:
         if not data_service.is_loaded():
@@ -22,10 +125,22 @@ def plot_scatter():
         if 'tempo' not in df.columns or 'popularity' not in df.columns:
             raise HTTPException(status_code=404, detail="Необходимые колонки не найдены")
 
-        image = plot_service.create_scatter_plot(df, 'tempo', 'popularity')
-
-        return JSONResponse(content={"image": image})
-
+        if mode not in plot_service.SCATTER_MODES:
+            raise HTTPException(status_code=400, detail=f"Неизвестный режим '{mode}'")
+
+        # Строки фильтра отбираются только при промахе кэша графиков
+        return await _cached_image_response(
+            request, "scatter",
+            _filter_params({"x": "tempo", "y": "popularity", "sample_size": 5000, "mode": mode}, row_filter),
+            lambda image_format: plot_service.scatter_image_async(
+                data_service.get_filtered_dataframe(row_filter), 'tempo', 'popularity',
+                image_format=image_format, mode=mode
+            ),
+            _resolve_format(request, format), persist=not row_filter
+        )
+
+    except HTTPException:
+        raise
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
@@ -33,7 +148,8 @@ def plot_scatter():
 
 
 @router.get("/histogram")
-def plot_histogram():
+async def plot_histogram(request: Request, format: Optional[str] = FORMAT_QUERY,
+                         row_filter: RowFilter = Depends(row_filter_params)):
     """Гистограмма громкости"""
     try:
         if not data_service.is_loaded():
@@ -44,10 +160,16 @@ def plot_histogram():
         if 'loudness' not in df.columns:
             raise HTTPException(status_code=404, detail="Колонка 'loudness' не найдена")
 
-        image = plot_service.create_histogram(df, 'loudness')
-
-        return JSONResponse(content={"image": image})
+        return await _cached_image_response(
+            request, "histogram", _filter_params({"column": "loudness", "bins": 50}, row_filter),
+            lambda image_format: plot_service.histogram_image_async(
+                data_service.get_filtered_dataframe(row_filter), 'loudness', image_format=image_format
+            ),
+            _resolve_format(request, format), persist=not row_filter
+        )
 
+    except HTTPException:
+        raise
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
@@ -55,20 +177,42 @@ def plot_histogram():
 
 
 @router.get("/heatmap")
-def plot_heatmap():
+async def plot_heatmap(request: Request, format: Optional[str] = FORMAT_QUERY,
+                       method: str = Query("pearson", description="pearson, spearman или kendall"),
+                       row_filter: RowFilter = Depends(row_filter_params)):
     """Тепловая карта корреляций аудио-характеристик"""
     try:
+        if method not in CORRELATION_METHODS:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Неизвестный метод '{method}'. Доступны: {', '.join(CORRELATION_METHODS)}"
+            )
+
         if not data_service.is_loaded():
             raise HTTPException(status_code=404, detail="Датасет не загружен")
 
-        df = data_service.get_dataframe()
-
-        corr_matrix = analysis_service.get_correlation_matrix(df)
-        image = plot_service.create_heatmap(corr_matrix)
-
-        return JSONResponse(content={"image": image})
-
+        # Матрица по всем строкам — из кэша анализа (та же, что у
+        # /analysis/correlations); по отобранным фильтром — без кэша
+        version = data_service.version if not row_filter else None
+
+        async def render(image_format: str) -> bytes:
+            loop = asyncio.get_running_loop()
+            corr_matrix = await loop.run_in_executor(
+                None, lambda: analysis_service.get_correlation_matrix(
+                    data_service.get_filtered_dataframe(row_filter), method=method, version=version
+                )
+            )
+            return await plot_service.heatmap_image_async(corr_matrix, image_format)
+
+        return await _cached_image_response(
+            request, "heatmap",
+            _filter_params({"method": method} if method != "pearson" else {}, row_filter), render,
+            _resolve_format(request, format), persist=not row_filter
+        )
+
+    except HTTPException:
+        raise
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Внутренняя ошибка: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Внутренняя ошибка: {str(e)}")
@@ -9,6 +9,60 @@ PLOTS_DIR = BASE_DIR / "plots"
 # Датасет
 DATASET_PATH = DATA_DIR / "SpotifyFeatures.csv"
 
+# Кэш датасета (очищенные колонки в бинарном виде, открываются через mmap)
+DATASET_CACHE_ENABLED = True
+DATASET_CACHE_DIR = DATA_DIR / "cache"
+
+# Дополнения датасета (POST /data/append): исходные CSV новых строк сохраняются
+# в DELTAS_DIR/<имя CSV>/ и применяются поверх основного файла при каждом запуске
+DELTAS_DIR = DATA_DIR / "deltas"
+
+# Потоковое чтение CSV/Parquet, которые не помещаются в память: строк в порции
+STREAM_CHUNK_SIZE = 100_000
+
+# Потоковая загрузка (POST /data/ingest): CSV читается порциями и раскладывается
+# по колоночным частям в PARTITIONS_DIR/<имя CSV>/, по одной папке на жанр.
+# Часть записывается, когда в буфере жанра набирается PARTITION_PART_ROWS строк
+PARTITIONS_DIR = DATA_DIR / "partitions"
+PARTITION_COLUMN = 'genre'
+PARTITION_PART_ROWS = 100_000
+
+# Сливаемые сводки распределений по партициям (sketches.py): параметр точности
+# квантилей KLL (ошибка ранга ≈ 1.7% при 200) и потоков для сводок частей
+SKETCH_K = 200
+SKETCH_WORKERS = min(4, os.cpu_count() or 1)
+
+# Режим общей памяти для нескольких воркеров uvicorn (python run.py --workers N).
+# Датасет открывается из кэша через mmap, модели — из SHARED_DIR
+SHARED_MEMORY_MODE = os.environ.get("SPOTIFY_SHARED_MEMORY", "0") == "1"
+SHARED_DIR = DATA_DIR / "shared"
+# Сколько последних публикаций моделей хранить в SHARED_DIR
+SHARED_KEEP_VERSIONS = 3
+# Как часто воркер проверяет, не опубликованы ли новые модели и дополнения датасета (мс)
+SHARED_SYNC_INTERVAL_MS = 200
+
+# Кэш результатов /analysis/* (инвалидируется при смене версии датасета)
+ANALYSIS_CACHE_DIR = DATASET_CACHE_DIR / "analysis"
+ANALYSIS_CACHE_PERSIST = True
+ANALYSIS_PRECOMPUTE = True
+# Результаты с параметрами запроса (жанры, группы, признаки) — только в памяти, LRU
+ANALYSIS_CACHE_MEMORY_ITEMS = 128
+
+# Корреляции (correlation.py): Kendall считается по случайной подвыборке строк,
+# матрицы по жанрам — параллельно в потоках
+KENDALL_SAMPLE_SIZE = 20_000
+CORRELATION_WORKERS = min(4, os.cpu_count() or 1)
+
+# Кэш отрисованных графиков /plots/* (LRU в памяти + файлы на диске)
+PLOT_CACHE_DIR = PLOTS_DIR / "cache"
+PLOT_CACHE_SIZE = 64
+
+# Число процессов для отрисовки графиков (0 — рисовать в пуле потоков)
+PLOT_RENDER_WORKERS = min(4, os.cpu_count() or 1)
+
+# Размер растра (ширина, высота в корзинах) для scatter в режиме density
+PLOT_DENSITY_BINS = (600, 400)
+
 # API настройки
 API_TITLE = "Spotify Tracks Analysis API"
 API_VERSION = "1.0.0"
@@ -31,6 +85,124 @@ CORS_ORIGINS = [
 RANDOM_STATE = 42
 TEST_SIZE = 0.2
 N_ESTIMATORS = 100
+# Деревьев Random Forest за один шаг warm_start (шаг прогресса обучения)
+RF_PROGRESS_STEP = 10
+
+# Подключаемые модели: ключ → класс sklearn, тип и гиперпараметры.
+# kind: linear (коэффициенты), forest (среднее деревьев), boosting (сумма деревьев)
+MODEL_BACKENDS = {
+    "linear_regression": {
+        "label": "Linear Regression",
+        "estimator": "sklearn.linear_model.LinearRegression",
+        "kind": "linear",
+        "params": {}
+    },
+    "random_forest": {
+        "label": "Random Forest",
+        "estimator": "sklearn.ensemble.RandomForestRegressor",
+        "kind": "forest",
+        "params": {
+            "n_estimators": N_ESTIMATORS,
+            "max_depth": 15,
+            "min_samples_split": 10,
+            "min_samples_leaf": 4,
+            "n_jobs": -1,
+            "random_state": RANDOM_STATE
+        }
+    },
+    "hist_gradient_boosting": {
+        "label": "Hist Gradient Boosting",
+        "estimator": "sklearn.ensemble.HistGradientBoostingRegressor",
+        "kind": "boosting",
+        "params": {
+            "max_iter": 300,
+            "learning_rate": 0.1,
+            "max_leaf_nodes": 31,
+            "max_bins": 255,
+            "early_stopping": True,
+            "validation_fraction": 0.1,
+            "n_iter_no_change": 10,
+            "random_state": RANDOM_STATE
+        }
+    }
+}
+# Модели, которые обучаются, если задача обучения не указала свой список
+DEFAULT_MODELS = ["linear_regression", "random_forest", "hist_gradient_boosting"]
+
+# Кросс-валидация при обучении: число фолдов (0 — только отложенная выборка).
+# Лучшая модель выбирается по среднему R² на фолдах
+CV_FOLDS = 5
+# Процессов для параллельного обучения фолдов и моделей (0 — по очереди в текущем процессе)
+TRAINING_PROCESSES = min(4, os.cpu_count() or 1)
+# Матрица признаков для процессов обучения (открывается через mmap, а не копируется)
+TRAINING_DATA_DIR = DATASET_CACHE_DIR / "training"
+
+# Подбор гиперпараметров (/model/tune): successive halving на подвыборках строк.
+# Кандидаты выбираются из сетки; на каждой ступени остаётся 1/ETA лучших,
+# а число строк растёт в ETA раз, пока не дойдёт до всей обучающей выборки
+TUNING_SPACES = {
+    "random_forest": {
+        "n_estimators": [50, 100, 200],
+        "max_depth": [8, 12, 15, 20, None],
+        "min_samples_split": [2, 5, 10, 20],
+        "min_samples_leaf": [1, 2, 4, 8],
+        "max_features": [1.0, 0.5, "sqrt"]
+    },
+    "hist_gradient_boosting": {
+        "learning_rate": [0.03, 0.05, 0.1, 0.2],
+        "max_leaf_nodes": [15, 31, 63, 127],
+        "min_samples_leaf": [10, 20, 50, 100],
+        "l2_regularization": [0.0, 0.1, 1.0],
+        "max_bins": [63, 127, 255]
+    }
+}
+TUNING_CANDIDATES = 27
+TUNING_ETA = 3
+# Минимум строк на первой ступени
+TUNING_MIN_ROWS = 2000
+# Доля обучающей выборки, на которой оцениваются пробы
+TUNING_VALIDATION_FRACTION = 0.2
+# Сколько лучших конфигураций прошлых подборов добавлять к новым кандидатам
+TUNING_WARM_START_TOP = 5
+# Пробы и результаты подборов (SQLite)
+TUNING_DB_PATH = DATA_DIR / "tuning.sqlite"
+
+# Дообучение на новых строках (POST /data/append): модели обновляются только
+# по добавленным строкам. Линейная регрессия пересчитывается точно по достаточным
+# статистикам, к Random Forest добавляются деревья, к бустингу — итерации
+INCREMENTAL_RF_TREES = 10
+INCREMENTAL_BOOSTING_ITERATIONS = 20
+# Доля новых строк, отложенная для оценки дообучения: RMSE/R² до и после
+# считаются по ним, а не по строкам, на которых модели дообучались. Если
+# отложить меньше INCREMENTAL_HOLDOUT_MIN_ROWS строк, модели дообучаются на всех
+# новых строках, а метрики помечаются как посчитанные по обучающим строкам
+INCREMENTAL_HOLDOUT_FRACTION = 0.2
+INCREMENTAL_HOLDOUT_MIN_ROWS = 20
+
+# Реестр обученных моделей (версии на диске, активная загружается при старте)
+MODELS_DIR = DATA_DIR / "models"
+MODEL_REGISTRY_KEEP = 10
+MODEL_WARM_START = True
+
+# Пакетные предсказания: строк в одной порции разбора и инференса
+BATCH_CHUNK_SIZE = 8192
+
+# Микробатчинг /model/predict: одновременные запросы считаются одной порцией.
+# Порция закрывается через MAX_WAIT_MS после первого запроса или при MAX_SIZE строк
+PREDICT_BATCHING = True
+PREDICT_BATCH_MAX_WAIT_MS = 2.0
+PREDICT_BATCH_MAX_SIZE = 256
+
+# Кэш предсказаний /model/predict (LRU + TTL, ключ — версия модели и вектор
+# признаков, округлённый до DECIMALS знаков; None — без округления)
+PREDICT_CACHE_SIZE = 10000
+PREDICT_CACHE_TTL = 3600
+PREDICT_CACHE_DECIMALS = 4
+
+# Фоновые задачи: потоков для обучения моделей (обучения идут по очереди)
+TRAINING_WORKERS = 1
+# Сколько завершённых задач хранить для GET /model/jobs
+JOB_HISTORY_SIZE = 50
 
 # Аудио признаки
 AUDIO_FEATURES = [
@@ -45,12 +217,34 @@ AUDIO_FEATURES = [
     'valence'
 ]
 
+# Схема датасета: типы колонок, применяемые при чтении CSV.
+# Уменьшает объём памяти, который держит каждый воркер uvicorn
+DATASET_SCHEMA = {
+    **{feature: 'float32' for feature in AUDIO_FEATURES},
+    'popularity': 'int16',
+    'duration_ms': 'int32',
+    'genre': 'category',
+    'key': 'category',
+    'mode': 'category',
+    'time_signature': 'category'
+}
+
 # Признаки для модели
 MODEL_FEATURES = AUDIO_FEATURES + ['duration_ms', 'time_signature']
 
 # Признаки для анализа распределений
 DISTRIBUTION_FEATURES = ['loudness', 'tempo', 'danceability']
 
+# Ключи группировки /analysis/groups (категориальные колонки: группировка по кодам)
+GROUP_KEYS = ['genre', 'key', 'mode', 'time_signature']
+
+# Индекс строк для фильтров /analysis/* и /plots/* (row_index.py): если самое
+# избирательное условие оставляет больше этой доли строк, фильтр проверяется
+# маской по всем строкам, а не через индекс
+ROW_INDEX_SCAN_FRACTION = 0.25
+# Колонки, по которым можно фильтровать (индекс колонки строится при первом фильтре по ней)
+ROW_INDEX_COLUMNS = ['genre', 'popularity'] + AUDIO_FEATURES
+
 # Создание папок
 PLOTS_DIR.mkdir(exist_ok=True)
 DATA_DIR.mkdir(exist_ok=True)
\ No newline at end of file
@@ -6,10 +6,12 @@ from .data_service import data_service
 from .analysis_service import analysis_service
 from .plot_service import plot_service
 from .model_service import model_service
+from .job_service import job_service
 
 __all__ = [
     'data_service',
     'analysis_service',
     'plot_service',
-    'model_service'
+    'model_service',
+    'job_service'
 ]
\ No newline at end of file
@@ -1,47 +1,164 @@
 import pandas as pd
 import numpy as np
 from typing import Dict, List
-from backend.config import AUDIO_FEATURES, DISTRIBUTION_FEATURES
+from backend.config import (
+    AUDIO_FEATURES, DISTRIBUTION_FEATURES, GROUP_KEYS,
+    ANALYSIS_CACHE_DIR, ANALYSIS_CACHE_PERSIST, ANALYSIS_CACHE_MEMORY_ITEMS, SKETCH_K
+)
+from backend.services.correlation import correlation_by_group, correlation_matrix
+from backend.services.groupby import group_statistics
+from backend.services.partition_store import PartitionedDataset
+from backend.services.sketches import KLL_RANK_ERROR
+from backend.services.stats_cache import StatsCache
+from backend.services.stats_kernel import describe
 
 
 class AnalysisService:
 
+    # Анализы, результаты которых кэшируются по версии датасета
+    CACHED_ANALYSES = ('distributions', 'correlations', 'genres', 'groups')
+
+    def __init__(self):
+        self.cache = StatsCache(ANALYSIS_CACHE_DIR, persist=ANALYSIS_CACHE_PERSIST,
+                                max_transient=ANALYSIS_CACHE_MEMORY_ITEMS)
+        # Отдельный кэш для партиций: общий держит одну версию и сбрасывался бы
+        self.partition_cache = StatsCache(ANALYSIS_CACHE_DIR / "partitions", persist=ANALYSIS_CACHE_PERSIST,
+                                          max_transient=ANALYSIS_CACHE_MEMORY_ITEMS)
+
+    def cached(self, name: str, df: pd.DataFrame, version: str, **params) -> Dict:
+        """
+        Результат анализа из кэша (вычисляется при первом обращении)
+
+        Args:
+            name: 'distributions', 'correlations', 'genres' или 'groups'
+            df: Датафрейм
+            version: Токен версии датасета (DataService.version)
+            **params: Параметры анализа
+
+        Returns:
+            Dict: Результат соответствующего analyze_*
+        """
+        if name not in self.CACHED_ANALYSES:
+            raise ValueError(f"Неизвестный анализ: '{name}'")
+
+        analyze = getattr(self, f"analyze_{name}")
+        key = self.cache.make_key(name, params)
+        # На диск — только результаты без параметров (их и считает precompute)
+        persist = not params
+        if name == 'correlations':
+            # Матрица корреляций общая с /plots/heatmap и кэшируется отдельно
+            return self.cache.get_or_compute(
+                version, key, lambda: analyze(df, version=version, **params), persist=persist
+            )
+        return self.cache.get_or_compute(version, key, lambda: analyze(df, **params), persist=persist)
+
+    @classmethod
+    def _finite(cls, value):
+        """NaN и бесконечности → None (на малых подвыборках std, асимметрия
+        и корреляции бывают не определены, а JSON не допускает NaN)"""
+        if isinstance(value, dict):
+            return {key: cls._finite(item) for key, item in value.items()}
+        if isinstance(value, list):
+            return [cls._finite(item) for item in value]
+        if isinstance(value, float) and not np.isfinite(value):
+            return None
+        return value
+
+    def filtered(self, name: str, df: pd.DataFrame, conditions: Dict, **params) -> Dict:
+        """
+        Анализ строк, отобранных фильтром (DataService.get_filtered_dataframe)
+
+        Результат не кэшируется: сочетаний фильтров неограниченно много,
+        а отобранные индексом строки считаются быстро.
+
+        Args:
+            name: 'distributions', 'correlations', 'genres' или 'groups'
+            df: Отобранные строки
+            conditions: Условия фильтра (RowFilter.to_dict) для ответа
+            **params: Параметры анализа
+
+        Returns:
+            Dict: Результат analyze_* и сведения о фильтре
+        """
+        if name not in self.CACHED_ANALYSES:
+            raise ValueError(f"Неизвестный анализ: '{name}'")
+
+        result = getattr(self, f"analyze_{name}")(df, **params)
+        result["filter"] = {"conditions": conditions, "rows": int(len(df))}
+        return self._finite(result)
+
+    def precompute(self, df: pd.DataFrame, version: str):
+        """Заранее вычислить все кэшируемые анализы (при старте приложения)"""
+        for name in ('distributions', 'correlations', 'genres'):
+            self.cached(name, df, version)
+
+    DISTRIBUTION_INTERPRETATIONS = {
+        "loudness": "Громкость измеряется в дБ. Среднее значение показывает типичную громкость треков. Большинство современных треков имеют громкость около -7 dB.",
+        "tempo": "Темп в BPM (ударов в минуту) показывает ритмическую скорость композиции. Средний темп около 120 BPM соответствует популярной танцевальной музыке.",
+        "danceability": "Танцевальность от 0 до 1 показывает, насколько трек подходит для танцев на основе темпа, ритма и стабильности бита. Значение 0.6+ указывает на высокую танцевальность."
+    }
+
     @staticmethod
-    def analyze_distributions(df: pd.DataFrame, features: List[str] = None) -> Dict:
+    def _distribution_summary(described: Dict) -> Dict:
+        """Метрики analyze_distributions из результата stats_kernel.describe"""
+        return {
+            feature: {
+                "mean": values["mean"],
+                "median": values["q50"],
+                "std": values["std"],
+                "min": values["min"],
+                "max": values["max"],
+                "q25": values["q25"],
+                "q75": values["q75"],
+                "skewness": values["skewness"],
+                "kurtosis": values["kurtosis"]
+            }
+            for feature, values in described.items()
+        }
+
+    @classmethod
+    def analyze_distributions(cls, df: pd.DataFrame, features: List[str] = None) -> Dict:
 
         if features is None:
             features = DISTRIBUTION_FEATURES
 
-        stats = {}
-        interpretations = {
-            "loudness": "Громкость измеряется в дБ. Среднее значение показывает типичную громкость треков. Большинство современных треков имеют громкость около -7 dB.",
-            "tempo": "Темп в BPM (ударов в минуту) показывает ритмическую скорость композиции. Средний темп около 120 BPM соответствует популярной танцевальной музыке.",
-            "danceability": "Танцевальность от 0 до 1 показывает, насколько трек подходит для танцев на основе темпа, ритма и стабильности бита. Значение 0.6+ указывает на высокую танцевальность."
+        # Все признаки — одним проходом ядра статистики
+        available_features = [f for f in features if f in df.columns]
+
+        return {
+            "distributions": cls._distribution_summary(describe(df, available_features)),
+            "interpretation": cls.DISTRIBUTION_INTERPRETATIONS
         }
 
-        for feature in features:
-            if feature in df.columns:
-                series = df[feature].dropna()
-
-                stats[feature] = {
-                    "mean": float(series.mean()),
-                    "median": float(series.median()),
-                    "std": float(series.std()),
-                    "min": float(series.min()),
-                    "max": float(series.max()),
-                    "q25": float(series.quantile(0.25)),
-                    "q75": float(series.quantile(0.75)),
-                    "skewness": float(series.skew()),
-                    "kurtosis": float(series.kurtosis())
-                }
+    @classmethod
+    def analyze_distributions_partitioned(cls, dataset: PartitionedDataset,
+                                          features: List[str] = None) -> Dict:
+        """
+        Анализ распределений по партициям через сливаемые сводки
+
+        Среднее, std, асимметрия и эксцесс точные; квантили — по сводке
+        KLL с ошибкой ранга не больше KLL_RANK_ERROR (см. sketches.py)
+        """
+        if features is None:
+            features = DISTRIBUTION_FEATURES
+
+        available_features = [f for f in features if f in dataset.manifest["columns"]]
+        sketch = dataset.distribution_sketch(available_features)
 
         return {
-            "distributions": stats,
-            "interpretation": interpretations
+            "distributions": cls._distribution_summary(sketch.statistics()),
+            "interpretation": cls.DISTRIBUTION_INTERPRETATIONS,
+            "approximation": {
+                "quantiles": "kll",
+                "k": SKETCH_K,
+                "rank_error": KLL_RANK_ERROR,
+                "rows": dataset.rows
+            }
         }
 
-    @staticmethod
-    def analyze_correlations(df: pd.DataFrame, target: str = 'popularity') -> Dict:
+    def analyze_correlations(self, df: pd.DataFrame, target: str = 'popularity',
+                             method: str = 'pearson', by_genre: bool = False,
+                             version: str = None) -> Dict:
 
         available_features = [f for f in AUDIO_FEATURES if f in df.columns]
 
@@ -49,10 +166,12 @@ class AnalysisService:
             raise ValueError(f"Колонка '{target}' не найдена в датасете")
 
         # Вычисляем корреляции
-        correlations = df[available_features + [target]].corr()[target].drop(target)
+        matrix = self.get_correlation_matrix(df, available_features + [target], method, version)
+        correlations = matrix[target].drop(target)
 
-        # Сортируем
-        sorted_corr = correlations.sort_values(ascending=False)
+        # Сортируем; на малой выборке (фильтр строк) или у постоянной колонки
+        # корреляция не определена (NaN) и в рейтинг не попадает
+        sorted_corr = correlations.dropna().sort_values(ascending=False)
 
         # Интерпретация
         interpretation = """
@@ -64,32 +183,41 @@ class AnalysisService:
         Важно: корреляция не означает причинно-следственную связь!
         """
 
-        return {
+        result = {
+            "method": method,
             "correlations": correlations.to_dict(),
             "top_positive": sorted_corr.head(3).to_dict(),
             "top_negative": sorted_corr.tail(3).to_dict(),
             "interpretation": interpretation.strip(),
-            "strongest_correlation": {
-                "feature": sorted_corr.abs().idxmax(),
-                "value": float(correlations[sorted_corr.abs().idxmax()]),
-                "type": "положительная" if correlations[sorted_corr.abs().idxmax()] > 0 else "отрицательная"
-            }
+            "strongest_correlation": None
         }
 
-    @staticmethod
-    def analyze_genres(df: pd.DataFrame) -> Dict:
+        if not sorted_corr.empty:
+            strongest = sorted_corr.abs().idxmax()
+            value = float(correlations[strongest])
+            result["strongest_correlation"] = {
+                "feature": strongest,
+                "value": value,
+                "type": "положительная" if value > 0 else "отрицательная"
+            }
 
-        if 'genre' not in df.columns:
-            raise ValueError("Колонка 'genre' не найдена в датасете")
+        if by_genre and 'genre' in df.columns:
+            # Матрицы жанров считаются параллельно; в ответе — связь с целевой
+            by_group = correlation_by_group(df, 'genre', available_features + [target], method)
+            result["by_genre"] = {
+                genre: matrix[target].drop(target).to_dict() for genre, matrix in by_group.items()
+            }
+
+        return result
 
-        # Признаки для анализа
-        audio_features = ['danceability', 'energy', 'loudness', 'tempo', 'valence',
-                          'acousticness', 'instrumentalness', 'speechiness']
-        available_features = [f for f in audio_features if f in df.columns]
+    # Признаки для анализа жанров
+    GENRE_FEATURES = ['danceability', 'energy', 'loudness', 'tempo', 'valence',
+                      'acousticness', 'instrumentalness', 'speechiness']
 
-        # Статистика по жанрам
-        genre_stats = df.groupby('genre')[available_features].mean()
-        genre_counts = df['genre'].value_counts()
+    @staticmethod
+    def _genre_summary(genre_stats: pd.DataFrame, genre_counts: pd.Series,
+                       genres: list, total_tracks: int) -> Dict:
+        """Результат analyze_genres по средним и числу треков каждого жанра"""
 
         # Топ-5 жанров
         top_genres = genre_counts.head(5).index.tolist()
@@ -116,9 +244,9 @@ class AnalysisService:
         """
 
         return {
-            "genres": list(df['genre'].unique()),
-            "genre_count": int(df['genre'].nunique()),
-            "total_tracks": int(len(df)),
+            "genres": genres,
+            "genre_count": int(sum(pd.notna(genre) for genre in genres)),
+            "total_tracks": int(total_tracks),
             "genre_statistics": genre_stats.to_dict(),
             "genre_counts": genre_counts.to_dict(),
             "top_genres": top_genres,
@@ -126,9 +254,129 @@ class AnalysisService:
             "interpretation": interpretation.strip()
         }
 
-    @staticmethod
-    def get_correlation_matrix(df: pd.DataFrame, features: List[str] = None) -> pd.DataFrame:
+    @classmethod
+    def analyze_genres(cls, df: pd.DataFrame, genres: List[str] = None) -> Dict:
+
+        if 'genre' not in df.columns:
+            raise ValueError("Колонка 'genre' не найдена в датасете")
 
+        available_features = [f for f in cls.GENRE_FEATURES if f in df.columns]
+
+        # Средние по жанрам: группировка по кодам категорий
+        grouped = group_statistics(
+            df, ['genre'], available_features,
+            subset={'genre': genres} if genres else None, quantiles=(), variance=False
+        )
+        genre_stats = grouped.frame('mean')
+        genre_counts = grouped.count_series()
+        total_tracks = int(grouped.counts.sum()) if genres else len(df)
+
+        return cls._genre_summary(genre_stats, genre_counts, grouped.appearance, total_tracks)
+
+    @classmethod
+    def analyze_groups(cls, df: pd.DataFrame, by: List[str] = None, genres: List[str] = None,
+                       features: List[str] = None) -> Dict:
+        """
+        Статистика признаков по группам одного или нескольких ключей
+
+        Args:
+            df: Датафрейм
+            by: Ключи из GROUP_KEYS (по умолчанию — жанр)
+            genres: Оставить только эти жанры
+            features: Признаки (по умолчанию — AUDIO_FEATURES)
+
+        Returns:
+            Dict: Для каждой группы — значения ключей, число треков и
+            count/mean/std/q25/q50/q75 признаков (не определённые, например
+            std группы из одного трека, — None)
+        """
+        by = by or ['genre']
+        unknown = [key for key in by if key not in GROUP_KEYS]
+        if unknown:
+            raise ValueError(f"Группировка по {unknown} не поддерживается. Доступны: {GROUP_KEYS}")
+
+        features = [f for f in (features or AUDIO_FEATURES) if f in df.columns]
+        grouped = group_statistics(df, by, features, subset={'genre': genres} if genres else None)
+        metrics = ('count', 'mean', 'std', 'q25', 'q50', 'q75')
+
+        groups = []
+        for g, labels in enumerate(grouped.index):
+            labels = labels if isinstance(labels, tuple) else (labels,)
+            groups.append({
+                "key": {name: str(label) for name, label in zip(by, labels)},
+                "count": int(grouped.counts[g]),
+                "features": {
+                    feature: {
+                        metric: (int(grouped.stats[metric][g, j]) if metric == 'count'
+                                 else float(grouped.stats[metric][g, j]))
+                        for metric in metrics
+                    }
+                    for j, feature in enumerate(features)
+                }
+            })
+
+        return cls._finite({
+            "by": by,
+            "genres": genres,
+            "features": features,
+            "group_count": len(groups),
+            "total_tracks": int(grouped.counts.sum()),
+            "groups": groups
+        })
+
+    @classmethod
+    def analyze_genres_partitioned(cls, dataset: PartitionedDataset, genres: List[str] = None) -> Dict:
+        """
+        Анализ жанров по датасету, разложенному по партициям
+
+        Партиция — это один жанр, поэтому группировка не нужна: по каждой
+        части накапливаются суммы признаков и число строк. В памяти
+        одновременно одна часть, результат совпадает с analyze_genres.
+        """
+        if dataset.manifest["partition_by"] != 'genre':
+            raise ValueError("Партиции должны быть разложены по колонке 'genre'")
+
+        available_features = [f for f in cls.GENRE_FEATURES if f in dataset.manifest["columns"]]
+        genres = genres or dataset.genres()
+        sums = pd.DataFrame(0.0, index=genres, columns=available_features)
+        counts = pd.DataFrame(0, index=genres, columns=available_features)
+
+        for genre in genres:
+            for frame in dataset.iter_frames(available_features, genres=[genre]):
+                values = frame[available_features].astype(np.float64)
+                sums.loc[genre] += values.sum().to_numpy()
+                counts.loc[genre] += values.count().to_numpy()
+
+        rows = pd.Series(
+            {partition["value"]: partition["rows"] for partition in dataset.manifest["partitions"]
+             if partition["value"] in genres}
+        )
+        genre_stats = (sums / counts.where(counts > 0)).sort_index()
+        genre_stats.index.name = 'genre'
+        genre_counts = rows.sort_values(ascending=False, kind='stable')
+        genre_counts.name = 'count'
+
+        return cls._genre_summary(genre_stats, genre_counts, genres, int(rows.sum()))
+
+    def cached_partitioned(self, name: str, dataset: PartitionedDataset, **params) -> Dict:
+        """Результат анализа партиций из кэша (ключ — версия загрузки партиций)"""
+        analyze = getattr(self, f"analyze_{name}_partitioned", None)
+        if analyze is None:
+            raise ValueError(f"Анализ '{name}' по партициям не поддерживается")
+
+        key = self.partition_cache.make_key(name, {"partitions": dataset.directory.name, **params})
+        return self.partition_cache.get_or_compute(
+            dataset.version, key, lambda: analyze(dataset, **params), persist=not params
+        )
+
+    def get_correlation_matrix(self, df: pd.DataFrame, features: List[str] = None,
+                               method: str = 'pearson', version: str = None) -> pd.DataFrame:
+        """
+        Матрица корреляций признаков (correlation.py)
+
+        С токеном версии матрица кэшируется: /analysis/correlations и
+        /plots/heatmap считают её один раз на версию датасета.
+        """
         if features is None:
             features = AUDIO_FEATURES + ['popularity']
 
@@ -137,7 +385,14 @@ class AnalysisService:
         if len(available_features) < 2:
             raise ValueError("Недостаточно признаков для построения корреляционной матрицы")
 
-        return df[available_features].corr()
+        def compute() -> Dict:
+            return correlation_matrix(df, available_features, method).to_dict()
+
+        if version is None:
+            return pd.DataFrame(compute())
+
+        key = self.cache.make_key('correlation_matrix', {"method": method, "features": available_features})
+        return pd.DataFrame(self.cache.get_or_compute(version, key, compute))
 
     @staticmethod
     def get_summary_statistics(df: pd.DataFrame) -> Dict:
@@ -145,16 +400,16 @@ class AnalysisService:
         numeric_cols = df.select_dtypes(include=[np.number]).columns.tolist()
 
         summary = {}
-        for col in numeric_cols:
+        for col, values in describe(df, numeric_cols).items():
             summary[col] = {
-                "count": int(df[col].count()),
-                "mean": float(df[col].mean()),
-                "std": float(df[col].std()),
-                "min": float(df[col].min()),
-                "25%": float(df[col].quantile(0.25)),
-                "50%": float(df[col].quantile(0.50)),
-                "75%": float(df[col].quantile(0.75)),
-                "max": float(df[col].max())
+                "count": values["count"],
+                "mean": values["mean"],
+                "std": values["std"],
+                "min": values["min"],
+                "25%": values["q25"],
+                "50%": values["q50"],
+                "75%": values["q75"],
+                "max": values["max"]
             }
 
         return summary
@@ -0,0 +1,294 @@
+"""
+Пакетные предсказания: разбор входных форматов и потоковый вывод
+
+Вход (по Content-Type) — JSON-массив объектов, NDJSON, CSV или Apache Arrow
+(IPC stream/file). Данные читаются порциями по BATCH_CHUNK_SIZE строк,
+каждая порция проверяется по колонкам целиком и превращается в матрицу
+float64 для инференса, а результаты сразу отдаются клиенту.
+"""
+import csv
+import io
+import json
+from io import BytesIO
+from json.encoder import encode_basestring
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+# Content-Type запроса → формат входных данных
+INPUT_FORMATS = {
+    'application/json': 'json',
+    'application/x-ndjson': 'ndjson',
+    'application/jsonl': 'ndjson',
+    'text/csv': 'csv',
+    'application/vnd.apache.arrow.stream': 'arrow',
+    'application/vnd.apache.arrow.file': 'arrow'
+}
+
+# Формат ответа → MIME-тип
+OUTPUT_FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+    'json': 'application/json'
+}
+
+# Необязательная колонка-идентификатор, которая возвращается вместе с результатом
+ID_COLUMN = 'track_id'
+
+
+def resolve_input_format(content_type: str) -> str:
+    """Формат входных данных по заголовку Content-Type"""
+    mime = (content_type or 'application/json').split(';')[0].strip().lower()
+
+    if mime not in INPUT_FORMATS:
+        raise ValueError(
+            f"Неподдерживаемый Content-Type '{mime}'. "
+            f"Доступны: {', '.join(INPUT_FORMATS)}"
+        )
+
+    return INPUT_FORMATS[mime]
+
+
+def _records_frames(records: List, columns: List[str], chunk_size: int,
+                    start: int = 0) -> Iterator[pd.DataFrame]:
+    """Порции DataFrame из списка JSON-объектов"""
+    for offset in range(0, len(records), chunk_size):
+        chunk = records[offset:offset + chunk_size]
+        bad = [start + offset + i for i, record in enumerate(chunk) if not isinstance(record, dict)]
+        if bad:
+            raise ValueError(f"Строка {bad[0]}: ожидается JSON-объект с признаками")
+        yield pd.DataFrame.from_records(chunk, columns=columns)
+
+
+def _json_frames(body: bytes, columns: List[str], chunk_size: int) -> Iterator[pd.DataFrame]:
+    try:
+        data = json.loads(body or b'[]')
+    except json.JSONDecodeError as e:
+        raise ValueError(f"Некорректный JSON: {e}")
+
+    # Допускается как массив, так и объект {"tracks": [...]}
+    if isinstance(data, dict) and isinstance(data.get('tracks'), list):
+        data = data['tracks']
+
+    if not isinstance(data, list):
+        raise ValueError("Ожидается JSON-массив объектов с признаками")
+
+    return _records_frames(data, columns, chunk_size)
+
+
+def _ndjson_frames(body: bytes, columns: List[str], chunk_size: int) -> Iterator[pd.DataFrame]:
+    lines = [line for line in body.splitlines() if line.strip()]
+
+    for offset in range(0, len(lines), chunk_size):
+        records = []
+        for i, line in enumerate(lines[offset:offset + chunk_size]):
+            try:
+                records.append(json.loads(line))
+            except json.JSONDecodeError as e:
+                raise ValueError(f"Строка {offset + i}: некорректный JSON ({e})")
+        yield from _records_frames(records, columns, chunk_size, start=offset)
+
+
+def _check_header(available, features: List[str]):
+    missing = [feature for feature in features if feature not in available]
+    if missing:
+        raise ValueError(f"Отсутствуют признаки: {missing}")
+
+
+def _csv_frames(body: bytes, columns: List[str], features: List[str],
+                chunk_size: int) -> Iterator[pd.DataFrame]:
+    wanted = set(columns)
+    reader = pd.read_csv(BytesIO(body), chunksize=chunk_size, usecols=lambda c: c in wanted)
+
+    for i, frame in enumerate(reader):
+        if i == 0:
+            _check_header(frame.columns, features)
+        yield frame
+
+
+def _arrow_frames(body: bytes, columns: List[str], features: List[str],
+                  chunk_size: int) -> Iterator[pd.DataFrame]:
+    try:
+        import pyarrow as pa
+        import pyarrow.ipc as ipc
+    except ImportError:
+        raise ValueError("Для Arrow нужен пакет pyarrow (pip install pyarrow)")
+
+    source = pa.BufferReader(body)
+    try:
+        batches = iter(ipc.open_stream(source))
+    except pa.ArrowInvalid:
+        reader = ipc.open_file(pa.BufferReader(body))
+        batches = (reader.get_batch(i) for i in range(reader.num_record_batches))
+
+    checked = False
+    for batch in batches:
+        if not checked:
+            _check_header(batch.schema.names, features)
+            checked = True
+
+        names = [name for name in columns if name in batch.schema.names]
+        for offset in range(0, batch.num_rows, chunk_size):
+            yield batch.slice(offset, chunk_size).select(names).to_pandas()
+
+
+def iter_frames(body: bytes, input_format: str, features: List[str],
+                chunk_size: int) -> Iterator[pd.DataFrame]:
+    """
+    Разобрать тело запроса в порции DataFrame
+
+    Args:
+        body: Тело запроса
+        input_format: 'json', 'ndjson', 'csv' или 'arrow'
+        features: Признаки модели
+        chunk_size: Строк в порции
+
+    Yields:
+        pd.DataFrame: Порция с колонками признаков (и ID_COLUMN, если есть)
+    """
+    columns = list(features) + [ID_COLUMN]
+
+    if input_format == 'json':
+        return _json_frames(body, columns, chunk_size)
+    if input_format == 'ndjson':
+        return _ndjson_frames(body, columns, chunk_size)
+    if input_format == 'csv':
+        return _csv_frames(body, columns, features, chunk_size)
+    if input_format == 'arrow':
+        return _arrow_frames(body, columns, features, chunk_size)
+
+    raise ValueError(f"Неизвестный формат входных данных: '{input_format}'")
+
+
+def validate_frame(frame: pd.DataFrame, features: List[str],
+                   ranges: Dict[str, Tuple[float, float]]) -> Tuple[np.ndarray, np.ndarray, Dict[int, str]]:
+    """
+    Проверка порции по колонкам
+
+    Каждая колонка приводится к float64 одной операцией; пропуски,
+    нечисловые значения и выход за допустимый диапазон отмечаются маской.
+
+    Args:
+        frame: Порция данных
+        features: Признаки в порядке модели
+        ranges: Допустимые диапазоны {признак: (минимум, максимум)}
+
+    Returns:
+        Tuple: матрица (n, признаки), маска корректных строк
+            и ошибки {номер строки в порции: сообщение}
+    """
+    n = len(frame)
+    X = np.empty((n, len(features)), dtype=np.float64)
+    problems = []
+
+    for j, feature in enumerate(features):
+        if feature in frame.columns:
+            X[:, j] = pd.to_numeric(frame[feature], errors='coerce').to_numpy(dtype=np.float64)
+        else:
+            X[:, j] = np.nan
+
+        column = X[:, j]
+        bad = np.isnan(column)
+        if feature in ranges:
+            low, high = ranges[feature]
+            with np.errstate(invalid='ignore'):
+                bad |= (column < low) | (column > high)
+        problems.append(bad)
+
+    invalid = np.column_stack(problems) if problems else np.zeros((n, 0), dtype=bool)
+    valid = ~invalid.any(axis=1)
+
+    errors = {}
+    for i in np.flatnonzero(~valid):
+        names = [features[j] for j in np.flatnonzero(invalid[i])]
+        errors[int(i)] = f"Некорректные или отсутствующие признаки: {', '.join(names)}"
+
+    return X, valid, errors
+
+
+CSV_HEADER = ["index", "track_id", "predicted_popularity", "error"]
+
+
+def _csv_rows(rows: List[list], first: bool) -> str:
+    """Строки CSV через csv.writer (экранирует кавычки, запятые и переводы строк)"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    if first:
+        writer.writerow(CSV_HEADER)
+    writer.writerows(rows)
+    return buffer.getvalue()
+
+
+def _id_fragments(ids: Optional[np.ndarray], n: int, output_format: str) -> List[str]:
+    """Готовые фрагменты с track_id для каждой строки (пустые, если ID нет;
+    для CSV — сами значения, их экранирует csv.writer)"""
+    if ids is None:
+        return [''] * n
+
+    series = pd.Series(ids)
+    missing = series.isna().tolist()
+    values = series.astype(str).tolist()
+
+    if output_format == 'csv':
+        return ['' if skip else value for skip, value in zip(missing, values)]
+
+    return ['' if skip else f',"track_id":{encode_basestring(value)}'
+            for skip, value in zip(missing, values)]
+
+
+def format_chunk(output_format: str, offset: int, ids: Optional[np.ndarray],
+                 predictions: np.ndarray, errors: Dict[int, str], first: bool) -> str:
+    """
+    Сериализовать результаты порции
+
+    Args:
+        output_format: 'ndjson', 'csv' или 'json'
+        offset: Номер первой строки порции во всём пакете
+        ids: Значения ID_COLUMN (или None)
+        predictions: Предсказания (для некорректных строк не используются)
+        errors: Ошибки по номеру строки в порции
+        first: Первая порция (для заголовка CSV и разделителей JSON)
+    """
+    values = predictions.tolist()
+    id_values = _id_fragments(ids, len(values), output_format)
+
+    if output_format == 'csv':
+        return _csv_rows([
+            [offset + i, id_values[i], '', errors[i]] if i in errors
+            else [offset + i, id_values[i], repr(value), '']
+            for i, value in enumerate(values)
+        ], first)
+
+    records = []
+    for i, value in enumerate(values):
+        if i in errors:
+            records.append(f'{{"index":{offset + i}{id_values[i]},"error":{encode_basestring(errors[i])}}}')
+        else:
+            records.append(f'{{"index":{offset + i}{id_values[i]},"predicted_popularity":{value!r}}}')
+
+    if not records:
+        return ""
+
+    if output_format == 'json':
+        return ("" if first else ",") + ",".join(records)
+
+    return "\n".join(records) + "\n"
+
+
+def format_error(output_format: str, offset: int, message: str) -> str:
+    """
+    Последняя запись ответа об ошибке, случившейся посреди потока
+
+    Args:
+        output_format: 'ndjson', 'csv' или 'json'
+        offset: Сколько строк уже отправлено
+        message: Текст ошибки
+    """
+    if output_format == 'csv':
+        return _csv_rows([[offset, '', '', message]], first=offset == 0)
+
+    error = json.dumps({"index": offset, "error": message}, ensure_ascii=False)
+    if output_format == 'json':
+        return ("," if offset else "") + error
+    return error + "\n"
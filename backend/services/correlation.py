@@ -0,0 +1,176 @@
+"""
+Матрицы корреляций признаков
+
+Вся матрица считается одним матричным умножением (BLAS): колонки
+стандартизуются в блок float32 Z (строки × признаки, среднее 0, std 1),
+и corr = Zᵀ·Z / (n - 1). Если в колонках есть пропуски, считается
+попарно по строкам, где заданы оба признака (как DataFrame.corr): суммы
+по парам — тоже матричные произведения, но в float64.
+
+Методы:
+    pearson  — линейная корреляция
+    spearman — Pearson по рангам (средний ранг для совпадающих значений;
+               при пропусках ранги считаются по всем заданным значениям
+               колонки, а не заново для каждой пары, как в pandas)
+    kendall  — tau-b по случайной подвыборке KENDALL_SAMPLE_SIZE строк
+               (точный расчёт — O(n log n) на каждую пару признаков)
+
+Матрицы по группам (например, по жанрам) считаются параллельно в потоках:
+BLAS и сортировка NumPy отпускают GIL.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from backend.config import CORRELATION_WORKERS, KENDALL_SAMPLE_SIZE, RANDOM_STATE
+from backend.services.groupby import GroupKey
+from backend.services.stats_kernel import numeric_block
+
+CORRELATION_METHODS = ('pearson', 'spearman', 'kendall')
+
+
+def _pearson(block: np.ndarray) -> np.ndarray:
+    """Pearson по блоку строки × признаки"""
+    n_rows, n_columns = block.shape
+    missing = np.isnan(block)
+
+    if not missing.any():
+        if n_rows < 2:
+            return np.full((n_columns, n_columns), np.nan)
+        std = block.std(axis=0, ddof=1)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            z = ((block - block.mean(axis=0)) / std).astype(np.float32)
+        corr = (z.T @ z).astype(np.float64) / (n_rows - 1)
+        corr[:, std == 0] = np.nan
+        corr[std == 0, :] = np.nan
+        np.fill_diagonal(corr, np.where(std > 0, 1.0, np.nan))
+        return np.clip(corr, -1.0, 1.0)
+
+    # Попарно полные наблюдения: суммы по строкам, где заданы оба признака
+    valid = (~missing).astype(np.float64)
+    with np.errstate(invalid='ignore'):
+        centered = np.where(missing, 0.0, block - np.nanmean(block, axis=0))
+    counts = valid.T @ valid
+    sums = centered.T @ valid              # [i, j]: сумма x_i там, где задан x_j
+    squares = (centered * centered).T @ valid
+    cross = centered.T @ centered
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        covariance = cross - sums * sums.T / counts
+        variance_i = squares - sums ** 2 / counts
+        corr = covariance / np.sqrt(variance_i * variance_i.T)
+    corr[counts < 2] = np.nan
+    return np.clip(corr, -1.0, 1.0)
+
+
+def _column_ranks(values: np.ndarray) -> np.ndarray:
+    """Ранги значений колонки (средние для совпадений, NaN остаются)"""
+    ranks = np.full(len(values), np.nan)
+    valid = np.flatnonzero(~np.isnan(values))
+    order = np.argsort(values[valid])
+    ordered = values[valid][order]
+
+    # Серии одинаковых значений получают средний ранг серии
+    starts = np.flatnonzero(np.r_[True, ordered[1:] != ordered[:-1]]) if len(ordered) else valid
+    ends = np.r_[starts[1:], len(ordered)]
+    ranks[valid[order]] = np.repeat((starts + ends + 1) / 2, ends - starts)
+    return ranks
+
+
+def _ranks(block: np.ndarray, workers: int = CORRELATION_WORKERS) -> np.ndarray:
+    """Ранги каждой колонки блока (колонки — параллельно в потоках)"""
+    ranked = np.empty(block.shape, dtype=np.float64, order='F')
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        for j, ranks in enumerate(pool.map(_column_ranks, block.T)):
+            ranked[:, j] = ranks
+    return ranked
+
+
+def _kendall(block: np.ndarray, sample_size: int, seed: int) -> np.ndarray:
+    """tau-b по подвыборке строк (для каждой пары — строки без пропусков)"""
+    from scipy.stats import kendalltau
+
+    if sample_size and len(block) > sample_size:
+        rows = np.random.default_rng(seed).choice(len(block), size=sample_size, replace=False)
+        block = block[np.sort(rows)]
+
+    n_columns = block.shape[1]
+    corr = np.eye(n_columns)
+    for i in range(n_columns):
+        for j in range(i + 1, n_columns):
+            both = ~(np.isnan(block[:, i]) | np.isnan(block[:, j]))
+            tau = kendalltau(block[both, i], block[both, j]).statistic if both.sum() > 1 else np.nan
+            corr[i, j] = corr[j, i] = tau
+    return corr
+
+
+def correlation_block(block: np.ndarray, method: str = 'pearson',
+                      sample_size: int = KENDALL_SAMPLE_SIZE,
+                      seed: int = RANDOM_STATE) -> np.ndarray:
+    """
+    Матрица корреляций колонок блока строки × признаки
+
+    Args:
+        block: Значения float64 (NaN — пропуски)
+        method: 'pearson', 'spearman' или 'kendall'
+        sample_size: Строк в подвыборке для kendall (0 — все строки)
+        seed: Зерно подвыборки
+
+    Returns:
+        np.ndarray: Матрица признаки × признаки
+    """
+    if method == 'pearson':
+        return _pearson(block)
+    if method == 'spearman':
+        return _pearson(_ranks(block))
+    if method == 'kendall':
+        return _kendall(block, sample_size, seed)
+    raise ValueError(f"Неизвестный метод корреляции '{method}'. Доступны: {', '.join(CORRELATION_METHODS)}")
+
+
+def correlation_matrix(df: pd.DataFrame, columns: List[str], method: str = 'pearson',
+                       sample_size: int = KENDALL_SAMPLE_SIZE) -> pd.DataFrame:
+    """Матрица корреляций колонок датафрейма (как df[columns].corr(method))"""
+    matrix = correlation_block(numeric_block(df, columns), method, sample_size)
+    return pd.DataFrame(matrix, index=columns, columns=columns)
+
+
+def correlation_by_group(df: pd.DataFrame, by: str, columns: List[str],
+                         method: str = 'pearson', groups: Optional[List[str]] = None,
+                         sample_size: int = KENDALL_SAMPLE_SIZE,
+                         workers: int = CORRELATION_WORKERS) -> Dict[str, pd.DataFrame]:
+    """
+    Матрицы корреляций для каждой группы (например, жанра) параллельно
+
+    Строки групп выбираются по кодам категорий: блок признаков
+    упорядочивается по группе один раз, и каждая группа — его отрезок.
+
+    Returns:
+        Dict[str, pd.DataFrame]: {значение ключа: матрица}
+    """
+    if method not in CORRELATION_METHODS:
+        raise ValueError(f"Неизвестный метод корреляции '{method}'. Доступны: {', '.join(CORRELATION_METHODS)}")
+
+    key = GroupKey.from_series(df[by])
+    codes = key.codes
+    if groups is not None:
+        codes = np.where(key.allowed(groups)[codes] & (codes >= 0), codes, -1)
+
+    order = np.argsort(codes, kind='stable')
+    counts = np.bincount(codes[codes >= 0], minlength=len(key.labels))
+    block = numeric_block(df, columns)[order[len(codes) - counts.sum():]]
+    starts = np.cumsum(counts) - counts
+
+    def compute(g: int) -> np.ndarray:
+        return correlation_block(block[starts[g]:starts[g] + counts[g]], method, sample_size)
+
+    present = [int(g) for g in np.flatnonzero(counts)]
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        matrices = list(pool.map(compute, present))
+
+    return {
+        str(key.labels[g]): pd.DataFrame(matrix, index=columns, columns=columns)
+        for g, matrix in zip(present, matrices)
+    }
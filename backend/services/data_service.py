@@ -4,10 +4,26 @@
 + ОЧИСТКА ДАННЫХ (исправление дубликатов жанров)
 """
 import pandas as pd
+import numpy as np
+import hashlib
+import io
+import json
 import logging
-from typing import Optional
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Tuple, Union
 from pathlib import Path
 
+from backend.config import (
+    DATA_DIR, DATASET_CACHE_ENABLED, DATASET_CACHE_DIR, DATASET_SCHEMA, DELTAS_DIR,
+    PARTITIONS_DIR, STREAM_CHUNK_SIZE, SHARED_MEMORY_MODE, SHARED_SYNC_INTERVAL_MS
+)
+from backend.services.dataset_cache import DatasetCache
+from backend.services.partition_store import PartitionedDataset
+from backend.services.row_index import RowFilter, RowIndex
+from backend.services.stats_kernel import describe
+
 logger = logging.getLogger(__name__)
 
 
@@ -17,6 +33,22 @@ class DataService:
     def __init__(self):
         self.df: Optional[pd.DataFrame] = None
         self._loaded = False
+        self.cache = DatasetCache(DATASET_CACHE_DIR)
+        # Токен версии данных: меняется при каждой загрузке другого датасета
+        # и при каждом добавлении строк
+        self.version: Optional[str] = None
+        # Основной CSV и применённые к нему дополнения
+        self.path: Optional[Path] = None
+        self.deltas: list = []
+        # Индекс строк для фильтров (пересобирается вместе с датафреймом)
+        self.index: Optional[RowIndex] = None
+        # Датафрейм открыт из бинарного кэша: дополнения дописываются в него
+        self._cached = False
+        # Когда и с какой отметкой манифеста кэша проверялись дополнения других воркеров
+        self._synced_at = 0.0
+        self._cache_stamp = None
+        # Дополнения применяются по одному
+        self._append_lock = threading.Lock()
 
     def _clean_data(self, df: pd.DataFrame) -> pd.DataFrame:
         """
@@ -26,17 +58,34 @@ class DataService:
         - Unicode апострофы в жанрах (Children's vs Children's)
         - Лишние пробелы
         - Различия в регистре
+
+        Строки очищаются только в словаре категорий (несколько десятков
+        значений), а не в каждой из 232k строк.
         """
         logger.info("Очистка данных...")
 
         if 'genre' in df.columns:
+            genres = df['genre']
+            is_category = isinstance(genres.dtype, pd.CategoricalDtype)
+            if not is_category:
+                genres = genres.astype('category')
+
             # Сохраняем оригинальное количество уникальных жанров
-            original_genres = df['genre'].nunique()
-            df['genre'] = df['genre'].astype(str)
-            df['genre'] = df['genre'].str.replace('\u2019', "'", regex=False)
-            df['genre'] = df['genre'].str.replace('`', "'", regex=False)
-            df['genre'] = df['genre'].str.replace('ʼ', "'", regex=False)
-            df['genre'] = df['genre'].str.strip()
+            original_genres = genres.nunique()
+
+            categories = genres.cat.categories.astype(str)
+            categories = categories.str.replace('\u2019', "'", regex=False)
+            categories = categories.str.replace('`', "'", regex=False)
+            categories = categories.str.replace('ʼ', "'", regex=False)
+            categories = categories.str.strip()
+
+            # Категории, совпавшие после очистки, склеиваются в одну
+            unique, inverse = np.unique(categories.to_numpy(dtype=object), return_inverse=True)
+            codes = genres.cat.codes.to_numpy()
+            codes = np.where(codes >= 0, inverse.reshape(-1)[codes], -1)
+            genres = pd.Categorical.from_codes(codes, categories=unique)
+
+            df['genre'] = genres if is_category else genres.astype(str)
             new_genres = df['genre'].nunique()
             if original_genres != new_genres:
                 logger.info(
@@ -44,22 +93,57 @@ class DataService:
                 )
         return df
 
-    def load_dataset(self, path: Path) -> bool:
+    def load_dataset(self, path: Path, use_cache: bool = DATASET_CACHE_ENABLED) -> bool:
         """
         Загрузить датасет из CSV файла
 
+        Типы колонок задаются DATASET_SCHEMA прямо при разборе CSV.
+        Если в data/cache/ есть актуальный бинарный кэш этого CSV,
+        колонки открываются через memory-map без разбора и очистки.
+
         Args:
             path: Путь к CSV файлу
+            use_cache: Использовать бинарный кэш датасета
 
         Returns:
             bool: Успешно ли загружен датасет
         """
         try:
-            # Загружаем CSV
-            self.df = pd.read_csv(path)
-
-            # Очищаем данные
-            self.df = self._clean_data(self.df)
+            self.path = Path(path)
+            df = self.cache.load(path, DATASET_SCHEMA) if use_cache else None
+            cached = df is not None
+
+            # В кэше дописаны дополнения, которых уже нет в DELTAS_DIR
+            saved = self._saved_deltas()
+            if cached and not self._is_prefix(self.cache.deltas(path), saved):
+                logger.info("Дополнения в кэше датасета не совпадают с сохранёнными")
+                df, cached = None, False
+
+            if df is None:
+                # Загружаем CSV сразу с компактными типами
+                df = pd.read_csv(path, dtype=DATASET_SCHEMA)
+
+                # Очищаем данные
+                df = self._clean_data(df)
+
+                if use_cache:
+                    try:
+                        self.cache.save(path, df, DATASET_SCHEMA)
+                        cached = True
+                    except Exception as e:
+                        logger.warning(f"Не удалось сохранить кэш датасета: {e}")
+
+            self.df = df
+            self.version = self._dataset_version(path)
+            self.deltas = []
+            self.index = None
+            self._cached = cached
+            self._cache_stamp = self.cache.stamp(path) if cached else None
+            if cached:
+                # Дополнения, уже записанные в кэш, входят в df
+                self._set_frame(df, self.cache.deltas(path))
+            self._apply_saved_deltas(saved)
+            self._build_index()
 
             self._loaded = True
             logger.info(f"✓ Датасет загружен: {self.df.shape[0]:,} строк × {self.df.shape[1]} колонок")
@@ -68,21 +152,413 @@ class DataService:
         except FileNotFoundError:
             logger.error(f"✗ Файл не найден: {path}")
             self._loaded = False
+            self.version = None
             return False
 
         except Exception as e:
             logger.error(f"✗ Ошибка загрузки датасета: {e}")
             self._loaded = False
+            self.version = None
             return False
 
+    def _dataset_version(self, path: Path) -> str:
+        """
+        Токен версии датасета: хэш содержимого CSV и схемы типов
+
+        Одинаковые данные дают одинаковый токен во всех воркерах и после
+        перезапуска, поэтому сохранённые на диск кэши остаются валидными.
+        """
+        source_hash = self.cache.source_hash(path)
+        schema = json.dumps(DATASET_SCHEMA, sort_keys=True)
+        return hashlib.sha256(f"{source_hash}:{schema}".encode()).hexdigest()[:16]
+
+    def _deltas_dir(self) -> Path:
+        """Папка сохранённых дополнений текущего CSV"""
+        return DELTAS_DIR / self.path.stem
+
+    def _saved_deltas(self) -> List[Tuple[Path, str]]:
+        """Сохранённые дополнения текущего CSV по порядку: (путь, sha256)"""
+        directory = self._deltas_dir()
+        if not directory.exists():
+            return []
+        return [(delta_path, hashlib.sha256(delta_path.read_bytes()).hexdigest())
+                for delta_path in sorted(directory.glob("*.csv"))]
+
+    @staticmethod
+    def _is_prefix(records: Optional[List[Dict]], saved: List[Tuple[Path, str]]) -> bool:
+        """Дополнения records — начало списка saved (по имени и хэшу)"""
+        records = records or []
+        return len(records) <= len(saved) and all(
+            record["name"] == delta_path.name and record["sha256"] == delta_hash
+            for record, (delta_path, delta_hash) in zip(records, saved)
+        )
+
+    def _apply_saved_deltas(self, saved: List[Tuple[Path, str]]):
+        """Применить дополнения, добавленные через append_csv до перезапуска"""
+        applied = 0
+        for delta_path, delta_hash in saved:
+            with self._append_lock, self._cache_lock():
+                # Другой воркер мог уже дописать это дополнение в кэш
+                self._catch_up()
+                if any(record["name"] == delta_path.name for record in self.deltas):
+                    continue
+                try:
+                    delta = self.read_delta(delta_path.read_bytes())
+                except ValueError as e:
+                    logger.warning(f"Дополнение {delta_path.name} пропущено: {e}")
+                    continue
+                self._append(delta, delta_hash, delta_path.name)
+                applied += 1
+
+        if self.deltas:
+            logger.info(f"✓ Дополнений датасета: {len(self.deltas)} (применено сейчас: {applied})")
+
+    def read_delta(self, source: Union[bytes, Path]) -> pd.DataFrame:
+        """
+        Прочитать и очистить новые строки так же, как основной CSV
+
+        Args:
+            source: Содержимое CSV или путь к файлу
+
+        Returns:
+            pd.DataFrame: Строки с колонками основного датасета
+        """
+        buffer = io.BytesIO(source) if isinstance(source, bytes) else source
+        try:
+            delta = pd.read_csv(buffer, dtype=DATASET_SCHEMA)
+        except (pd.errors.ParserError, pd.errors.EmptyDataError, UnicodeDecodeError) as e:
+            raise ValueError(f"Не удалось разобрать CSV: {e}")
+
+        if self.df is not None:
+            missing = [column for column in self.df.columns if column not in delta.columns]
+            if missing:
+                raise ValueError(f"В новых строках нет колонок: {missing}")
+            delta = delta[list(self.df.columns)]
+
+        return self._clean_data(delta)
+
+    def _align_delta(self, delta: pd.DataFrame) -> pd.DataFrame:
+        """
+        Привести новые строки к типам колонок датафрейма
+
+        Новые значения категорий добавляются в конец словаря: коды прежних
+        строк не меняются, поэтому их не нужно перекодировать.
+        """
+        delta = delta.reset_index(drop=True)
+        for column in self.df.columns:
+            dtype = self.df[column].dtype
+            if isinstance(dtype, pd.CategoricalDtype):
+                values = delta[column].astype(str).where(delta[column].notna())
+                new = [value for value in pd.unique(values.dropna()) if value not in dtype.categories]
+                categories = dtype.categories.append(pd.Index(sorted(new), dtype=dtype.categories.dtype))
+                delta[column] = pd.Categorical(values, categories=categories)
+            else:
+                delta[column] = delta[column].astype(dtype)
+        return delta
+
+    def _concat(self, delta: pd.DataFrame) -> pd.DataFrame:
+        """Дописать выровненные строки к датафрейму в памяти (без кэша)"""
+        columns = {}
+        for column in self.df.columns:
+            series = self.df[column]
+            if isinstance(series.dtype, pd.CategoricalDtype):
+                series = pd.Series(pd.Categorical.from_codes(
+                    series.cat.codes.to_numpy(), dtype=delta[column].dtype
+                ))
+            columns[column] = series
+        return pd.concat([pd.DataFrame(columns), delta], ignore_index=True)
+
+    @contextmanager
+    def _cache_lock(self) -> Iterator[None]:
+        """Межпроцессная блокировка дополнений (только для датафрейма из кэша)"""
+        if not self._cached:
+            yield
+            return
+        with self.cache.locked(self.path):
+            yield
+
+    def _set_frame(self, df: pd.DataFrame, deltas: List[Dict]):
+        """
+        Подменить датафрейм после дополнений и продолжить цепочку версий
+
+        Сначала датафрейм, потом индекс: get_filtered_dataframe читает в
+        обратном порядке, поэтому номера строк из индекса всегда есть в df.
+        """
+        version = self.version
+        for record in deltas[len(self.deltas):]:
+            # Новая версия зависит от прежней и от дополнения: одинаковая
+            # последовательность дополнений даёт одинаковую версию во всех воркерах
+            version = hashlib.sha256(f"{version}:{record['sha256']}".encode()).hexdigest()[:16]
+
+        index = self.index.extend(df) if self.index is not None else None
+        self.df = df
+        self.version = version
+        self.deltas = list(deltas)
+        # Индекс начальной загрузки строится один раз после всех дополнений
+        self.index = index
+
+    def _append(self, delta: pd.DataFrame, delta_hash: str, name: str):
+        """
+        Дописать строки и сменить версию данных (под блокировками дополнений)
+
+        Если датафрейм открыт из кэша, строки дописываются в файлы кэша, а
+        датафрейм заново открывается через memory-map: объём работы зависит
+        от размера дополнения, а числовые колонки остаются общими для воркеров.
+        """
+        delta = self._align_delta(delta)
+        record = {"name": name, "rows": int(len(delta)), "sha256": delta_hash}
+        deltas = self.deltas + [record]
+
+        df = None
+        if self._cached:
+            try:
+                self.cache.append(self.path, delta, record)
+            except ValueError as e:
+                # Например, новые категории не помещаются в тип кодов
+                logger.info(f"Кэш датасета сохраняется заново: {e}")
+                self.cache.save(self.path, self._concat(delta), DATASET_SCHEMA, deltas=deltas)
+            df = self.cache.extend(self.path, self.df)
+            self._cache_stamp = self.cache.stamp(self.path)
+
+        self._set_frame(df if df is not None else self._concat(delta), deltas)
+
+    def _catch_up(self) -> bool:
+        """
+        Подхватить дополнения, которые другие воркеры дописали в кэш
+
+        Returns:
+            bool: False если кэш не продолжает текущий датафрейм
+                (нужна полная перезагрузка)
+        """
+        if not self._cached:
+            return True
+
+        deltas = self.cache.deltas(self.path)
+        if deltas is None or deltas[:len(self.deltas)] != self.deltas:
+            return False
+        if len(deltas) == len(self.deltas):
+            return True
+
+        df = self.cache.extend(self.path, self.df)
+        if df is None:
+            return False
+        self._set_frame(df, deltas)
+        logger.info(f"✓ Подхвачены дополнения датасета: {len(self.df):,} строк")
+        return True
+
+    def _sync_shared(self):
+        """
+        В режиме общей памяти подхватить дополнения, сделанные другими воркерами
+
+        Как и модели (ModelService._sync_shared), проверяется не чаще раза
+        в SHARED_SYNC_INTERVAL_MS и одним stat манифеста кэша.
+        """
+        if not SHARED_MEMORY_MODE or not self._cached or not self._loaded:
+            return
+
+        now = time.monotonic()
+        if now - self._synced_at < SHARED_SYNC_INTERVAL_MS / 1000:
+            return
+        self._synced_at = now
+
+        stamp = self.cache.stamp(self.path)
+        if stamp is None or stamp == self._cache_stamp:
+            return
+
+        try:
+            with self._append_lock:
+                self._cache_stamp = stamp
+                current = self._catch_up()
+        except (OSError, ValueError, KeyError) as e:
+            # Кэш мог как раз сохраняться заново: повторим при следующей проверке
+            logger.warning(f"Не удалось подхватить дополнения датасета: {e}")
+            self._cache_stamp = None
+            return
+
+        if not current:
+            logger.info("Кэш датасета изменён другим воркером: загрузка заново")
+            self.load_dataset(self.path, use_cache=True)
+
+    def _build_index(self):
+        """Индекс строк текущего датафрейма (колонки индексируются при первом фильтре)"""
+        self.index = RowIndex(self.df)
+
+    def append_csv(self, data: bytes, persist: bool = True) -> Tuple[pd.DataFrame, Dict]:
+        """
+        Добавить к датасету новые строки из CSV
+
+        Строки очищаются так же, как основной файл, и дописываются
+        к датафрейму; версия данных меняется, поэтому кэши /analysis/*
+        и /plots/* пересчитываются. Исходный CSV сохраняется в
+        DELTAS_DIR и применяется повторно при следующем запуске.
+
+        В режиме общей памяти строки дописываются в бинарный кэш под
+        межпроцессной блокировкой, остальные воркеры подхватывают их
+        через _sync_shared.
+
+        Args:
+            data: Содержимое CSV с колонками основного датасета
+            persist: Сохранить дополнение на диск
+
+        Returns:
+            Tuple: очищенные новые строки и сведения о дополнении
+        """
+        if not self.is_loaded():
+            raise ValueError("Датасет не загружен")
+
+        delta = self.read_delta(data)
+        if delta.empty:
+            raise ValueError("CSV не содержит строк")
+
+        delta_hash = hashlib.sha256(data).hexdigest()
+
+        with self._append_lock, self._cache_lock():
+            # Номер дополнения — после всех, уже дописанных другими воркерами
+            if not self._catch_up():
+                raise ValueError("Кэш датасета изменён другим воркером, повторите запрос")
+            name = f"{len(self.deltas):05d}-{delta_hash[:12]}.csv"
+            if persist:
+                directory = self._deltas_dir()
+                directory.mkdir(parents=True, exist_ok=True)
+                tmp = directory / f".{name}.tmp"
+                tmp.write_bytes(data)
+                tmp.replace(directory / name)
+
+            self._append(delta, delta_hash, name)
+            result = {
+                "rows_added": int(len(delta)),
+                "rows_total": int(len(self.df)),
+                "dataset_version": self.version,
+                "deltas": len(self.deltas)
+            }
+
+        logger.info(f"✓ Добавлено строк: {len(delta):,}, всего: {result['rows_total']:,}")
+        return delta, result
+
+    # ========== Потоковая загрузка по партициям ==========
+
+    @staticmethod
+    def resolve_source(name: str) -> Path:
+        """
+        Путь к файлу или папке партиций внутри DATA_DIR
+
+        Args:
+            name: Путь относительно data/ (например, 'catalog.csv'
+                или 'partitions/catalog')
+
+        Raises:
+            ValueError: Путь ведёт за пределы data/
+            FileNotFoundError: Файла нет
+        """
+        path = (DATA_DIR / name).resolve()
+        try:
+            path.relative_to(DATA_DIR.resolve())
+        except ValueError:
+            raise ValueError("Источник должен находиться в папке data/")
+        if not path.exists():
+            raise FileNotFoundError(f"'{name}' не найден в папке data/")
+        return path
+
+    def ingest_partitioned(self, source: Path, chunk_size: int = STREAM_CHUNK_SIZE,
+                           progress: Optional[Callable[[float, str], None]] = None) -> Dict:
+        """
+        Потоковая загрузка CSV/Parquet, который не помещается в память
+
+        Источник читается порциями, каждая порция очищается (_clean_data)
+        и раскладывается по жанрам в колоночные файлы PARTITIONS_DIR/<имя>/.
+        Текущий датафрейм (self.df) не меняется: с партициями работают через
+        open_partitions и их итераторы.
+
+        Args:
+            source: Путь к CSV или Parquet
+            chunk_size: Строк в порции чтения
+            progress: Колбэк (доля 0..1, сообщение)
+
+        Returns:
+            Dict: Сведения о записанных партициях
+        """
+        source = Path(source)
+        logger.info(f"Потоковая загрузка {source} по партициям...")
+        dataset = PartitionedDataset.ingest(
+            source, PARTITIONS_DIR / source.stem, self._clean_data,
+            chunk_size=chunk_size, progress=progress
+        )
+        return dataset.info()
+
+    @staticmethod
+    def open_partitions(name: str) -> PartitionedDataset:
+        """
+        Открыть партиции, записанные ingest_partitioned
+
+        Args:
+            name: Имя папки в PARTITIONS_DIR (имя исходного файла без расширения)
+        """
+        dataset = PartitionedDataset(PARTITIONS_DIR / Path(name).name)
+        if not dataset.exists():
+            raise FileNotFoundError(f"Партиции '{name}' не найдены")
+        return dataset
+
+    @staticmethod
+    def list_partitions() -> List[Dict]:
+        """Все загруженные наборы партиций"""
+        if not PARTITIONS_DIR.exists():
+            return []
+
+        result = []
+        for directory in sorted(PARTITIONS_DIR.iterdir()):
+            dataset = PartitionedDataset(directory)
+            if directory.is_dir() and not directory.name.startswith(".") and dataset.exists():
+                result.append(dataset.info())
+        return result
+
     def is_loaded(self) -> bool:
         """Проверить, загружен ли датасет"""
+        self._sync_shared()
         return self._loaded and self.df is not None
 
     def get_dataframe(self) -> Optional[pd.DataFrame]:
         """Получить весь датафрейм"""
+        self._sync_shared()
         return self.df
 
+    def filter_rows(self, row_filter: RowFilter) -> np.ndarray:
+        """
+        Номера строк, удовлетворяющих фильтру (через индекс строк)
+
+        Args:
+            row_filter: Условия на жанр и диапазоны числовых колонок
+
+        Returns:
+            np.ndarray: Номера строк по возрастанию
+        """
+        if not self.is_loaded():
+            raise ValueError("Датасет не загружен")
+        return self.index.lookup(row_filter)
+
+    def get_filtered_dataframe(self, row_filter: RowFilter) -> pd.DataFrame:
+        """
+        Строки датасета, удовлетворяющие фильтру
+
+        Args:
+            row_filter: Условия (пустой фильтр — весь датафрейм без копирования)
+
+        Returns:
+            pd.DataFrame: Отобранные строки
+
+        Raises:
+            ValueError: Фильтру не удовлетворяет ни одна строка
+        """
+        if not row_filter:
+            return self.get_dataframe()
+
+        # Сначала индекс, потом датафрейм: дополнение только дописывает строки,
+        # поэтому номера из индекса всегда есть в датафрейме
+        rows = self.filter_rows(row_filter)
+        df = self.df
+        if not len(rows):
+            raise ValueError(f"Нет треков, удовлетворяющих фильтру: {row_filter.to_dict()}")
+        return df.take(rows)
+
     def get_info(self) -> dict:
         """
         Получить информацию о датасете
@@ -157,18 +633,14 @@ class DataService:
             raise ValueError(f"Колонка '{column}' не найдена")
 
         series = self.df[column]
+        names = ("mean", "median", "std", "min", "max", "q25", "q50", "q75")
 
-        return {
-            "count": int(series.count()),
-            "mean": float(series.mean()) if pd.api.types.is_numeric_dtype(series) else None,
-            "median": float(series.median()) if pd.api.types.is_numeric_dtype(series) else None,
-            "std": float(series.std()) if pd.api.types.is_numeric_dtype(series) else None,
-            "min": float(series.min()) if pd.api.types.is_numeric_dtype(series) else None,
-            "max": float(series.max()) if pd.api.types.is_numeric_dtype(series) else None,
-            "q25": float(series.quantile(0.25)) if pd.api.types.is_numeric_dtype(series) else None,
-            "q50": float(series.quantile(0.50)) if pd.api.types.is_numeric_dtype(series) else None,
-            "q75": float(series.quantile(0.75)) if pd.api.types.is_numeric_dtype(series) else None,
-        }
+        if not pd.api.types.is_numeric_dtype(series):
+            return {"count": int(series.count()), **{name: None for name in names}}
+
+        values = describe(self.df, [column])[column]
+        values["median"] = values["q50"]
+        return {"count": values["count"], **{name: values[name] for name in names}}
 
 
 # Глобальный экземпляр сервиса (singleton)
@@ -0,0 +1,447 @@
+"""
+Колоночный бинарный кэш датасета
+
+Очищенный DataFrame сохраняется в data/cache/<имя CSV>/ как набор .npy файлов
+(по одному на колонку). При следующем запуске числовые колонки открываются
+через memory-map, поэтому CSV не нужно заново разбирать и очищать.
+
+Кэш привязан к исходному CSV: размер, время изменения и хэш содержимого
+записываются в manifest.json вместе со схемой типов. Если CSV или схема
+изменились, кэш считается устаревшим.
+
+Дополнения датасета (DataService.append_csv) дописываются в конец тех же
+файлов: числа и коды категорий — прямо в .npy (в заголовке остаётся
+прежняя длина, число строк хранит манифест), строковые колонки — отдельными
+отрезками <колонка>-<первая строка>.json. Манифест перезаписывается
+последним и атомарно, поэтому читатель всегда видит согласованное число
+строк, а воркеры узнают о дополнении по смене файла манифеста.
+"""
+import hashlib
+import json
+import logging
+import os
+import shutil
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Версия формата кэша (увеличивать при несовместимых изменениях)
+CACHE_FORMAT_VERSION = 3
+
+MANIFEST_NAME = "manifest.json"
+
+
+def save_column(directory: Path, index: int, name: str, series: pd.Series) -> Dict:
+    """Сохранить колонку в directory как .npy (+ словарь категорий в .json)"""
+    file_name = f"{index:03d}.npy"
+    column = {"name": str(name), "file": file_name, "dtype": str(series.dtype)}
+
+    if pd.api.types.is_numeric_dtype(series) or pd.api.types.is_bool_dtype(series):
+        np.save(directory / file_name, series.to_numpy())
+        column["kind"] = "values"
+        return column
+
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        np.save(directory / file_name, series.cat.codes.to_numpy())
+        categories = series.cat.categories
+        column["kind"] = "category"
+    else:
+        codes, categories = pd.factorize(series)
+        if len(categories) < np.iinfo(np.int32).max:
+            codes = codes.astype(np.int32)
+        np.save(directory / file_name, codes)
+        column["kind"] = "codes"
+
+    categories_name = f"{index:03d}.json"
+    with open(directory / categories_name, 'w', encoding='utf-8') as f:
+        json.dump([str(value) for value in categories], f, ensure_ascii=False)
+
+    column["categories"] = categories_name
+    return column
+
+
+def open_values(directory: Path, column: Dict, rows: Optional[int] = None) -> np.ndarray:
+    """
+    Открыть .npy колонки через memory-map
+
+    Args:
+        rows: Число строк по манифесту (с дописанными дополнениями;
+            None — сколько записано в заголовке .npy)
+    """
+    values = np.load(directory / column["file"], mmap_mode='r')
+    if rows is None or rows == len(values):
+        return values
+    return np.memmap(directory / column["file"], dtype=values.dtype, mode='r',
+                     offset=values.offset, shape=(rows,))
+
+
+def _read_json(path: Path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _write_json(path: Path, data):
+    """Записать JSON атомарно (читатели видят старый или новый файл целиком)"""
+    tmp_path = path.with_name(f"{path.name}.tmp-{os.getpid()}")
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def _segment_values(directory: Path, column: Dict, segment: Dict) -> pd.Series:
+    """Строки строковой колонки из отрезка дополнения"""
+    series = pd.Series(_read_json(directory / segment["file"]), dtype=object)
+    return series if column["dtype"] == "object" else series.astype(column["dtype"])
+
+
+def load_column(directory: Path, column: Dict, rows: Optional[int] = None):
+    """Открыть колонку, сохранённую save_column (числа — через memory-map)"""
+    if column["kind"] == "values":
+        return open_values(directory, column, rows)
+
+    categories = _read_json(directory / column["categories"])
+
+    if column["kind"] == "category":
+        return pd.Categorical.from_codes(open_values(directory, column, rows), categories=categories)
+
+    # Строковые колонки хранятся как коды + словарь значений
+    values = np.load(directory / column["file"], mmap_mode='r')
+    lookup = np.empty(len(categories) + 1, dtype=object)
+    lookup[:-1] = categories
+    lookup[-1] = np.nan
+    # Код -1 (пропуск) указывает на последний элемент lookup
+    series = pd.Series(lookup[values], copy=False)
+    if column["dtype"] != "object":
+        series = series.astype(column["dtype"])
+
+    # Дополнения — отдельными отрезками после строк исходного CSV
+    segments = [_segment_values(directory, column, segment)
+                for segment in column.get("segments", [])
+                if rows is None or segment["start"] < rows]
+    if segments:
+        series = pd.concat([series, *segments], ignore_index=True)
+    return series.values
+
+
+class DatasetCache:
+    """Кэш очищенного датасета в виде .npy файлов по колонкам"""
+
+    def __init__(self, cache_dir: Path):
+        self.cache_dir = Path(cache_dir)
+
+    def dataset_dir(self, source: Path) -> Path:
+        """Папка кэша для конкретного CSV файла"""
+        return self.cache_dir / Path(source).stem
+
+    @staticmethod
+    def file_hash(path: Path, chunk_size: int = 1 << 20) -> str:
+        """
+        Вычислить хэш содержимого файла
+
+        Args:
+            path: Путь к файлу
+            chunk_size: Размер блока чтения
+
+        Returns:
+            str: SHA-256 в hex виде
+        """
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(chunk_size), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def source_hash(self, source: Path) -> str:
+        """
+        Хэш содержимого CSV
+
+        Берётся из манифеста, если размер и mtime файла совпадают,
+        иначе вычисляется заново.
+        """
+        source = Path(source)
+        stat = source.stat()
+        manifest = self._read_manifest(self.dataset_dir(source)) or {}
+        key = manifest.get("source", {})
+
+        if key.get("size") == stat.st_size and key.get("mtime_ns") == stat.st_mtime_ns:
+            return key["sha256"]
+
+        return self.file_hash(source)
+
+    def _read_manifest(self, directory: Path) -> Optional[Dict]:
+        manifest_path = directory / MANIFEST_NAME
+        if not manifest_path.exists():
+            return None
+        try:
+            with open(manifest_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Повреждённый манифест кэша {manifest_path}: {e}")
+            return None
+
+    def _is_fresh(self, source: Path, manifest: Dict, schema: Optional[Dict]) -> bool:
+        """
+        Проверить, соответствует ли кэш текущему CSV
+
+        Размер и mtime проверяются сразу. Если изменился только mtime
+        (файл скопировали или «тронули»), сверяется хэш содержимого.
+        """
+        if manifest.get("format_version") != CACHE_FORMAT_VERSION:
+            return False
+
+        if manifest.get("schema") != (schema or {}):
+            return False
+
+        stat = source.stat()
+        key = manifest.get("source", {})
+
+        if key.get("size") != stat.st_size:
+            return False
+
+        if key.get("mtime_ns") == stat.st_mtime_ns:
+            return True
+
+        if key.get("sha256") != self.file_hash(source):
+            return False
+
+        # Содержимое то же самое — запоминаем новый mtime
+        key["mtime_ns"] = stat.st_mtime_ns
+        try:
+            self._write_manifest(self.dataset_dir(source), manifest)
+        except OSError:
+            pass
+        return True
+
+    @staticmethod
+    def _write_manifest(directory: Path, manifest: Dict):
+        # Замена файла меняет его отметку: по ней воркеры узнают о дополнениях
+        _write_json(directory / MANIFEST_NAME, manifest)
+
+    def load(self, source: Path, schema: Optional[Dict] = None) -> Optional[pd.DataFrame]:
+        """
+        Загрузить датасет из кэша
+
+        Args:
+            source: Путь к исходному CSV файлу
+            schema: Схема типов, с которой был построен кэш
+
+        Returns:
+            Optional[pd.DataFrame]: Датафрейм или None, если кэша нет или он устарел
+        """
+        source = Path(source)
+        # Если CSV нет — пусть вызывающий код получит FileNotFoundError
+        source.stat()
+
+        directory = self.dataset_dir(source)
+        manifest = self._read_manifest(directory)
+        if manifest is None:
+            return None
+
+        if not self._is_fresh(source, manifest, schema):
+            logger.info(f"Кэш датасета устарел: {directory}")
+            return None
+
+        try:
+            columns = {}
+            for column in manifest["columns"]:
+                columns[column["name"]] = load_column(directory, column, manifest["rows"])
+            df = pd.DataFrame(columns, copy=False)
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"Не удалось прочитать кэш датасета: {e}")
+            return None
+
+        logger.info(f"✓ Датасет открыт из кэша: {directory}")
+        return df
+
+    def save(self, source: Path, df: pd.DataFrame, schema: Optional[Dict] = None,
+             deltas: Optional[List[Dict]] = None):
+        """
+        Сохранить очищенный датасет в кэш
+
+        Запись идёт во временную папку, которая затем переименовывается,
+        чтобы параллельно стартующие процессы не увидели неполный кэш.
+
+        Args:
+            source: Путь к исходному CSV файлу
+            df: Очищенный датафрейм
+            schema: Схема типов, применённая при чтении CSV
+            deltas: Дополнения, уже входящие в df (см. append)
+        """
+        source = Path(source)
+        stat = source.stat()
+        directory = self.dataset_dir(source)
+        tmp_dir = directory.with_name(f"{directory.name}.tmp-{os.getpid()}")
+
+        if tmp_dir.exists():
+            shutil.rmtree(tmp_dir)
+        tmp_dir.mkdir(parents=True)
+
+        try:
+            columns = [
+                save_column(tmp_dir, index, name, df[name])
+                for index, name in enumerate(df.columns)
+            ]
+
+            manifest = {
+                "format_version": CACHE_FORMAT_VERSION,
+                "source": {
+                    "path": str(source),
+                    "size": stat.st_size,
+                    "mtime_ns": stat.st_mtime_ns,
+                    "sha256": self.file_hash(source)
+                },
+                "schema": schema or {},
+                "rows": int(len(df)),
+                "deltas": list(deltas or []),
+                "columns": columns
+            }
+            self._write_manifest(tmp_dir, manifest)
+
+            if directory.exists():
+                shutil.rmtree(directory)
+            tmp_dir.rename(directory)
+        finally:
+            if tmp_dir.exists():
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+
+        logger.info(f"✓ Кэш датасета сохранён: {directory}")
+
+    # ========== Дополнения ==========
+
+    def stamp(self, source: Path) -> Optional[Tuple[int, int]]:
+        """Отметка манифеста (inode, mtime в нс): меняется при каждом дополнении"""
+        try:
+            stat = (self.dataset_dir(source) / MANIFEST_NAME).stat()
+        except OSError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns
+
+    def deltas(self, source: Path) -> Optional[List[Dict]]:
+        """Дополнения, записанные в кэш (None — кэша нет)"""
+        manifest = self._read_manifest(self.dataset_dir(source))
+        return None if manifest is None else manifest.get("deltas", [])
+
+    @contextmanager
+    def locked(self, source: Path) -> Iterator[None]:
+        """
+        Межпроцессная блокировка дополнений кэша
+
+        Дописывать файлы может только один воркер за раз; файл блокировки
+        лежит рядом с папкой кэша, которую save() заменяет целиком.
+        """
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        with open(self.cache_dir / f"{Path(source).stem}.lock", 'a+b') as f:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+                else:
+                    f.seek(0)
+                    msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+    def append(self, source: Path, delta: pd.DataFrame, record: Dict):
+        """
+        Дописать строки дополнения в кэш (вызывать под locked())
+
+        Запись идёт с позиции, рассчитанной по числу строк в манифесте,
+        поэтому прерванное дополнение просто перезаписывается следующим.
+
+        Args:
+            source: Путь к исходному CSV файлу
+            delta: Очищенные строки с типами колонок датасета; новые
+                категории — в конце словаря (см. DataService._align_delta)
+            record: Сведения о дополнении для манифеста
+
+        Raises:
+            ValueError: Кэша нет или коды категорий не помещаются в тип
+                колонки — кэш нужно сохранить заново через save()
+        """
+        directory = self.dataset_dir(source)
+        manifest = self._read_manifest(directory)
+        if manifest is None:
+            raise ValueError(f"Кэш датасета не найден: {directory}")
+
+        start = int(manifest["rows"])
+        for index, column in enumerate(manifest["columns"]):
+            series = delta[column["name"]]
+
+            if column["kind"] == "codes":
+                segment = {"file": f"{index:03d}-{start:010d}.json", "start": start,
+                           "rows": int(len(series))}
+                _write_json(directory / segment["file"],
+                            [None if pd.isna(value) else str(value) for value in series])
+                column["segments"] = [item for item in column.get("segments", [])
+                                      if item["start"] < start] + [segment]
+                continue
+
+            stored = np.load(directory / column["file"], mmap_mode='r')
+            if column["kind"] == "category":
+                categories = [str(value) for value in series.cat.categories]
+                if len(categories) > np.iinfo(stored.dtype).max:
+                    raise ValueError(f"Коды категорий '{column['name']}' не помещаются в {stored.dtype}")
+                _write_json(directory / column["categories"], categories)
+                values = series.cat.codes.to_numpy()
+            else:
+                values = series.to_numpy()
+
+            with open(directory / column["file"], 'r+b') as f:
+                f.seek(stored.offset + start * stored.dtype.itemsize)
+                f.write(np.ascontiguousarray(values, dtype=stored.dtype).tobytes())
+                f.truncate()
+
+        manifest["rows"] = start + int(len(delta))
+        manifest["deltas"] = manifest.get("deltas", []) + [record]
+        self._write_manifest(directory, manifest)
+
+    def extend(self, source: Path, df: pd.DataFrame) -> Optional[pd.DataFrame]:
+        """
+        Датафрейм df, дополненный строками, дописанными в кэш после него
+
+        Числовые колонки и коды категорий заново открываются через
+        memory-map на новую длину (без копирования), к строковым
+        колонкам добавляются только отрезки новых строк.
+
+        Args:
+            source: Путь к исходному CSV файлу
+            df: Текущий датафрейм (первые строки кэша)
+
+        Returns:
+            Optional[pd.DataFrame]: Датафрейм или None, если кэша нет
+        """
+        directory = self.dataset_dir(source)
+        manifest = self._read_manifest(directory)
+        if manifest is None:
+            return None
+
+        rows, start = int(manifest["rows"]), len(df)
+        columns = {}
+        for column in manifest["columns"]:
+            name = column["name"]
+            segments = [item for item in column.get("segments", []) if item["start"] >= start]
+            if column["kind"] != "codes":
+                columns[name] = load_column(directory, column, rows)
+            elif sum(item["rows"] for item in segments) == rows - start and \
+                    (not segments or segments[0]["start"] == start):
+                new = [_segment_values(directory, column, item) for item in segments]
+                columns[name] = pd.concat([df[name], *new], ignore_index=True).values
+            else:
+                # Кэш сохранён заново (save): колонка читается целиком
+                columns[name] = load_column(directory, column, rows)
+        return pd.DataFrame(columns, copy=False)
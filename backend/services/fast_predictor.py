@@ -0,0 +1,154 @@
+"""
+Быстрый путь для одиночных предсказаний
+
+После обучения (или загрузки из реестра) лучшая модель «компилируется»
+в плоские массивы NumPy с фиксированным порядком признаков:
+  - линейные модели — вектор коэффициентов и сдвиг (одно скалярное произведение);
+  - ансамбли деревьев (Random Forest, HistGradientBoosting) — развёрнутые
+    деревья (feature, threshold, left, right, value), у листьев потомки
+    указывают сами на себя, поэтому все деревья проходятся одновременно
+    за max_depth векторных шагов без масок.
+
+Предсказание не создаёт DataFrame и не вызывает sklearn, поэтому занимает
+микросекунды вместо миллисекунд.
+"""
+from typing import Dict, List, Mapping, Optional, Sequence, Union
+
+import numpy as np
+
+from backend.services.model_backends import get_backend
+from backend.services.shared_store import model_group, predict_forest
+
+FeatureInput = Union[Mapping[str, float], Sequence[float], np.ndarray]
+
+
+def _forest_depth(roots: np.ndarray, left: np.ndarray, right: np.ndarray) -> int:
+    """Максимальная глубина развёрнутого леса (число переходов до самого глубокого листа)"""
+    level = np.asarray(roots, dtype=np.int64)
+    depth = 0
+
+    while True:
+        inner = level[left[level] != -1]
+        if inner.size == 0:
+            return depth
+        level = np.concatenate([left[inner], right[inner]])
+        depth += 1
+
+
+class CompiledPredictor:
+    """Предсказатель лучшей модели по плоским массивам"""
+
+    def __init__(self, model_key: str, feature_names: List[str], arrays: Mapping[str, np.ndarray],
+                 label: Optional[str] = None):
+        """
+        Args:
+            model_key: Ключ модели из MODEL_BACKENDS
+            feature_names: Порядок признаков
+            arrays: Массивы моделей (как в model_backends.export_arrays)
+            label: Название модели (по умолчанию — из MODEL_BACKENDS)
+        """
+        self.model_key = model_key
+        self.feature_names = list(feature_names)
+        self.label = label or get_backend(model_key).label
+
+        group = model_group(arrays, model_key)
+        self.is_linear = 'coef' in group
+
+        if self.is_linear:
+            self.coef = np.ascontiguousarray(group['coef'], dtype=np.float64)
+            self.intercept = float(np.asarray(group['intercept']))
+
+        elif 'roots' in group:
+            forest = {name: np.asarray(array) for name, array in group.items()}
+            self.forest = forest
+
+            # Листья ссылаются сами на себя: лишние шаги обхода их не меняют
+            nodes = np.arange(len(forest['left']), dtype=np.int64)
+            is_leaf = forest['left'] == -1
+            self.left = np.where(is_leaf, nodes, forest['left']).astype(np.int64)
+            self.right = np.where(is_leaf, nodes, forest['right']).astype(np.int64)
+            self.feature = forest['feature'].astype(np.int64)
+            self.threshold = forest['threshold'].astype(np.float64)
+            self.value = forest['value'].astype(np.float64)
+            self.roots = forest['roots'].astype(np.int64)
+            self.depth = _forest_depth(self.roots, forest['left'], forest['right'])
+            # Предсказание = baseline + scale * сумма листьев (см. shared_store.FOREST_ARRAYS)
+            self.scale = float(forest['scale'])
+            self.baseline = float(forest['baseline'])
+            self.float32 = bool(forest['float32'])
+
+        else:
+            raise ValueError(f"Неизвестная модель: '{model_key}'")
+
+    @classmethod
+    def from_model(cls, model_key: str, feature_names: List[str], model) -> "CompiledPredictor":
+        """Скомпилировать модель из объекта sklearn"""
+        return cls(model_key, feature_names, get_backend(model_key).export(model))
+
+    @classmethod
+    def from_arrays(cls, model_key: str, feature_names: List[str],
+                    arrays: Mapping[str, np.ndarray], label: Optional[str] = None) -> "CompiledPredictor":
+        """Скомпилировать модель из массивов реестра или общего хранилища"""
+        return cls(model_key, feature_names, arrays, label)
+
+    @property
+    def model_used(self) -> str:
+        return self.label
+
+    def to_vector(self, features: FeatureInput) -> np.ndarray:
+        """
+        Вектор признаков в порядке модели
+
+        Args:
+            features: Словарь {признак: значение} или последовательность
+                значений в порядке feature_names
+        """
+        if isinstance(features, Mapping):
+            missing = [name for name in self.feature_names if name not in features]
+            if missing:
+                raise ValueError(f"Отсутствуют признаки: {set(missing)}")
+            return np.array([features[name] for name in self.feature_names], dtype=np.float64)
+
+        vector = np.asarray(features, dtype=np.float64).ravel()
+        if vector.shape[0] != len(self.feature_names):
+            raise ValueError(
+                f"Ожидается {len(self.feature_names)} признаков, получено {vector.shape[0]}"
+            )
+        return vector
+
+    def predict_one(self, features: FeatureInput) -> float:
+        """Предсказание для одного трека (без ограничения диапазона)"""
+        x = self.to_vector(features)
+
+        if np.isnan(x).any():
+            raise ValueError("Признаки не должны содержать пропуски")
+
+        if self.is_linear:
+            return float(x @ self.coef + self.intercept)
+
+        # Как в sklearn: лес сравнивает признаки в float32, бустинг — в float64,
+        # влево при x <= threshold
+        if self.float32:
+            x = x.astype(np.float32)
+        nodes = self.roots
+        for _ in range(self.depth):
+            go_left = x[self.feature[nodes]] <= self.threshold[nodes]
+            nodes = np.where(go_left, self.left[nodes], self.right[nodes])
+        return float(self.baseline + self.scale * self.value[nodes].sum())
+
+    def predict_many(self, X: np.ndarray) -> np.ndarray:
+        """Предсказание для матрицы (n, признаки) в порядке feature_names"""
+        X = np.asarray(X, dtype=np.float64)
+
+        if self.is_linear:
+            return X @ self.coef + self.intercept
+
+        return predict_forest(self.forest, X)
+
+    def info(self) -> Dict:
+        """Краткое описание скомпилированной модели"""
+        info = {"model": self.model_used, "features": len(self.feature_names)}
+        if not self.is_linear:
+            info.update({"trees": int(len(self.roots)), "nodes": int(len(self.value)),
+                         "max_depth": int(self.depth)})
+        return info
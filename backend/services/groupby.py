@@ -0,0 +1,208 @@
+"""
+Группировка по целочисленным кодам (жанр, тональность, лад, размер)
+
+Категориальные колонки датасета (DATASET_SCHEMA) факторизуются один раз
+при загрузке: pandas хранит их как массив кодов int8 и словарь значений.
+Группировка берёт коды напрямую, без хеширования строк. Коды нескольких
+ключей объединяются в один номер группы (смешанная система счисления),
+и все агрегаты считаются векторно через np.bincount:
+
+    count  — bincount(группа)
+    mean   — bincount(группа, веса=x) / count
+    var    — bincount(группа, веса=(x - mean[группа])²) / (count - 1)
+    q      — строки, упорядоченные по группе (одна поразрядная сортировка
+             кодов на все признаки), и частичное упорядочивание отрезка
+             каждой группы
+
+Фильтр по подмножеству значений ключа (например, жанров) — таблица
+допустимых кодов, тоже без сравнения строк.
+"""
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from backend.services.stats_kernel import DEFAULT_QUANTILES, column_quantiles, quantile_name
+
+
+class GroupKey:
+    """Ключ группировки: коды строк (-1 — пропуск) и значения кодов"""
+
+    def __init__(self, name: str, codes: np.ndarray, labels: list):
+        self.name = name
+        self.codes = codes
+        self.labels = labels
+
+    @classmethod
+    def from_series(cls, series: pd.Series) -> "GroupKey":
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            # Коды уже посчитаны при загрузке
+            return cls(series.name, series.cat.codes.to_numpy(), list(series.cat.categories))
+        codes, labels = pd.factorize(series, sort=True)
+        return cls(series.name, codes, list(labels))
+
+    def allowed(self, values: Sequence) -> np.ndarray:
+        """Таблица допустимых кодов для подмножества значений"""
+        positions = {str(label): i for i, label in enumerate(self.labels)}
+        unknown = [value for value in values if str(value) not in positions]
+        if unknown:
+            raise ValueError(f"Неизвестные значения '{self.name}': {unknown}")
+
+        table = np.zeros(len(self.labels), dtype=bool)
+        table[[positions[str(value)] for value in values]] = True
+        return table
+
+
+class GroupStatistics:
+    """
+    Агрегаты признаков по группам
+
+    Атрибуты:
+        by: Ключи группировки
+        index: Группы, встретившиеся в данных (Index или MultiIndex)
+        counts: Строк в каждой группе
+        features: Признаки
+        stats: {метрика: массив группы × признаки} — count, mean, var, std,
+            q25, q50, q75 (если квантили запрошены)
+    """
+
+    def __init__(self, by: List[str], index: pd.Index, counts: np.ndarray,
+                 features: List[str], stats: Dict[str, np.ndarray], appearance: list):
+        self.by = by
+        self.index = index
+        self.counts = counts
+        self.features = features
+        self.stats = stats
+        self.appearance = appearance
+
+    def frame(self, name: str) -> pd.DataFrame:
+        """Метрика в виде DataFrame: группы × признаки"""
+        return pd.DataFrame(self.stats[name], index=self.index, columns=self.features)
+
+    def count_series(self) -> pd.Series:
+        """Строк в группах по убыванию (как value_counts)"""
+        counts = pd.Series(self.counts, index=self.index, name='count')
+        return counts.sort_values(ascending=False, kind='stable')
+
+
+def _group_quantiles(values: np.ndarray, order: np.ndarray, counts: np.ndarray,
+                     quantiles: Sequence[float]) -> np.ndarray:
+    """
+    Квантили значений каждой группы (линейная интерполяция, как в pandas)
+
+    order — номера строк, упорядоченные по группе: значения группы
+    собираются в непрерывный отрезок, и квантили выбираются частичным
+    упорядочиванием отрезка, без сортировки всех строк.
+    """
+    grouped = values[order]
+    starts = np.cumsum(counts) - counts
+    result = np.full((len(quantiles), len(counts)), np.nan)
+
+    for g in np.flatnonzero(counts):
+        result[:, g] = column_quantiles(grouped[starts[g]:starts[g] + counts[g]], quantiles)
+    return result
+
+
+def group_statistics(df: pd.DataFrame, by: List[str], features: List[str],
+                     subset: Optional[Dict[str, Sequence]] = None,
+                     quantiles: Sequence[float] = DEFAULT_QUANTILES,
+                     variance: bool = True) -> GroupStatistics:
+    """
+    Агрегаты признаков по группам одного или нескольких ключей
+
+    Args:
+        df: Датафрейм
+        by: Ключи группировки (первый — основной, например 'genre')
+        features: Числовые признаки
+        subset: Оставить только эти значения ключей, например {'genre': ['Pop', 'Rock']}
+        quantiles: Квантили по группам (пустой список — не считать)
+        variance: Считать var и std (иначе только count и mean)
+
+    Returns:
+        GroupStatistics: Агрегаты по группам, встретившимся в данных
+    """
+    if not by:
+        raise ValueError("Не указаны ключи группировки")
+    missing = [name for name in list(by) + list(features) + list(subset or {}) if name not in df.columns]
+    if missing:
+        raise ValueError(f"Колонки не найдены в датасете: {missing}")
+
+    keys = [GroupKey.from_series(df[name]) for name in by]
+
+    # Строки без пропусков в ключах и прошедшие фильтр
+    mask = np.ones(len(df), dtype=bool)
+    for key in keys:
+        mask &= key.codes >= 0
+    for name, values in (subset or {}).items():
+        key = next((key for key in keys if key.name == name), None) or GroupKey.from_series(df[name])
+        mask &= key.allowed(values)[key.codes] & (key.codes >= 0)
+
+    # Без фильтра строки не копируются
+    rows_mask = slice(None) if mask.all() else mask
+
+    # Номер группы по кодам всех ключей
+    combined = np.zeros(int(mask.sum()), dtype=np.int64)
+    sizes = [len(key.labels) for key in keys]
+    for key, size in zip(keys, sizes):
+        combined = combined * size + key.codes[rows_mask]
+
+    # Только встретившиеся группы, в порядке кодов
+    total = int(np.prod(sizes))
+    rows = np.bincount(combined, minlength=total)
+    observed = np.flatnonzero(rows)
+    remap = np.full(total, -1, dtype=np.int64)
+    remap[observed] = np.arange(len(observed))
+    group = remap[combined]
+    n_groups = len(observed)
+
+    positions = np.unravel_index(observed, sizes)
+    if len(keys) == 1:
+        index = pd.Index([keys[0].labels[p] for p in positions[0]], name=keys[0].name)
+    else:
+        index = pd.MultiIndex.from_arrays(
+            [[key.labels[p] for p in pos] for key, pos in zip(keys, positions)],
+            names=[key.name for key in keys]
+        )
+    # Порядок первого появления групп (как Series.unique): достаточно начал
+    # серий одинаковых групп — строки датасета обычно идут блоками по жанру
+    run_starts = np.flatnonzero(np.r_[True, group[1:] != group[:-1]]) if len(group) else []
+    appearance = [index[g] for g in pd.unique(group[run_starts])]
+
+    shape = (n_groups, len(features))
+    stats = {name: np.full(shape, np.nan) for name in ("count", "mean") + (("var", "std") if variance else ())}
+    stats.update({quantile_name(q): np.full(shape, np.nan) for q in quantiles})
+
+    # Строки по группам (устойчивая сортировка целых кодов — поразрядная)
+    group_order = np.argsort(group, kind='stable') if len(quantiles) else None
+
+    for j, feature in enumerate(features):
+        values = df[feature].to_numpy(dtype=np.float64, na_value=np.nan)[rows_mask]
+        valid = ~np.isnan(values)
+        order = group_order
+        if valid.all():
+            feature_group, counts = group, rows[observed]
+        else:
+            values, feature_group = values[valid], group[valid]
+            counts = np.bincount(feature_group, minlength=n_groups)
+            if len(quantiles):
+                order = np.argsort(feature_group, kind='stable')
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = np.bincount(feature_group, weights=values, minlength=n_groups) / counts
+        stats["count"][:, j] = counts
+        stats["mean"][:, j] = mean
+
+        if variance:
+            centered = values - mean[feature_group]
+            with np.errstate(invalid='ignore', divide='ignore'):
+                var = np.bincount(feature_group, weights=centered * centered, minlength=n_groups) / (counts - 1)
+            var[counts < 2] = np.nan
+            stats["var"][:, j] = var
+            stats["std"][:, j] = np.sqrt(var)
+
+        if len(quantiles):
+            order_stats = _group_quantiles(values, order, counts, quantiles)
+            for i, q in enumerate(quantiles):
+                stats[quantile_name(q)][:, j] = order_stats[i]
+
+    return GroupStatistics(list(by), index, rows[observed], list(features), stats, appearance)
@@ -0,0 +1,172 @@
+"""
+Сервис фоновых задач
+
+Долгие операции (обучение моделей) выполняются в отдельном потоке.
+Запрос сразу получает ID задачи, а состояние — этап, прогресс, результат
+или ошибку — можно опрашивать через GET /model/jobs/{id}.
+"""
+import logging
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+from backend.config import TRAINING_WORKERS, JOB_HISTORY_SIZE
+
+logger = logging.getLogger(__name__)
+
+
+class JobCancelled(Exception):
+    """Задача отменена пользователем"""
+
+
+class Job:
+    """Фоновая задача с этапом, прогрессом и возможностью отмены"""
+
+    def __init__(self, kind: str, params: Optional[Dict] = None):
+        self.id = uuid.uuid4().hex[:12]
+        self.kind = kind
+        self.params = params or {}
+        self.status = "pending"
+        self.stage = "queued"
+        self.progress = 0.0
+        self.message = ""
+        self.result: Optional[Dict] = None
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self._cancel = threading.Event()
+
+    def update(self, stage: str, progress: float, message: str = ""):
+        """
+        Обновить этап и прогресс (0..1)
+
+        Вызывается из кода задачи; если задачу отменили, бросает JobCancelled,
+        поэтому это же место служит точкой проверки отмены.
+        """
+        self.check_cancelled()
+        self.stage = stage
+        self.progress = float(min(max(progress, 0.0), 1.0))
+        self.message = message
+
+    def check_cancelled(self):
+        """Бросить JobCancelled, если задачу отменили"""
+        if self._cancel.is_set():
+            raise JobCancelled(f"Задача {self.id} отменена")
+
+    def cancel(self) -> bool:
+        """Запросить отмену (возвращает False, если задача уже завершена)"""
+        if self.status in ("completed", "failed", "cancelled"):
+            return False
+        self._cancel.set()
+        return True
+
+    @property
+    def is_finished(self) -> bool:
+        return self.status in ("completed", "failed", "cancelled")
+
+    def to_dict(self) -> Dict:
+        return {
+            "job_id": self.id,
+            "kind": self.kind,
+            "params": self.params,
+            "status": self.status,
+            "stage": self.stage,
+            "progress": self.progress,
+            "message": self.message,
+            "result": self.result,
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "elapsed": (self.finished_at or time.time()) - self.started_at if self.started_at else 0.0
+        }
+
+
+class JobService:
+    """Очередь фоновых задач с ограниченным числом потоков"""
+
+    def __init__(self, max_workers: int = TRAINING_WORKERS, history_size: int = JOB_HISTORY_SIZE):
+        self.history_size = history_size
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job")
+        self._jobs: Dict[str, Job] = {}
+        self._lock = threading.Lock()
+
+    def submit(self, kind: str, target: Callable[[Job], Dict],
+               params: Optional[Dict] = None) -> Job:
+        """
+        Поставить задачу в очередь
+
+        Args:
+            kind: Тип задачи (например, 'train')
+            target: Функция задачи; получает Job для обновления прогресса
+            params: Параметры задачи (для отображения)
+
+        Returns:
+            Job: Созданная задача
+        """
+        job = Job(kind, params)
+
+        with self._lock:
+            self._jobs[job.id] = job
+            self._trim_history()
+
+        self._executor.submit(self._run, job, target)
+        logger.info(f"Задача {job.id} ({kind}) поставлена в очередь")
+        return job
+
+    def _run(self, job: Job, target: Callable[[Job], Dict]):
+        job.started_at = time.time()
+
+        try:
+            job.check_cancelled()
+            job.status = "running"
+            job.result = target(job)
+            job.status = "completed"
+            job.stage = "done"
+            job.progress = 1.0
+            logger.info(f"✓ Задача {job.id} завершена")
+        except JobCancelled:
+            job.status = "cancelled"
+            job.stage = "cancelled"
+            logger.info(f"Задача {job.id} отменена")
+        except Exception as e:
+            job.status = "failed"
+            job.error = str(e)
+            logger.error(f"✗ Задача {job.id} завершилась ошибкой: {e}")
+            logger.error(traceback.format_exc())
+        finally:
+            job.finished_at = time.time()
+
+    def _trim_history(self):
+        """Удалить самые старые завершённые задачи сверх лимита истории"""
+        finished = [job for job in self._jobs.values() if job.is_finished]
+        excess = len(self._jobs) - self.history_size
+        for job in sorted(finished, key=lambda j: j.created_at)[:max(excess, 0)]:
+            del self._jobs[job.id]
+
+    def get(self, job_id: str) -> Job:
+        """Получить задачу по ID"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is None:
+            raise KeyError(f"Задача '{job_id}' не найдена")
+        return job
+
+    def list_jobs(self, kind: Optional[str] = None) -> List[Dict]:
+        """Список задач (новые первыми)"""
+        with self._lock:
+            jobs = list(self._jobs.values())
+        jobs = [job for job in jobs if kind is None or job.kind == kind]
+        return [job.to_dict() for job in sorted(jobs, key=lambda j: j.created_at, reverse=True)]
+
+    def cancel(self, job_id: str) -> bool:
+        """Отменить задачу (выполняющаяся остановится на ближайшей проверке)"""
+        return self.get(job_id).cancel()
+
+
+# Глобальный экземпляр сервиса
+job_service = JobService()
@@ -0,0 +1,106 @@
+"""
+Подключаемые модели регрессии
+
+Список моделей задаётся в config.MODEL_BACKENDS: ключ, класс sklearn,
+тип и гиперпараметры. Тип определяет, как обученная модель разворачивается
+в плоские массивы для реестра, общей памяти и быстрых предсказаний:
+  - linear — коэффициенты и сдвиг;
+  - forest — деревья случайного леса, предсказание = среднее листьев;
+  - boosting — деревья HistGradientBoosting, предсказание = начальное
+    значение + сумма листьев.
+
+Массивы модели хранятся под ключами вида <ключ модели>__<имя массива>.
+"""
+import importlib
+import pickle
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+from backend.config import MODEL_BACKENDS, DEFAULT_MODELS
+from backend.services.shared_store import ARRAY_SEPARATOR, flatten_forest, flatten_boosting
+
+
+class ModelBackend:
+    """Описание одной модели из MODEL_BACKENDS"""
+
+    def __init__(self, key: str, label: str, estimator: str, kind: str, params: Dict):
+        if kind not in ("linear", "forest", "boosting"):
+            raise ValueError(f"Неизвестный тип модели '{kind}' у '{key}'")
+
+        self.key = key
+        self.label = label
+        self.estimator = estimator
+        self.kind = kind
+        self.params = dict(params)
+
+    def create(self, **overrides):
+        """Новый (необученный) экземпляр модели sklearn"""
+        module_name, class_name = self.estimator.rsplit(".", 1)
+        estimator_class = getattr(importlib.import_module(module_name), class_name)
+        return estimator_class(**{**self.params, **overrides})
+
+    def export(self, model) -> Dict[str, np.ndarray]:
+        """Плоские массивы обученной модели с префиксом ключа"""
+        if self.kind == "linear":
+            arrays = {
+                'coef': np.asarray(model.coef_, dtype=np.float64),
+                'intercept': np.asarray(model.intercept_, dtype=np.float64)
+            }
+        elif self.kind == "forest":
+            arrays = flatten_forest(model)
+        else:
+            arrays = flatten_boosting(model)
+
+        return {f"{self.key}{ARRAY_SEPARATOR}{name}": array for name, array in arrays.items()}
+
+    def to_dict(self) -> Dict:
+        return {"key": self.key, "label": self.label, "kind": self.kind}
+
+
+def model_size_bytes(model) -> int:
+    """Размер обученной модели (сериализованный объект sklearn)"""
+    return len(pickle.dumps(model, protocol=pickle.HIGHEST_PROTOCOL))
+
+
+def export_arrays(models: Dict[str, object]) -> Dict[str, np.ndarray]:
+    """Массивы всех обученных моделей {ключ: модель} для сохранения в .npy"""
+    arrays = {}
+    for key, model in models.items():
+        arrays.update(get_backend(key).export(model))
+    return arrays
+
+
+def get_backend(key: str) -> ModelBackend:
+    """Модель по ключу"""
+    if key not in BACKENDS:
+        raise ValueError(f"Неизвестная модель: '{key}'. Доступные модели: {list(BACKENDS)}")
+    return BACKENDS[key]
+
+
+def resolve_models(keys: Optional[Iterable[str]] = None) -> List[ModelBackend]:
+    """
+    Модели для обучения
+
+    Args:
+        keys: Ключи из MODEL_BACKENDS (по умолчанию — DEFAULT_MODELS)
+
+    Raises:
+        ValueError: Неизвестный ключ или пустой список
+    """
+    keys = list(dict.fromkeys(keys if keys is not None else DEFAULT_MODELS))
+    if not keys:
+        raise ValueError("Не выбрано ни одной модели для обучения")
+    return [get_backend(key) for key in keys]
+
+
+def label_of(key: Optional[str]) -> Optional[str]:
+    """Название модели по ключу (ключ как есть, если модели нет в config)"""
+    if key is None:
+        return None
+    return BACKENDS[key].label if key in BACKENDS else key
+
+
+BACKENDS: Dict[str, ModelBackend] = {
+    key: ModelBackend(key, **spec) for key, spec in MODEL_BACKENDS.items()
+}
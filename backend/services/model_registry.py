@@ -0,0 +1,186 @@
+"""
+Реестр обученных моделей на диске
+
+Каждое обучение сохраняется в отдельную папку data/models/<версия>/:
+  - *.npy — массивы моделей (коэффициенты линейных моделей и развёрнутые
+    ансамбли деревьев, см. model_backends.py). При старте они открываются через memory-map, поэтому
+    /model/predict работает через секунды после запуска без переобучения;
+  - estimators.joblib — сами объекты sklearn (без сжатия), нужны только
+    для дообучения;
+  - meta.json — признаки, метрики, гиперпараметры и версия датасета.
+
+Файл ACTIVE указывает на версию, которая загружается при старте.
+"""
+import json
+import logging
+import os
+import shutil
+import time
+import uuid
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import joblib
+
+from backend.services.model_backends import export_arrays
+from backend.services.shared_store import (
+    META_NAME, SharedModels, save_model_dir, open_model_dir
+)
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_NAME = "ACTIVE"
+ESTIMATORS_NAME = "estimators.joblib"
+
+
+class ModelRegistry:
+    """Версионированное хранилище моделей в data/models/"""
+
+    def __init__(self, directory: Path, keep: int = 10):
+        self.directory = Path(directory)
+        self.keep = keep
+
+    @staticmethod
+    def new_version() -> str:
+        """Новая уникальная версия (сортируется по времени)"""
+        return f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:6]}"
+
+    def register(self, models: Dict[str, object], meta: Dict,
+                 version: Optional[str] = None, activate: bool = True) -> str:
+        """
+        Сохранить обученные модели как новую версию
+
+        Папка сначала пишется во временное место и переименовывается
+        целиком, поэтому частично записанная версия не видна при старте.
+
+        Args:
+            models: Обученные модели {ключ из MODEL_BACKENDS: объект sklearn}
+            meta: Метаданные (feature_names, metrics, best_model, best_model_key, ...)
+            version: Версия (по умолчанию — новая)
+            activate: Сделать версию активной
+
+        Returns:
+            str: Версия
+        """
+        version = version or self.new_version()
+        meta = {**meta, "version": version, "created_at": time.time()}
+
+        tmp = self.directory / f".tmp-{version}"
+        save_model_dir(tmp, export_arrays(models), meta)
+        joblib.dump(dict(models), tmp / ESTIMATORS_NAME, compress=0)
+        os.replace(tmp, self.directory / version)
+
+        if activate:
+            self.activate(version)
+
+        self._cleanup()
+        logger.info(f"✓ Модели сохранены в реестр: {version}")
+        return version
+
+    def versions(self) -> List[str]:
+        """Все сохранённые версии (старые первыми)"""
+        if not self.directory.exists():
+            return []
+
+        return sorted(
+            path.name for path in self.directory.iterdir()
+            if path.is_dir() and not path.name.startswith(".") and (path / META_NAME).exists()
+        )
+
+    def active_version(self) -> Optional[str]:
+        """Активная версия (или последняя сохранённая, если указателя нет)"""
+        try:
+            version = (self.directory / ACTIVE_NAME).read_text(encoding='utf-8').strip()
+        except OSError:
+            version = ""
+
+        if version and (self.directory / version / META_NAME).exists():
+            return version
+
+        versions = self.versions()
+        return versions[-1] if versions else None
+
+    def activate(self, version: str):
+        """Сделать версию активной (атомарная запись указателя)"""
+        if version not in self.versions():
+            raise ValueError(f"Версия модели '{version}' не найдена в реестре")
+
+        pointer_tmp = self.directory / f"{ACTIVE_NAME}.tmp-{os.getpid()}"
+        pointer_tmp.write_text(version, encoding='utf-8')
+        os.replace(pointer_tmp, self.directory / ACTIVE_NAME)
+
+    def meta(self, version: str) -> Dict:
+        """Метаданные версии"""
+        try:
+            with open(self.directory / version / META_NAME, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except OSError:
+            raise ValueError(f"Версия модели '{version}' не найдена в реестре")
+
+    def list_models(self) -> List[Dict]:
+        """Краткие сведения о всех версиях (новые первыми)"""
+        active = self.active_version()
+        result = []
+
+        for version in reversed(self.versions()):
+            meta = self.meta(version)
+            metrics = meta.get("metrics", {})
+            result.append({
+                "version": version,
+                "active": version == active,
+                "created_at": meta.get("created_at"),
+                "best_model": meta.get("best_model"),
+                "dataset_version": meta.get("dataset_version"),
+                "r2_score": {
+                    name: values["r2_score"] for name, values in metrics.items()
+                    if isinstance(values, dict) and "r2_score" in values
+                }
+            })
+
+        return result
+
+    def open(self, version: Optional[str] = None) -> Optional[SharedModels]:
+        """
+        Открыть массивы версии через memory-map (без загрузки sklearn)
+
+        Args:
+            version: Версия (по умолчанию — активная)
+
+        Returns:
+            Optional[SharedModels]: Модели или None, если реестр пуст
+        """
+        version = version or self.active_version()
+        if version is None:
+            return None
+
+        try:
+            return open_model_dir(self.directory / version, version)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Не удалось открыть модели {version} из реестра: {e}")
+            return None
+
+    def load_estimators(self, version: str, mmap: bool = True) -> Dict[str, object]:
+        """
+        Загрузить объекты sklearn версии {ключ модели: объект}
+
+        Args:
+            version: Версия
+            mmap: Открыть массивы через memory-map (только чтение). Для
+                дообучения нужен False: warm_start пишет в массивы моделей
+        """
+        path = self.directory / version / ESTIMATORS_NAME
+        if not path.exists():
+            raise ValueError(f"Версия модели '{version}' не найдена в реестре")
+
+        return joblib.load(path, mmap_mode='r' if mmap else None)
+
+    def _cleanup(self):
+        """Удалить старые версии сверх лимита (активная не удаляется)"""
+        if self.keep <= 0:
+            return
+
+        active = self.active_version()
+        versions = self.versions()
+        for version in versions[:max(len(versions) - self.keep, 0)]:
+            if version != active:
+                shutil.rmtree(self.directory / version, ignore_errors=True)
@@ -5,28 +5,276 @@
 import pandas as pd
 import numpy as np
 from sklearn.model_selection import train_test_split
-from sklearn.linear_model import LinearRegression
-from sklearn.ensemble import RandomForestRegressor
 from sklearn.metrics import r2_score, mean_squared_error, mean_absolute_error
-from typing import Dict, Tuple, Optional
+from sklearn.inspection import permutation_importance
+from pathlib import Path
+from typing import Callable, Dict, List, Tuple, Optional
+import copy
 import logging
+import threading
+import time
 import traceback
-from backend.config import RANDOM_STATE, TEST_SIZE, N_ESTIMATORS, MODEL_FEATURES
+from backend.config import (
+    RANDOM_STATE, TEST_SIZE, MODEL_FEATURES, CV_FOLDS, DATASET_SCHEMA, STREAM_CHUNK_SIZE,
+    INCREMENTAL_RF_TREES, INCREMENTAL_BOOSTING_ITERATIONS,
+    INCREMENTAL_HOLDOUT_FRACTION, INCREMENTAL_HOLDOUT_MIN_ROWS,
+    SHARED_MEMORY_MODE, SHARED_DIR, SHARED_KEEP_VERSIONS, SHARED_SYNC_INTERVAL_MS,
+    MODELS_DIR, MODEL_REGISTRY_KEEP,
+    PREDICT_CACHE_SIZE, PREDICT_CACHE_TTL, PREDICT_CACHE_DECIMALS
+)
+from backend.services.job_service import JobCancelled
+from backend.services.model_backends import (
+    ModelBackend, get_backend, resolve_models, export_arrays, model_size_bytes
+)
+from backend.services.ols import OLSStatistics, fit_streaming
+from backend.services.stream_reader import SourceReader
+from backend.services.model_registry import ModelRegistry
+from backend.services.fast_predictor import CompiledPredictor, FeatureInput
+from backend.services.prediction_cache import PredictionCache
+from backend.services.shared_store import SharedModelStore, SharedModels
+from backend.services.training_pool import training_pool
 
 logger = logging.getLogger(__name__)
 
+# Колбэк прогресса обучения: (этап, доля 0..1, сообщение)
+ProgressCallback = Callable[..., None]
+
+# Строк тестовой выборки для permutation importance, если ни одна
+# из обученных моделей не даёт feature_importances_
+IMPORTANCE_SAMPLE_SIZE = 5000
+
 
 class ModelService:
     def __init__(self):
-        self.lr_model: Optional[LinearRegression] = None
-        self.rf_model: Optional[RandomForestRegressor] = None
+        # Обученные модели sklearn {ключ из MODEL_BACKENDS: модель}
+        self.models: Dict[str, object] = {}
         self.metrics: Optional[Dict] = None
         self.best_model: Optional[str] = None
+        self.best_model_key: Optional[str] = None
         self.feature_names: Optional[list] = None
         self.X_test = None
         self.y_test = None
-        self.lr_pred = None
-        self.rf_pred = None
+        # Предсказания на тестовой выборке {ключ модели: массив}
+        self.predictions: Dict[str, np.ndarray] = {}
+        # Модели из общего хранилища (режим нескольких воркеров)
+        self.shared: Optional[SharedModels] = None
+        self.shared_store = SharedModelStore(SHARED_DIR, keep=SHARED_KEEP_VERSIONS)
+        # Когда и с какой отметкой CURRENT общее хранилище проверялось последний раз
+        self._shared_checked = 0.0
+        self._shared_stamp = None
+        # Реестр сохранённых версий моделей
+        self.registry = ModelRegistry(MODELS_DIR, keep=MODEL_REGISTRY_KEEP)
+        # Лучшая модель в виде плоских массивов (быстрый путь для одиночных предсказаний)
+        self.compiled: Optional[CompiledPredictor] = None
+        # Кэш одиночных предсказаний (очищается при подмене моделей)
+        self.prediction_cache = PredictionCache(
+            PREDICT_CACHE_SIZE, PREDICT_CACHE_TTL, PREDICT_CACHE_DECIMALS
+        )
+        # Версия текущих моделей (меняется при каждой подмене)
+        self.model_version: Optional[str] = None
+        # Достаточные статистики линейной регрессии (для дообучения на новых строках)
+        self.ols_stats: Optional[OLSStatistics] = None
+        # Защищает подмену моделей от одновременного чтения
+        self._lock = threading.RLock()
+
+    # Прежние атрибуты для двух фиксированных моделей
+
+    @property
+    def lr_model(self):
+        return self.models.get("linear_regression")
+
+    @property
+    def rf_model(self):
+        return self.models.get("random_forest")
+
+    @property
+    def lr_pred(self) -> Optional[np.ndarray]:
+        return self.predictions.get("linear_regression")
+
+    @property
+    def rf_pred(self) -> Optional[np.ndarray]:
+        return self.predictions.get("random_forest")
+
+    def _sync_shared(self, force: bool = False):
+        """
+        В режиме общей памяти подхватить модели, опубликованные любым воркером
+
+        Модели sklearn при этом освобождаются: предсказания идут по массивам,
+        открытым через mmap и общим для всех процессов.
+
+        Вызывается на каждом предсказании, поэтому CURRENT проверяется не чаще
+        раза в SHARED_SYNC_INTERVAL_MS, и то одним stat: файл читается, только
+        если его отметка изменилась. Модели другого воркера подхватываются
+        с задержкой до этого интервала.
+
+        Args:
+            force: Проверить сразу (после собственной публикации)
+        """
+        if not SHARED_MEMORY_MODE:
+            return
+
+        now = time.monotonic()
+        if not force and now - self._shared_checked < SHARED_SYNC_INTERVAL_MS / 1000:
+            return
+        self._shared_checked = now
+
+        stamp = self.shared_store.current_stamp()
+        if stamp is None or (stamp == self._shared_stamp and self.shared is not None):
+            return
+
+        version = self.shared_store.current_version()
+        if version is None:
+            return
+        if self.shared is not None and self.shared.version == version:
+            self._shared_stamp = stamp
+            return
+
+        shared = self.shared_store.attach(version)
+        if shared is None:
+            return
+        self._shared_stamp = stamp
+
+        compiled = CompiledPredictor.from_arrays(
+            shared.meta["best_model_key"], shared.feature_names, shared.arrays,
+            shared.meta["best_model"]
+        )
+
+        with self._lock:
+            self.shared = shared
+            self.compiled = compiled
+            self.models = {}
+            self.metrics = shared.meta["metrics"]
+            self.best_model = shared.meta["best_model"]
+            self.best_model_key = shared.meta["best_model_key"]
+            self.feature_names = shared.feature_names
+            self.model_version = shared.meta.get("model_version", version)
+            self.prediction_cache.clear()
+        logger.info(f"✓ Подключены общие модели версии {version}")
+
+    def _snapshot(self) -> Dict:
+        """
+        Согласованный снимок текущих моделей
+
+        Читается под той же блокировкой, что и подмена, поэтому предсказание
+        никогда не смешивает модели и признаки разных обучений.
+        """
+        with self._lock:
+            return {
+                "models": self.models,
+                "shared": self.shared,
+                "best_model": self.best_model,
+                "best_model_key": self.best_model_key,
+                "feature_names": self.feature_names,
+                "metrics": self.metrics,
+                "model_version": self.model_version,
+                "compiled": self.compiled,
+                "ols_stats": self.ols_stats
+            }
+
+    def _predict_array(self, model_key: str, X, snapshot: Optional[Dict] = None) -> np.ndarray:
+        """Предсказание моделью sklearn или её опубликованной копией"""
+        snapshot = snapshot or self._snapshot()
+        model = snapshot["models"].get(model_key)
+
+        if model is None and snapshot["shared"] is not None:
+            return snapshot["shared"].predict(model_key, np.asarray(X, dtype=np.float64))
+
+        if model is None:
+            raise ValueError(f"Модель '{model_key}' не обучена")
+
+        # Модели обучаются в пуле процессов на матрице без имён колонок
+        return model.predict(np.asarray(X, dtype=np.float64))
+
+    def load_version(self, version: Optional[str] = None) -> bool:
+        """
+        Загрузить модели из реестра без переобучения
+
+        Массивы открываются через memory-map, поэтому загрузка занимает
+        доли секунды. Объекты sklearn не загружаются — предсказания идут
+        по развёрнутым массивам, как в режиме общей памяти.
+
+        Args:
+            version: Версия из реестра (по умолчанию — активная)
+
+        Returns:
+            bool: True если модели загружены
+        """
+        models = self.registry.open(version)
+        if models is None:
+            if version is not None:
+                raise ValueError(f"Версия модели '{version}' не найдена в реестре")
+            return False
+
+        if version is not None:
+            self.registry.activate(version)
+
+        compiled = CompiledPredictor.from_arrays(
+            models.meta["best_model_key"], models.feature_names, models.arrays,
+            models.meta["best_model"]
+        )
+
+        with self._lock:
+            self.shared = models
+            self.compiled = compiled
+            self.models = {}
+            self.metrics = models.meta["metrics"]
+            self.best_model = models.meta["best_model"]
+            self.best_model_key = models.meta["best_model_key"]
+            self.feature_names = models.feature_names
+            self.X_test = None
+            self.y_test = None
+            self.predictions = {}
+            self.model_version = models.version
+            self.ols_stats = self._restore_ols_stats(models.meta)
+            self.prediction_cache.clear()
+
+        # Остальные воркеры переключатся через общее хранилище
+        if SHARED_MEMORY_MODE:
+            self.publish_registry(models)
+
+        logger.info(f"✓ Загружены модели из реестра: {models.version}")
+        return True
+
+    def publish_registry(self, models: Optional[SharedModels] = None) -> bool:
+        """
+        Опубликовать версию из реестра в общее хранилище, если её там ещё нет
+
+        При старте с --workers N каждый воркер загружает одну и ту же
+        активную версию; повторная публикация тех же массивов лишь
+        переключала бы всех воркеров по кругу. run.py вызывает этот метод
+        в родительском процессе до запуска воркеров.
+
+        Args:
+            models: Открытая версия реестра (по умолчанию — активная)
+
+        Returns:
+            bool: True если версия опубликована сейчас
+        """
+        models = models or self.registry.open()
+        if models is None:
+            return False
+
+        published = self.shared_store.current_meta()
+        if published is not None and published.get("model_version") == models.version:
+            return False
+
+        self.shared_store.publish(dict(models.arrays), {
+            "feature_names": models.feature_names,
+            "metrics": models.meta["metrics"],
+            "best_model": models.meta["best_model"],
+            "best_model_key": models.meta["best_model_key"],
+            "model_version": models.version
+        })
+        return True
+
+    @staticmethod
+    def _restore_ols_stats(meta: Dict) -> Optional[OLSStatistics]:
+        stats = meta.get("ols_stats")
+        return OLSStatistics.from_dict(stats) if stats else None
+
+    def list_versions(self) -> list:
+        """Версии моделей в реестре"""
+        return self.registry.list_models()
 
     def prepare_data(self, df: pd.DataFrame, target: str = 'popularity',
                      features: list = None) -> Tuple:
@@ -90,110 +338,746 @@ class ModelService:
             logger.error(traceback.format_exc())
             raise
 
-    def train_models(self, df: pd.DataFrame, target: str = 'popularity') -> Dict:
+    @staticmethod
+    def _model_details(backend: ModelBackend, model, features: list) -> Dict:
+        """Параметры обученной модели для метрик"""
+        if backend.kind == "linear":
+            return {"coefficients": dict(zip(features, model.coef_.tolist()))}
+        if backend.kind == "forest":
+            return {"n_estimators": len(model.estimators_)}
+        return {"n_iter": int(model.n_iter_)}
+
+    @staticmethod
+    def _selection_score(model_metrics: Dict) -> float:
+        """R² для выбора лучшей модели: среднее по фолдам или на отложенной выборке"""
+        cv = model_metrics.get("cv")
+        return cv["r2_score_mean"] if cv else model_metrics["r2_score"]
+
+    @staticmethod
+    def _feature_importance(models: Dict[str, object], best_key: str,
+                            features: list, X_test, y_test) -> Dict[str, float]:
+        """
+        Важность признаков: feature_importances_ первой модели, которая их даёт
+        (Random Forest), иначе permutation importance лучшей модели на
+        подвыборке тестовых данных
+        """
+        for model in models.values():
+            if hasattr(model, "feature_importances_"):
+                return dict(zip(features, model.feature_importances_.tolist()))
+
+        n = min(len(X_test), IMPORTANCE_SAMPLE_SIZE)
+        result = permutation_importance(
+            models[best_key], X_test[:n], np.asarray(y_test)[:n],
+            n_repeats=3, random_state=RANDOM_STATE
+        )
+        importance = np.clip(result.importances_mean, 0, None)
+        total = importance.sum()
+        if total > 0:
+            importance = importance / total
+        return dict(zip(features, importance.tolist()))
+
+    @classmethod
+    def _comparison(cls, metrics: Dict, keys: List[str]) -> List[Dict]:
+        """Сводка метрик моделей (лучшие первыми)"""
+        return [
+            {
+                "key": key,
+                **{name: metrics[key][name] for name in (
+                    "label", "r2_score", "rmse", "train_time_s", "cpu_time_s",
+                    "model_size_mb", "r2_per_cpu_second", "r2_per_mb"
+                )},
+                "cv_r2_mean": metrics[key]["cv"]["r2_score_mean"] if metrics[key]["cv"] else None,
+                "cv_r2_std": metrics[key]["cv"]["r2_score_std"] if metrics[key]["cv"] else None
+            }
+            for key in sorted(keys, key=lambda key: -cls._selection_score(metrics[key]))
+        ]
+
+    def train_models(self, df: pd.DataFrame, target: str = 'popularity',
+                     progress: Optional[ProgressCallback] = None,
+                     dataset_version: Optional[str] = None,
+                     models: Optional[List[str]] = None,
+                     params: Optional[Dict[str, Dict]] = None) -> Dict:
+        """
+        Обучить выбранные модели из MODEL_BACKENDS и сравнить их
+
+        Модели оцениваются k-fold кросс-валидацией на обучающей выборке
+        (среднее и стандартное отклонение метрик) и на отложенной тестовой.
+        Итоговое обучение и все фолды выполняются параллельно в пуле
+        процессов (см. training_pool.py). Лучшая модель — с наибольшим
+        средним R² на фолдах.
+
+        Для каждой модели, кроме точности, измеряются время обучения,
+        процессорное время и размер модели, чтобы выбирать модель по
+        точности на CPU-секунду и на мегабайт.
+
+        Модели обучаются «в стороне» и подменяют текущие одной операцией
+        под блокировкой, поэтому параллельные предсказания никогда не видят
+        наполовину обновлённое состояние.
+
+        Args:
+            df: Датафрейм
+            target: Целевая колонка
+            progress: Колбэк (этап, доля 0..1, сообщение). Может бросить
+                JobCancelled — тогда обучение прерывается без изменения моделей
+            dataset_version: Версия датасета (сохраняется в реестре моделей)
+            models: Ключи моделей из MODEL_BACKENDS (по умолчанию — DEFAULT_MODELS)
+            params: Гиперпараметры поверх backend.params: {ключ модели: параметры}
+                (например, tuning_service.applied_params()); сохраняются в реестре
+
+        Returns:
+            Dict: Метрики и сведения об обучении
+        """
+        report = progress or (lambda stage, value, message="": None)
+        backends = resolve_models(models)
+        model_params = {backend.key: {**backend.params, **(params or {}).get(backend.key, {})}
+                        for backend in backends}
+
         try:
             logger.info("="*60)
             logger.info("Начало обучения моделей регрессии")
             logger.info("="*60)
 
             # Подготовка данных
+            report("data_prep", 0.0, "Подготовка данных")
             X_train, X_test, y_train, y_test, features = self.prepare_data(df, target)
-            self.feature_names = features
-            self.X_test = X_test
-            self.y_test = y_test
-
-            # ========== Linear Regression ==========
-            logger.info("\n[1/2] Обучение Linear Regression...")
-            try:
-                self.lr_model = LinearRegression()
-                self.lr_model.fit(X_train, y_train)
-                self.lr_pred = self.lr_model.predict(X_test)
-
-                lr_r2 = r2_score(y_test, self.lr_pred)
-                lr_rmse = np.sqrt(mean_squared_error(y_test, self.lr_pred))
-                lr_mae = mean_absolute_error(y_test, self.lr_pred)
-
-                logger.info(f"✓ Linear Regression обучена")
-                logger.info(f"  R² = {lr_r2:.4f}, RMSE = {lr_rmse:.2f}, MAE = {lr_mae:.2f}")
-            except Exception as e:
-                logger.error(f"Ошибка обучения Linear Regression: {e}")
-                raise
-
-            # ========== Random Forest ==========
-            logger.info("\n[2/2] Обучение Random Forest Regressor...")
-            try:
-                self.rf_model = RandomForestRegressor(
-                    n_estimators=N_ESTIMATORS,
-                    random_state=RANDOM_STATE,
-                    n_jobs=-1,
-                    max_depth=15,
-                    min_samples_split=10,
-                    min_samples_leaf=4,
-                    verbose=0
+            report("data_prep", 0.05, f"Train: {len(X_train):,}, test: {len(X_test):,}")
+
+            # ========== Обучение и кросс-валидация ==========
+            # Итоговое обучение всех моделей и их фолды идут одновременно
+            # в пуле процессов, матрица признаков общая через mmap
+            logger.info(f"\nОбучение моделей: {', '.join(b.label for b in backends)} "
+                        f"(фолдов: {CV_FOLDS}, процессов: {training_pool.processes})")
+            report("training", 0.05, "Обучение моделей и кросс-валидация")
+            wall_start = time.perf_counter()
+            results = training_pool.run(
+                X_train.to_numpy(dtype=np.float64), y_train.to_numpy(dtype=np.float64),
+                [backend.key for backend in backends], CV_FOLDS,
+                progress=lambda value, message="": report("training", 0.05 + 0.85 * value, message),
+                params=model_params
+            )
+            wall_time = time.perf_counter() - wall_start
+
+            trained: Dict[str, object] = {}
+            predictions: Dict[str, np.ndarray] = {}
+            metrics: Dict = {}
+            X_holdout = X_test.to_numpy(dtype=np.float64)
+
+            # Статистики XᵀX и Xᵀy обучающей выборки: по ним линейная
+            # регрессия дообучается на новых строках без повторного прохода
+            ols_stats = None
+            if any(backend.kind == "linear" for backend in backends):
+                ols_stats = OLSStatistics.from_data(
+                    X_train.to_numpy(dtype=np.float64), y_train.to_numpy(dtype=np.float64)
                 )
-                self.rf_model.fit(X_train, y_train)
-                self.rf_pred = self.rf_model.predict(X_test)
 
-                rf_r2 = r2_score(y_test, self.rf_pred)
-                rf_rmse = np.sqrt(mean_squared_error(y_test, self.rf_pred))
-                rf_mae = mean_absolute_error(y_test, self.rf_pred)
+            for backend in backends:
+                result = results[backend.key]
+                model = result["model"]
+                pred = model.predict(X_holdout)
+                r2 = float(r2_score(y_test, pred))
+                cv = result["cv"]
+                cpu_time = result["cpu_time_s"]
+                size_mb = model_size_bytes(model) / 1024 ** 2
+
+                metrics[backend.key] = {
+                    "label": backend.label,
+                    "r2_score": r2,
+                    "rmse": float(np.sqrt(mean_squared_error(y_test, pred))),
+                    "mae": float(mean_absolute_error(y_test, pred)),
+                    "cv": cv,
+                    "train_time_s": result["train_time_s"],
+                    "cpu_time_s": cpu_time,
+                    "model_size_mb": size_mb,
+                    "r2_per_cpu_second": r2 / cpu_time if cpu_time > 0 else None,
+                    "r2_per_mb": r2 / size_mb if size_mb > 0 else None,
+                    **self._model_details(backend, model, features)
+                }
+                trained[backend.key] = model
+                predictions[backend.key] = pred
+
+                logger.info(f"✓ {backend.label}: R² = {r2:.4f}"
+                            + (f", CV R² = {cv['r2_score_mean']:.4f} ± {cv['r2_score_std']:.4f}" if cv else "")
+                            + f", обучение {result['train_time_s']:.1f} с, {size_mb:.2f} МБ")
+
+            report("finalizing", 0.95, "Сохранение результатов")
+
+            # Определяем лучшую модель: по среднему R² на фолдах, без CV — на отложенной выборке
+            best_key = max(trained, key=lambda key: self._selection_score(metrics[key]))
+            best_model = metrics[best_key]["label"]
+            best_r2 = metrics[best_key]["r2_score"]
+            logger.info(f"\n✓ {best_model} показывает лучший результат "
+                        f"(R² = {self._selection_score(metrics[best_key]):.4f})")
+            logger.info("="*60)
 
-                logger.info(f"✓ Random Forest обучена")
-                logger.info(f"  R² = {rf_r2:.4f}, RMSE = {rf_rmse:.2f}, MAE = {rf_mae:.2f}")
-            except Exception as e:
-                logger.error(f"Ошибка обучения Random Forest: {e}")
-                raise
+            metrics["training"] = {
+                "cv_folds": CV_FOLDS if CV_FOLDS >= 2 else 0,
+                "processes": training_pool.processes,
+                "wall_time_s": wall_time,
+                "selection": "cv_r2_mean" if CV_FOLDS >= 2 else "holdout_r2"
+            }
 
             # ========== Feature Importance ==========
-            feature_importance = dict(zip(features, self.rf_model.feature_importances_.tolist()))
-
-            # Сохраняем метрики
-            self.metrics = {
-                "linear_regression": {
-                    "r2_score": float(lr_r2),
-                    "rmse": float(lr_rmse),
-                    "mae": float(lr_mae),
-                    "coefficients": dict(zip(features, self.lr_model.coef_.tolist()))
-                },
-                "random_forest": {
-                    "r2_score": float(rf_r2),
-                    "rmse": float(rf_rmse),
-                    "mae": float(rf_mae),
-                    "n_estimators": N_ESTIMATORS
-                },
-                "feature_importance": feature_importance
-            }
+            metrics["feature_importance"] = self._feature_importance(
+                trained, best_key, features, X_holdout, y_test
+            )
 
-            # Определяем лучшую модель
-            if rf_r2 > lr_r2:
-                self.best_model = "Random Forest"
-                logger.info(f"\n✓ Random Forest показывает лучший результат (R² = {rf_r2:.4f})")
-            else:
-                self.best_model = "Linear Regression"
-                logger.info(f"\n✓ Linear Regression показывает лучший результат (R² = {lr_r2:.4f})")
+            # Сравнение моделей (лучшие первыми)
+            metrics["comparison"] = self._comparison(metrics, list(trained))
 
-            logger.info("="*60)
+            # Последняя точка отмены: дальше модели сохраняются и подменяются
+            report("finalizing", 0.97, "Сохранение в реестр моделей")
 
-            improvement = float((rf_r2 - lr_r2) / abs(lr_r2) * 100) if lr_r2 != 0 else 0
+            version = self.registry.new_version()
+            try:
+                self.registry.register(trained, {
+                    "feature_names": features,
+                    "metrics": metrics,
+                    "best_model": best_model,
+                    "best_model_key": best_key,
+                    "models": list(trained),
+                    "target": target,
+                    "dataset_version": dataset_version,
+                    "train_size": int(len(X_train)),
+                    "test_size": int(len(X_test)),
+                    "hyperparameters": {
+                        "random_state": RANDOM_STATE,
+                        "test_size": TEST_SIZE,
+                        **model_params
+                    },
+                    "ols_stats": ols_stats.to_dict() if ols_stats else None
+                }, version=version)
+            except OSError as e:
+                logger.warning(f"Не удалось сохранить модели в реестр: {e}")
+
+            compiled = CompiledPredictor.from_model(best_key, features, trained[best_key])
+
+            # Атомарно подменяем модели
+            with self._lock:
+                self.compiled = compiled
+                self.models = trained
+                self.metrics = metrics
+                self.best_model = best_model
+                self.best_model_key = best_key
+                self.feature_names = features
+                self.X_test = X_test
+                self.y_test = y_test
+                self.predictions = predictions
+                self.shared = None
+                self.model_version = version
+                self.ols_stats = ols_stats
+                self.prediction_cache.clear()
+
+            if SHARED_MEMORY_MODE:
+                self.shared_store.publish(export_arrays(trained), {
+                    "feature_names": features,
+                    "metrics": metrics,
+                    "best_model": best_model,
+                    "best_model_key": best_key,
+                    "model_version": version
+                })
+                self._sync_shared(force=True)
+
+            # Прирост лучшей модели относительно линейной регрессии
+            lr_r2 = metrics.get("linear_regression", {}).get("r2_score")
+            improvement = float((best_r2 - lr_r2) / abs(lr_r2) * 100) if lr_r2 else 0
 
             # Возвращаем результаты
             return {
                 "status": "success",
-                "best_model": self.best_model,
-                "metrics": self.metrics,
+                "model_version": version,
+                "best_model": best_model,
+                "best_model_key": best_key,
+                "models": [backend.to_dict() for backend in backends],
+                "metrics": metrics,
                 "features_used": features,
                 "train_size": int(len(X_train)),
                 "test_size": int(len(X_test)),
                 "improvement": improvement
             }
 
+        except JobCancelled:
+            logger.info("Обучение моделей отменено, текущие модели не изменены")
+            raise
+
         except Exception as e:
             logger.error(f"Критическая ошибка обучения модели: {e}")
             logger.error(traceback.format_exc())
             raise
 
+    def train_linear_streaming(self, source: Path, target: str = 'popularity',
+                               progress: Optional[ProgressCallback] = None,
+                               chunk_size: int = STREAM_CHUNK_SIZE) -> Dict:
+        """
+        Обучить линейную регрессию за один проход по CSV/Parquet любого размера
+
+        Источник читается порциями (stream_reader.py), по каждой порции
+        накапливаются XᵀX и Xᵀy (ols.py), в конце решаются нормальные
+        уравнения. Матрица признаков целиком не создаётся, поэтому объём
+        данных ограничен только диском. Метрики отложенной выборки (R², RMSE)
+        считаются по её статистикам; MAE за один проход не вычисляется.
+
+        Результат — обычная модель LinearRegression: она сохраняется в реестр,
+        подменяет текущие модели и дообучается через update_models.
+
+        Args:
+            source: Путь к CSV, Parquet или папке партиций с колонками датасета
+            target: Целевая колонка
+            progress: Колбэк (этап, доля 0..1, сообщение), может бросить JobCancelled
+            chunk_size: Строк в порции
+
+        Returns:
+            Dict: Метрики и сведения об обучении
+        """
+        report = progress or (lambda stage, value, message="": None)
+        backend = get_backend("linear_regression")
+        # Категориальные признаки пропускаются, как в prepare_data
+        features = [name for name in MODEL_FEATURES if DATASET_SCHEMA.get(name) != 'category']
+
+        try:
+            logger.info(f"Потоковое обучение линейной регрессии: {source}")
+            report("data_prep", 0.0, "Открытие источника")
+            reader = SourceReader(source, columns=features + [target], chunk_size=chunk_size)
+
+            start = time.perf_counter()
+            cpu_start = time.process_time()
+
+            def on_chunk(rows: int):
+                report("training", 0.05 + 0.85 * reader.progress,
+                       f"Прочитано строк: {reader.rows:,}")
+
+            train, test = fit_streaming(
+                reader, features, target, TEST_SIZE, RANDOM_STATE, on_chunk=on_chunk
+            )
+            if train.n < len(features) + 1:
+                raise ValueError("Недостаточно строк без пропусков для линейной регрессии")
+
+            coef, intercept = train.solve()
+            model = backend.create()
+            model.coef_ = coef
+            model.intercept_ = intercept
+            model.n_features_in_ = len(features)
+            train_time = time.perf_counter() - start
+            cpu_time = time.process_time() - cpu_start
+
+            report("finalizing", 0.95, "Сохранение результатов")
+
+            r2 = test.r2_score(coef, intercept) if test.n else train.r2_score(coef, intercept)
+            size_mb = model_size_bytes(model) / 1024 ** 2
+            metrics: Dict = {
+                backend.key: {
+                    "label": backend.label,
+                    "r2_score": r2,
+                    "rmse": test.rmse(coef, intercept) if test.n else train.rmse(coef, intercept),
+                    "mae": None,
+                    "cv": None,
+                    "train_time_s": train_time,
+                    "cpu_time_s": cpu_time,
+                    "model_size_mb": size_mb,
+                    "r2_per_cpu_second": r2 / cpu_time if cpu_time > 0 else None,
+                    "r2_per_mb": r2 / size_mb if size_mb > 0 else None,
+                    **self._model_details(backend, model, features)
+                }
+            }
+            metrics["training"] = {
+                "cv_folds": 0,
+                "processes": 1,
+                "wall_time_s": train_time,
+                "selection": "holdout_r2",
+                "streaming": {
+                    "source": Path(source).name,
+                    "rows": int(reader.rows),
+                    "chunks": int(reader.chunks),
+                    "chunk_size": chunk_size,
+                    "rows_skipped": int(reader.rows - train.n - test.n)
+                }
+            }
+            # Важность — модуль коэффициента, умноженный на стандартное отклонение признака
+            importance = np.abs(coef) * np.sqrt(np.diag(train.cxx) / train.n)
+            total = importance.sum()
+            metrics["feature_importance"] = dict(zip(
+                features, (importance / total if total > 0 else importance).tolist()
+            ))
+            metrics["comparison"] = self._comparison(metrics, [backend.key])
+
+            logger.info(f"✓ {backend.label}: R² = {r2:.4f}, строк {reader.rows:,} "
+                        f"({reader.chunks} порций), {train_time:.1f} с")
+
+            trained = {backend.key: model}
+            version = self.registry.new_version()
+            try:
+                self.registry.register(trained, {
+                    "feature_names": features,
+                    "metrics": metrics,
+                    "best_model": backend.label,
+                    "best_model_key": backend.key,
+                    "models": [backend.key],
+                    "target": target,
+                    "dataset_version": None,
+                    "train_size": int(train.n),
+                    "test_size": int(test.n),
+                    "hyperparameters": {
+                        "random_state": RANDOM_STATE,
+                        "test_size": TEST_SIZE,
+                        backend.key: backend.params
+                    },
+                    "ols_stats": train.to_dict()
+                }, version=version)
+            except OSError as e:
+                logger.warning(f"Не удалось сохранить модели в реестр: {e}")
+
+            compiled = CompiledPredictor.from_model(backend.key, features, model)
+
+            # Атомарно подменяем модели
+            with self._lock:
+                self.compiled = compiled
+                self.models = trained
+                self.metrics = metrics
+                self.best_model = backend.label
+                self.best_model_key = backend.key
+                self.feature_names = features
+                self.X_test = None
+                self.y_test = None
+                self.predictions = {}
+                self.shared = None
+                self.model_version = version
+                self.ols_stats = train
+                self.prediction_cache.clear()
+
+            if SHARED_MEMORY_MODE:
+                self.shared_store.publish(export_arrays(trained), {
+                    "feature_names": features,
+                    "metrics": metrics,
+                    "best_model": backend.label,
+                    "best_model_key": backend.key,
+                    "model_version": version
+                })
+                self._sync_shared(force=True)
+
+            return {
+                "status": "success",
+                "model_version": version,
+                "best_model": backend.label,
+                "best_model_key": backend.key,
+                "models": [backend.to_dict()],
+                "metrics": metrics,
+                "features_used": features,
+                "train_size": int(train.n),
+                "test_size": int(test.n),
+                "improvement": 0
+            }
+
+        except JobCancelled:
+            logger.info("Обучение моделей отменено, текущие модели не изменены")
+            raise
+
+        except Exception as e:
+            logger.error(f"Ошибка потокового обучения: {e}")
+            logger.error(traceback.format_exc())
+            raise
+
+    @staticmethod
+    def _extend_model(backend: ModelBackend, model, X: np.ndarray, y: np.ndarray,
+                      ols_stats: Optional[OLSStatistics]):
+        """
+        Дообучить копию модели на новых строках
+
+        Исходная модель не меняется (ей продолжают пользоваться параллельные
+        предсказания): копируются только списки деревьев, сами деревья общие.
+        """
+        updated = copy.copy(model)
+
+        if backend.kind == "linear":
+            coef, intercept = ols_stats.solve()
+            updated.coef_ = coef
+            updated.intercept_ = intercept
+            return updated
+
+        if backend.kind == "forest":
+            updated.estimators_ = list(model.estimators_)
+            updated.set_params(
+                warm_start=True, n_estimators=len(model.estimators_) + INCREMENTAL_RF_TREES
+            )
+        else:
+            # Warm start заново вычисляет границы корзин (_bin_mapper) по новым
+            # строкам: новые итерации строятся по остаткам на корзинах новых
+            # строк. Прежние деревья хранят числовые пороги и от корзин не
+            # зависят — update_models проверяет это через _validate_boosting
+            updated._predictors = list(model._predictors)
+            updated.set_params(
+                warm_start=True, early_stopping=False,
+                max_iter=model.n_iter_ + INCREMENTAL_BOOSTING_ITERATIONS
+            )
+
+        updated.fit(X, y)
+        updated.set_params(warm_start=False)
+        return updated
+
+    @staticmethod
+    def _validate_boosting(original, updated, X: np.ndarray):
+        """
+        Проверить, что прежние итерации дообученного бустинга не изменились
+
+        Предсказание дообученной модели после n_iter_ исходных итераций
+        должно совпадать с предсказанием исходной модели.
+
+        Raises:
+            ValueError: Предсказания расходятся
+        """
+        staged = None
+        for i, staged in enumerate(updated.staged_predict(X), start=1):
+            if i == original.n_iter_:
+                break
+
+        if staged is None or not np.allclose(staged, original.predict(X)):
+            raise ValueError("прежние итерации бустинга дают другие предсказания после дообучения")
+
+    def update_models(self, delta: pd.DataFrame, target: str = 'popularity',
+                      progress: Optional[ProgressCallback] = None,
+                      dataset_version: Optional[str] = None) -> Dict:
+        """
+        Дообучить текущие модели на новых строках датасета
+
+        Время зависит от числа новых строк, а не от размера датасета:
+        - линейная регрессия: к достаточным статистикам обучающей выборки
+          добавляются статистики новых строк и коэффициенты решаются заново,
+          результат совпадает с обучением на всех строках, кроме отложенных (см. ols.py);
+        - Random Forest: warm_start добавляет INCREMENTAL_RF_TREES деревьев,
+          обученных на новых строках, прежние деревья не меняются;
+        - Hist Gradient Boosting: warm_start добавляет
+          INCREMENTAL_BOOSTING_ITERATIONS итераций по остаткам на новых строках.
+
+        Доля INCREMENTAL_HOLDOUT_FRACTION новых строк откладывается: модели
+        дообучаются на остальных, а RMSE/R² до и после считаются по
+        отложенным (поле evaluation = "holdout"). Если новых строк мало,
+        модели дообучаются на всех, а метрики считаются по ним же
+        (evaluation = "train"). Модель, которая не прошла проверку (конечные
+        предсказания, неизменность прежних итераций бустинга), остаётся прежней.
+
+        Ансамбли растут с каждым дополнением, поэтому время от времени
+        стоит полностью переобучать модели (POST /model/train). Лучшая
+        модель не пересматривается: для этого нужна кросс-валидация.
+
+        Args:
+            delta: Новые строки (очищенные, с колонками датасета)
+            target: Целевая колонка
+            progress: Колбэк (этап, доля 0..1, сообщение), может бросить JobCancelled
+            dataset_version: Версия датасета после добавления строк
+
+        Returns:
+            Dict: Метрики моделей на новых строках до и после дообучения
+        """
+        report = progress or (lambda stage, value, message="": None)
+
+        if not self.is_trained():
+            raise ValueError("Модели не обучены. Сначала обучите модели через POST /model/train")
+
+        snapshot = self._snapshot()
+        features = list(snapshot["feature_names"])
+
+        try:
+            report("data_prep", 0.0, "Подготовка новых строк")
+            missing = [column for column in features + [target] if column not in delta.columns]
+            if missing:
+                raise ValueError(f"В новых строках нет колонок: {missing}")
+
+            delta = delta.dropna(subset=[target])
+            if delta.empty:
+                raise ValueError("Нет строк со значением целевой колонки")
+
+            frame = delta[features]
+            X = frame.fillna(frame.median()).to_numpy(dtype=np.float64)
+            y = delta[target].to_numpy(dtype=np.float64)
+
+            # Часть новых строк откладывается для оценки дообучения
+            n_holdout = int(len(y) * INCREMENTAL_HOLDOUT_FRACTION)
+            if n_holdout >= INCREMENTAL_HOLDOUT_MIN_ROWS:
+                order = np.random.default_rng(RANDOM_STATE).permutation(len(y))
+                fit_rows, eval_rows = order[n_holdout:], order[:n_holdout]
+                evaluation = "holdout"
+            else:
+                fit_rows = eval_rows = np.arange(len(y))
+                evaluation = "train"
+            X_fit, y_fit = X[fit_rows], y[fit_rows]
+            X_eval, y_eval = X[eval_rows], y[eval_rows]
+
+            models = snapshot["models"]
+            if not models:
+                # Модели загружены из реестра как массивы: нужны объекты sklearn
+                report("data_prep", 0.05, "Загрузка моделей из реестра")
+                models = self.registry.load_estimators(snapshot["model_version"], mmap=False)
+
+            start = time.perf_counter()
+            updated: Dict[str, object] = {}
+            details: Dict[str, Dict] = {}
+            ols_stats = snapshot["ols_stats"]
+
+            for i, (key, model) in enumerate(models.items()):
+                backend = get_backend(key)
+                report("updating", 0.1 + 0.8 * i / len(models), f"Дообучение: {backend.label}")
+
+                previous_stats = ols_stats
+                if backend.kind == "linear":
+                    if ols_stats is None:
+                        logger.warning(f"{backend.label}: нет статистик обучающей выборки, "
+                                       f"модель не дообучена")
+                        updated[key] = model
+                        details[key] = {"updated": False}
+                        continue
+                    ols_stats = copy.deepcopy(ols_stats).update(X_fit, y_fit)
+
+                model_start = time.perf_counter()
+                before = model.predict(X_eval)
+                candidate = self._extend_model(backend, model, X_fit, y_fit, ols_stats)
+                after = candidate.predict(X_eval)
+
+                try:
+                    if not np.isfinite(after).all():
+                        raise ValueError("предсказания содержат NaN или бесконечности")
+                    if backend.kind == "boosting":
+                        self._validate_boosting(model, candidate, X_eval)
+                except ValueError as e:
+                    logger.warning(f"✗ {backend.label}: дообучение отклонено — {e}")
+                    ols_stats = previous_stats
+                    updated[key] = model
+                    details[key] = {"updated": False, "reason": str(e)}
+                    continue
+
+                updated[key] = candidate
+                details[key] = {
+                    "updated": True,
+                    "time_s": time.perf_counter() - model_start,
+                    "fit_rows": int(len(y_fit)),
+                    # holdout — по отложенным новым строкам, train — по тем же
+                    # строкам, на которых модель дообучалась (оценка завышена)
+                    "evaluation": evaluation,
+                    "evaluation_rows": int(len(y_eval)),
+                    "rmse_before": float(np.sqrt(mean_squared_error(y_eval, before))),
+                    "rmse_after": float(np.sqrt(mean_squared_error(y_eval, after))),
+                    "r2_before": float(r2_score(y_eval, before)) if len(y_eval) > 1 else None,
+                    "r2_after": float(r2_score(y_eval, after)) if len(y_eval) > 1 else None
+                }
+                where = "отложенных" if evaluation == "holdout" else "обучающих"
+                logger.info(f"✓ {backend.label} дообучена на {len(y_fit):,} строках "
+                            f"за {details[key]['time_s']:.2f} с: RMSE на {where} новых строках "
+                            f"{details[key]['rmse_before']:.3f} → {details[key]['rmse_after']:.3f}")
+
+            report("finalizing", 0.92, "Пересчёт метрик")
+
+            metrics = copy.deepcopy(snapshot["metrics"])
+            X_test, y_test = self.X_test, self.y_test
+            predictions = dict(self.predictions)
+            X_holdout = X_test.to_numpy(dtype=np.float64) if X_test is not None else None
+
+            for key, model in updated.items():
+                if not details[key]["updated"]:
+                    continue
+                backend = get_backend(key)
+                size_mb = model_size_bytes(model) / 1024 ** 2
+                metrics[key].update(self._model_details(backend, model, features))
+                metrics[key]["model_size_mb"] = size_mb
+
+                # Отложенная выборка есть только после обучения в этом процессе
+                if X_holdout is not None:
+                    pred = model.predict(X_holdout)
+                    predictions[key] = pred
+                    metrics[key]["r2_score"] = float(r2_score(y_test, pred))
+                    metrics[key]["rmse"] = float(np.sqrt(mean_squared_error(y_test, pred)))
+                    metrics[key]["mae"] = float(mean_absolute_error(y_test, pred))
+
+                # После пересчёта R²: иначе отношение считалось бы по прежней модели
+                metrics[key]["r2_per_mb"] = metrics[key]["r2_score"] / size_mb if size_mb > 0 else None
+
+            if any(hasattr(model, "feature_importances_") for model in updated.values()):
+                metrics["feature_importance"] = self._feature_importance(
+                    updated, snapshot["best_model_key"], features, X_holdout, y_test
+                )
+            metrics["comparison"] = self._comparison(metrics, list(updated))
+
+            update_time = time.perf_counter() - start
+            metrics["updates"] = metrics.get("updates", []) + [{
+                "rows": int(len(y)),
+                "fit_rows": int(len(y_fit)),
+                "evaluation": evaluation,
+                "dataset_version": dataset_version,
+                "parent_version": snapshot["model_version"],
+                "time_s": update_time,
+                "models": details
+            }]
+
+            report("finalizing", 0.95, "Сохранение в реестр моделей")
+
+            best_key = snapshot["best_model_key"]
+            try:
+                meta = self.registry.meta(snapshot["model_version"])
+            except ValueError:
+                meta = {"target": target}
+            meta.update({
+                "feature_names": features,
+                "metrics": metrics,
+                "best_model": snapshot["best_model"],
+                "best_model_key": best_key,
+                "models": list(updated),
+                "dataset_version": dataset_version,
+                "train_size": int(meta.get("train_size", 0)) + int(len(y_fit)),
+                "ols_stats": ols_stats.to_dict() if ols_stats else None
+            })
+
+            version = self.registry.new_version()
+            try:
+                self.registry.register(updated, meta, version=version)
+            except OSError as e:
+                logger.warning(f"Не удалось сохранить модели в реестр: {e}")
+
+            compiled = CompiledPredictor.from_model(best_key, features, updated[best_key])
+
+            # Атомарно подменяем модели
+            with self._lock:
+                self.compiled = compiled
+                self.models = updated
+                self.metrics = metrics
+                self.predictions = predictions
+                self.shared = None
+                self.model_version = version
+                self.ols_stats = ols_stats
+                self.prediction_cache.clear()
+
+            if SHARED_MEMORY_MODE:
+                self.shared_store.publish(export_arrays(updated), {
+                    "feature_names": features,
+                    "metrics": metrics,
+                    "best_model": snapshot["best_model"],
+                    "best_model_key": best_key,
+                    "model_version": version
+                })
+                self._sync_shared(force=True)
+
+            logger.info(f"✓ Модели дообучены на {len(y):,} строках за {update_time:.2f} с")
+
+            return {
+                "status": "success",
+                "model_version": version,
+                "parent_version": snapshot["model_version"],
+                "best_model": snapshot["best_model"],
+                "best_model_key": best_key,
+                "rows": int(len(y)),
+                "time_s": update_time,
+                "models": details,
+                "metrics": metrics
+            }
+
+        except JobCancelled:
+            logger.info("Дообучение моделей отменено, текущие модели не изменены")
+            raise
+
+        except Exception as e:
+            logger.error(f"Ошибка дообучения моделей: {e}")
+            logger.error(traceback.format_exc())
+            raise
+
     def get_metrics(self) -> Dict:
 
+        self._sync_shared()
+
         if self.metrics is None:
             raise ValueError("Модели ещё не обучены. Вызовите train_models() сначала.")
 
@@ -210,30 +1094,54 @@ class ModelService:
         Returns:
             np.ndarray: Массив предсказаний
         """
-        if self.rf_model is None:
+        if not self.is_trained():
             raise ValueError("Модели не обучены. Вызовите train_models() сначала.")
 
+        snapshot = self._snapshot()
+        feature_names = snapshot["feature_names"]
+
         # Выбираем модель
-        if use_best:
-            if self.best_model == "Random Forest":
-                model = self.rf_model
-            else:
-                model = self.lr_model
-        else:
-            model = self.rf_model
+        model_key = snapshot["best_model_key"] if use_best else "random_forest"
 
         # Убеждаемся что все нужные признаки присутствуют
-        if self.feature_names:
-            missing_features = set(self.feature_names) - set(features.columns)
+        if feature_names:
+            missing_features = set(feature_names) - set(features.columns)
             if missing_features:
                 raise ValueError(f"Отсутствуют признаки: {missing_features}")
 
-            features = features[self.feature_names]
+            features = features[feature_names]
 
         # Заполняем пропуски
         features = features.fillna(features.median())
 
-        return model.predict(features)
+        return self._predict_array(model_key, features, snapshot)
+
+    def batch_predictor(self) -> Tuple[list, str, Optional[str], Callable[[np.ndarray], np.ndarray]]:
+        """
+        Предсказатель для пакетной обработки
+
+        Модели фиксируются в момент вызова, поэтому все порции одного
+        пакета считаются одной и той же версией, даже если во время
+        обработки закончилось новое обучение.
+
+        Returns:
+            Tuple: признаки (порядок колонок), название и версия модели и функция,
+                которая принимает матрицу float64 (n, признаки) и возвращает
+                предсказания, ограниченные диапазоном 0..100
+        """
+        if not self.is_trained():
+            raise ValueError("Модель не обучена")
+
+        snapshot = self._snapshot()
+        feature_names = list(snapshot["feature_names"])
+
+        model_key, model_used = snapshot["best_model_key"], snapshot["best_model"]
+
+        def predict(X: np.ndarray) -> np.ndarray:
+            prediction = self._predict_array(model_key, X, snapshot)
+            return np.clip(prediction, 0, 100)
+
+        return feature_names, model_used, snapshot["model_version"], predict
 
     def get_feature_importance(self, top_n: int = 10) -> Dict:
 
@@ -253,27 +1161,32 @@ class ModelService:
 
     def get_predictions(self) -> Dict:
 
-        if self.y_test is None or self.lr_pred is None or self.rf_pred is None:
+        if self.y_test is None or not self.predictions:
             raise ValueError("Модели не обучены")
 
-        return {
+        result = {
             "y_true": self.y_test.tolist() if hasattr(self.y_test, 'tolist') else list(self.y_test),
-            "y_pred_lr": self.lr_pred.tolist(),
-            "y_pred_rf": self.rf_pred.tolist()
+            "y_pred": {key: pred.tolist() for key, pred in self.predictions.items()}
         }
+        # Прежние поля — только если эти модели обучались
+        if self.lr_pred is not None:
+            result["y_pred_lr"] = self.lr_pred.tolist()
+        if self.rf_pred is not None:
+            result["y_pred_rf"] = self.rf_pred.tolist()
+        return result
 
     def evaluate_model(self, model_name: str = "random_forest") -> Dict:
 
         if self.metrics is None:
             raise ValueError("Модели не обучены")
 
-        if model_name not in self.metrics:
+        if "r2_score" not in self.metrics.get(model_name, {}):
             raise ValueError(f"Модель '{model_name}' не найдена")
 
         return {
             "model": model_name,
             "metrics": self.metrics[model_name],
-            "is_best": (self.best_model.lower().replace(" ", "_") == model_name),
+            "is_best": self.best_model_key == model_name,
             "features_count": len(self.feature_names) if self.feature_names else 0
         }
 
@@ -281,50 +1194,123 @@ class ModelService:
 
     def is_trained(self) -> bool:
 
-        return self.rf_model is not None and self.metrics is not None
+        self._sync_shared()
+
+        has_model = bool(self.models) or self.shared is not None
+        return has_model and self.metrics is not None
+
+    def predict_fast(self, features: FeatureInput) -> float:
+        """
+        Предсказание лучшей моделью для одного трека без pandas
+
+        Использует скомпилированные массивы модели: на вызов уходят
+        микросекунды, а не время на создание DataFrame и вызов sklearn.
+
+        Args:
+            features: Словарь {признак: значение} или массив значений
+                в порядке feature_names
+
+        Returns:
+            float: Предсказанная популярность (0-100)
+        """
+        self._sync_shared()
+
+        compiled = self.compiled
+        if compiled is None:
+            if not self.is_trained():
+                raise ValueError("Модель не обучена")
+            compiled = self._snapshot()["compiled"]
+
+        return min(max(compiled.predict_one(features), 0.0), 100.0)
+
+    @staticmethod
+    def _prediction_result(prediction: float, model_used: str,
+                           snapshot: Dict, features: Dict) -> Dict:
+        return {
+            "predicted_popularity": prediction,
+            "model_used": model_used,
+            "feature_importance": snapshot["metrics"].get('feature_importance', {}),
+            "input_features": features
+        }
 
     def predict_single(self, features: Dict) -> Dict:
 
         if not self.is_trained():
             raise ValueError("Модель не обучена")
 
+        snapshot = self._snapshot()
+        compiled = snapshot["compiled"]
+
         # Проверяем что все нужные признаки присутствуют
-        if not self.feature_names:
+        if not snapshot["feature_names"]:
             raise ValueError("Список признаков не определён")
 
-        # Создаём DataFrame из входных данных
-        input_df = pd.DataFrame([features])
+        # Быстрый путь: вектор признаков в порядке модели, без DataFrame
+        vector = self.prediction_cache.canonicalize(compiled.to_vector(features))
+        key = self.prediction_cache.make_key(snapshot["model_version"], vector)
 
-        # Проверяем наличие всех признаков
-        missing_features = set(self.feature_names) - set(input_df.columns)
-        if missing_features:
-            raise ValueError(f"Отсутствуют признаки: {missing_features}")
+        prediction = self.prediction_cache.get(key)
+        if prediction is None:
+            prediction = min(max(compiled.predict_one(vector), 0.0), 100.0)
+            self.prediction_cache.put(key, prediction)
+        model_used = compiled.model_used
 
-        # Выбираем только нужные признаки в правильном порядке
-        input_df = input_df[self.feature_names]
+        logger.info(f"Предсказание для трека: {prediction:.2f} (модель: {model_used})")
 
-        # Заполняем возможные NaN медианой (на всякий случай)
-        input_df = input_df.fillna(input_df.median())
+        return self._prediction_result(prediction, model_used, snapshot, features)
 
-        # Делаем предсказание лучшей моделью
-        if self.best_model == "Random Forest":
-            prediction = self.rf_model.predict(input_df)[0]
-            model_used = "Random Forest"
-        else:
-            prediction = self.lr_model.predict(input_df)[0]
-            model_used = "Linear Regression"
+    def predict_records(self, records: List[Dict]) -> List:
+        """
+        Предсказания для нескольких треков одним векторным вызовом
 
-        # Ограничиваем значение от 0 до 100
-        prediction = float(max(0, min(100, prediction)))
+        Используется микробатчингом /model/predict: ошибка в одной записи
+        не влияет на остальные. Записи, найденные в кэше предсказаний,
+        в модель не передаются.
 
-        logger.info(f"Предсказание для трека: {prediction:.2f} (модель: {model_used})")
+        Args:
+            records: Словари признаков
 
-        return {
-            "predicted_popularity": prediction,
-            "model_used": model_used,
-            "feature_importance": self.metrics.get('feature_importance', {}),
-            "input_features": features
-        }
+        Returns:
+            List: Для каждой записи — результат как у predict_single
+                или исключение ValueError
+        """
+        if not self.is_trained():
+            return [ValueError("Модель не обучена")] * len(records)
+
+        snapshot = self._snapshot()
+        compiled = snapshot["compiled"]
+        cache = self.prediction_cache
+        results: List = [None] * len(records)
+        rows, positions, keys = [], [], []
+
+        for i, record in enumerate(records):
+            try:
+                vector = cache.canonicalize(compiled.to_vector(record))
+                if np.isnan(vector).any():
+                    raise ValueError("Признаки не должны содержать пропуски")
+            except (ValueError, TypeError) as e:
+                results[i] = ValueError(str(e))
+                continue
+
+            key = cache.make_key(snapshot["model_version"], vector)
+            cached = cache.get(key)
+            if cached is not None:
+                results[i] = self._prediction_result(cached, compiled.model_used, snapshot, record)
+                continue
+
+            rows.append(vector)
+            positions.append(i)
+            keys.append(key)
+
+        if rows:
+            predictions = np.clip(compiled.predict_many(np.vstack(rows)), 0, 100)
+            for i, key, prediction in zip(positions, keys, predictions.tolist()):
+                cache.put(key, prediction)
+                results[i] = self._prediction_result(
+                    prediction, compiled.model_used, snapshot, records[i]
+                )
+
+        return results
 
 
 # Глобальный экземпляр сервиса
@@ -0,0 +1,184 @@
+"""
+Линейная регрессия (OLS) по достаточным статистикам
+
+Вместо матрицы признаков хранятся только n, средние X и y и центрированные
+суммы произведений Cxx = Σ(x - x̄)(x - x̄)ᵀ, Cxy = Σ(x - x̄)(y - ȳ).
+Статистики двух частей данных объединяются точно (формула Чана), поэтому
+модель можно дообучить на новых строках за время, пропорциональное их
+числу, а результат совпадает с обучением LinearRegression на всех строках.
+По той же причине регрессию можно обучить за один проход по источнику,
+который не помещается в память (fit_streaming).
+Центрирование по частям сохраняет точность даже для признаков масштаба
+duration_ms (~10⁵), где сумма x² без центрирования теряет значащие цифры.
+"""
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+
+class OLSStatistics:
+    """Достаточные статистики линейной регрессии с объединением частей"""
+
+    def __init__(self, n_features: int):
+        self.n = 0
+        self.mean_x = np.zeros(n_features, dtype=np.float64)
+        self.mean_y = 0.0
+        self.cxx = np.zeros((n_features, n_features), dtype=np.float64)
+        self.cxy = np.zeros(n_features, dtype=np.float64)
+        self.cyy = 0.0
+
+    @classmethod
+    def from_data(cls, X: np.ndarray, y: np.ndarray) -> "OLSStatistics":
+        """Статистики одной порции данных"""
+        X = np.asarray(X, dtype=np.float64)
+        y = np.asarray(y, dtype=np.float64).ravel()
+
+        stats = cls(X.shape[1])
+        if len(X) == 0:
+            return stats
+
+        stats.n = len(X)
+        stats.mean_x = X.mean(axis=0)
+        stats.mean_y = float(y.mean())
+        Xc = X - stats.mean_x
+        yc = y - stats.mean_y
+        stats.cxx = Xc.T @ Xc
+        stats.cxy = Xc.T @ yc
+        stats.cyy = float(yc @ yc)
+        return stats
+
+    def merge(self, other: "OLSStatistics") -> "OLSStatistics":
+        """Объединить со статистиками другой порции (на месте)"""
+        if other.n == 0:
+            return self
+        if self.n == 0:
+            self.n, self.mean_x, self.mean_y = other.n, other.mean_x.copy(), other.mean_y
+            self.cxx, self.cxy, self.cyy = other.cxx.copy(), other.cxy.copy(), other.cyy
+            return self
+
+        n = self.n + other.n
+        weight = self.n * other.n / n
+        dx = other.mean_x - self.mean_x
+        dy = other.mean_y - self.mean_y
+
+        self.cxx = self.cxx + other.cxx + weight * np.outer(dx, dx)
+        self.cxy = self.cxy + other.cxy + weight * dx * dy
+        self.cyy = self.cyy + other.cyy + weight * dy * dy
+        self.mean_x = self.mean_x + dx * other.n / n
+        self.mean_y = self.mean_y + dy * other.n / n
+        self.n = n
+        return self
+
+    def update(self, X: np.ndarray, y: np.ndarray) -> "OLSStatistics":
+        """Добавить строки"""
+        return self.merge(OLSStatistics.from_data(X, y))
+
+    def solve(self) -> Tuple[np.ndarray, float]:
+        """
+        Коэффициенты и сдвиг (решение нормальных уравнений)
+
+        Система решается для признаков, приведённых к единичной дисперсии
+        (матрица корреляций): без этого масштабы duration_ms и долей 0..1
+        дают число обусловленности ~10²², и коэффициенты теряют точность.
+        lstsq вместо обращения матрицы: при вырожденных признаках
+        возвращается решение с минимальной нормой, как в LinearRegression.
+        """
+        if self.n == 0:
+            raise ValueError("Нет данных для линейной регрессии")
+
+        scale = np.sqrt(np.diag(self.cxx))
+        scale[scale == 0] = 1.0
+        corr = self.cxx / np.outer(scale, scale)
+        coef = np.linalg.lstsq(corr, self.cxy / scale, rcond=None)[0] / scale
+        intercept = float(self.mean_y - self.mean_x @ coef)
+        return coef, intercept
+
+    def residual_sum(self, coef: np.ndarray, intercept: float) -> float:
+        """
+        Сумма квадратов остатков Σ(y - a - x·b)² на накопленных строках
+
+        Считается по статистикам, без прохода по строкам, поэтому годится
+        и для оценки на отложенной выборке коэффициентами другой выборки.
+        """
+        offset = self.mean_y - intercept - self.mean_x @ coef
+        residual = self.cyy - 2 * coef @ self.cxy + coef @ self.cxx @ coef + self.n * offset ** 2
+        return float(max(residual, 0.0))
+
+    def r2_score(self, coef: Optional[np.ndarray] = None,
+                 intercept: Optional[float] = None) -> float:
+        """R² на накопленных строках (по умолчанию — для собственного решения)"""
+        if coef is None:
+            coef, intercept = self.solve()
+        if self.cyy == 0:
+            return 0.0
+        return float(1 - self.residual_sum(coef, intercept) / self.cyy)
+
+    def rmse(self, coef: np.ndarray, intercept: float) -> float:
+        return float(np.sqrt(self.residual_sum(coef, intercept) / self.n)) if self.n else 0.0
+
+    def to_dict(self) -> Dict:
+        """Статистики в JSON-совместимом виде (для метаданных реестра)"""
+        return {
+            "n": int(self.n),
+            "mean_x": self.mean_x.tolist(),
+            "mean_y": self.mean_y,
+            "cxx": self.cxx.tolist(),
+            "cxy": self.cxy.tolist(),
+            "cyy": self.cyy
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "OLSStatistics":
+        stats = cls(len(data["mean_x"]))
+        stats.n = int(data["n"])
+        stats.mean_x = np.asarray(data["mean_x"], dtype=np.float64)
+        stats.mean_y = float(data["mean_y"])
+        stats.cxx = np.asarray(data["cxx"], dtype=np.float64)
+        stats.cxy = np.asarray(data["cxy"], dtype=np.float64)
+        stats.cyy = float(data["cyy"])
+        return stats
+
+
+def fit_streaming(frames: Iterable[pd.DataFrame], features: List[str], target: str,
+                  test_size: float, random_state: int,
+                  on_chunk: Optional[Callable[[int], None]] = None
+                  ) -> Tuple[OLSStatistics, OLSStatistics]:
+    """
+    Статистики обучающей и отложенной выборок за один проход по порциям
+
+    В памяти только текущая порция и матрицы размера (признаки × признаки),
+    поэтому объём данных не ограничен оперативной памятью. Каждая строка
+    попадает в отложенную выборку с вероятностью test_size (генератор
+    с фиксированным seed, разбиение воспроизводимо). Строки с пропусками
+    пропускаются: медианы для заполнения за один проход неизвестны.
+
+    Args:
+        frames: Порции DataFrame с колонками features и target
+        features: Признаки
+        target: Целевая колонка
+        test_size: Доля отложенной выборки
+        random_state: Seed разбиения
+        on_chunk: Вызывается после каждой порции с числом её строк
+
+    Returns:
+        Tuple: статистики обучающей и отложенной выборок
+    """
+    rng = np.random.default_rng(random_state)
+    train = OLSStatistics(len(features))
+    test = OLSStatistics(len(features))
+
+    for frame in frames:
+        rows = len(frame)
+        frame = frame.dropna(subset=features + [target])
+        X = frame[features].to_numpy(dtype=np.float64)
+        y = frame[target].to_numpy(dtype=np.float64)
+
+        holdout = rng.random(len(X)) < test_size
+        train.update(X[~holdout], y[~holdout])
+        test.update(X[holdout], y[holdout])
+
+        if on_chunk is not None:
+            on_chunk(rows)
+
+    return train, test
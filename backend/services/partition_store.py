@@ -0,0 +1,346 @@
+"""
+Датасет, разложенный по партициям (для данных больше оперативной памяти)
+
+CSV читается порциями (stream_reader.py), каждая порция очищается и
+раскладывается по значению колонки партиционирования (жанру):
+
+    data/partitions/<имя CSV>/
+        manifest.json             — партиции, части и число строк
+        p-000/part-00000/*.npy    — колонки части (формат кэша датасета,
+        p-000/part-00001/...        числа открываются через memory-map)
+        p-001/...
+
+Вместе с колонками части сохраняется сводка распределений её числовых
+колонок (sketch.npz, sketches.py): сводки частей сливаются без чтения
+данных, поэтому статистика распределений по всем партициям не требует
+прохода по строкам.
+
+Строки жанра копятся в буфере и записываются частями по
+PARTITION_PART_ROWS строк (всего в буферах не больше четырёх частей),
+поэтому объём памяти не зависит от размера CSV. Итераторы iter_frames
+и iter_partitions отдают части или жанры целиком по одному, не загружая
+весь датасет.
+"""
+import json
+import logging
+import shutil
+import time
+import uuid
+import zlib
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+import pandas as pd
+
+from backend.config import DATASET_SCHEMA, PARTITION_COLUMN, PARTITION_PART_ROWS, STREAM_CHUNK_SIZE
+from backend.services.dataset_cache import MANIFEST_NAME, save_column, load_column
+from backend.services.sketches import DistributionSketch, sketch_frames
+from backend.services.stream_reader import SourceReader
+
+logger = logging.getLogger(__name__)
+
+# Версия формата партиций (увеличивать при несовместимых изменениях)
+PARTITION_FORMAT_VERSION = 1
+
+# Сводка распределений части
+SKETCH_NAME = "sketch.npz"
+
+
+class PartitionedDataset:
+    """Датасет в папке партиций: запись потоком и чтение по частям"""
+
+    def __init__(self, directory: Path):
+        self.directory = Path(directory)
+        self._manifest: Optional[Dict] = None
+
+    @property
+    def manifest(self) -> Dict:
+        if self._manifest is None:
+            try:
+                with open(self.directory / MANIFEST_NAME, 'r', encoding='utf-8') as f:
+                    self._manifest = json.load(f)
+            except OSError:
+                raise FileNotFoundError(f"Партиции не найдены: {self.directory}")
+            if self._manifest.get("format_version") != PARTITION_FORMAT_VERSION:
+                raise ValueError(f"Несовместимый формат партиций: {self.directory}")
+        return self._manifest
+
+    def exists(self) -> bool:
+        return (self.directory / MANIFEST_NAME).exists()
+
+    @property
+    def version(self) -> str:
+        """Токен версии (меняется при каждой загрузке)"""
+        return self.manifest["version"]
+
+    @property
+    def rows(self) -> int:
+        return int(self.manifest["rows"])
+
+    def genres(self) -> List[str]:
+        """Значения колонки партиционирования в порядке появления в CSV"""
+        return [partition["value"] for partition in self.manifest["partitions"]]
+
+    def info(self) -> Dict:
+        """Сведения о партициях (без списка частей)"""
+        manifest = self.manifest
+        return {
+            "name": self.directory.name,
+            "source": manifest["source"],
+            "partition_by": manifest["partition_by"],
+            "rows": manifest["rows"],
+            "columns": manifest["columns"],
+            "version": manifest["version"],
+            "created_at": manifest["created_at"],
+            "partitions": {
+                partition["value"]: {"rows": partition["rows"], "parts": len(partition["parts"])}
+                for partition in manifest["partitions"]
+            }
+        }
+
+    # ========== Запись ==========
+
+    @classmethod
+    def ingest(cls, source: Path, directory: Path,
+               clean: Callable[[pd.DataFrame], pd.DataFrame],
+               partition_by: str = PARTITION_COLUMN,
+               chunk_size: int = STREAM_CHUNK_SIZE,
+               part_rows: int = PARTITION_PART_ROWS,
+               progress: Optional[Callable[[float, str], None]] = None) -> "PartitionedDataset":
+        """
+        Разложить CSV/Parquet по партициям за один проход
+
+        Запись идёт во временную папку, которая переименовывается целиком:
+        прежние партиции остаются доступны до конца загрузки.
+
+        Args:
+            source: CSV или Parquet с колонками датасета
+            directory: Папка партиций
+            clean: Очистка порции (DataService._clean_data)
+            partition_by: Колонка партиционирования
+            chunk_size: Строк в порции чтения
+            part_rows: Строк в одной части партиции
+            progress: Колбэк (доля 0..1, сообщение)
+
+        Returns:
+            PartitionedDataset: Записанный датасет
+        """
+        directory = Path(directory)
+        tmp_dir = directory.with_name(f".{directory.name}.tmp-{uuid.uuid4().hex[:6]}")
+        tmp_dir.mkdir(parents=True)
+        reader = SourceReader(source, chunk_size=chunk_size)
+        writer = _PartitionWriter(tmp_dir, partition_by, part_rows)
+
+        try:
+            for chunk in reader:
+                if partition_by not in chunk.columns:
+                    raise ValueError(f"Колонка '{partition_by}' не найдена в источнике")
+                writer.add(clean(chunk))
+                if progress is not None:
+                    progress(reader.progress, f"Прочитано строк: {reader.rows:,}")
+
+            writer.flush_all()
+            manifest = {
+                "format_version": PARTITION_FORMAT_VERSION,
+                "version": uuid.uuid4().hex[:16],
+                "created_at": time.time(),
+                "source": Path(source).name,
+                "schema": DATASET_SCHEMA,
+                "partition_by": partition_by,
+                "columns": writer.columns,
+                "rows": writer.rows,
+                "rows_skipped": writer.skipped,
+                "chunk_size": chunk_size,
+                "partitions": writer.partitions()
+            }
+            with open(tmp_dir / MANIFEST_NAME, 'w', encoding='utf-8') as f:
+                json.dump(manifest, f, ensure_ascii=False, indent=2)
+
+            if directory.exists():
+                shutil.rmtree(directory)
+            tmp_dir.rename(directory)
+        finally:
+            if tmp_dir.exists():
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+
+        logger.info(f"✓ Партиции записаны: {directory} "
+                    f"({writer.rows:,} строк, партиций: {len(writer.partitions())})")
+        return cls(directory)
+
+    # ========== Чтение ==========
+
+    def _selected(self, genres: Optional[List[str]]) -> List[Dict]:
+        partitions = self.manifest["partitions"]
+        if genres is None:
+            return partitions
+        unknown = set(genres) - {partition["value"] for partition in partitions}
+        if unknown:
+            raise ValueError(f"Нет партиций: {sorted(unknown)}")
+        return [partition for partition in partitions if partition["value"] in genres]
+
+    def _read_part(self, partition: Dict, part: str, columns: Optional[List[str]]) -> pd.DataFrame:
+        part_dir = self.directory / partition["dir"] / part
+        with open(part_dir / MANIFEST_NAME, 'r', encoding='utf-8') as f:
+            stored = json.load(f)["columns"]
+
+        if columns is not None:
+            missing = [name for name in columns if name not in self.manifest["columns"]]
+            if missing:
+                raise ValueError(f"В партициях нет колонок: {missing}")
+            stored = [column for column in stored if column["name"] in columns]
+
+        return pd.DataFrame(
+            {column["name"]: load_column(part_dir, column) for column in stored}, copy=False
+        )
+
+    def iter_frames(self, columns: Optional[List[str]] = None,
+                    genres: Optional[List[str]] = None) -> Iterator[pd.DataFrame]:
+        """
+        Части партиций по одной (колонки открыты через memory-map)
+
+        Args:
+            columns: Колонки (по умолчанию — все)
+            genres: Партиции (по умолчанию — все)
+        """
+        for partition in self._selected(genres):
+            for part in partition["parts"]:
+                yield self._read_part(partition, part, columns)
+
+    def distribution_sketch(self, columns: List[str],
+                            genres: Optional[List[str]] = None) -> DistributionSketch:
+        """
+        Сводка распределений колонок по партициям
+
+        Сохранённые при загрузке сводки частей сливаются без чтения строк;
+        части без сводки (записанные до её появления) сводятся
+        параллельно по данным.
+
+        Args:
+            columns: Числовые колонки
+            genres: Партиции (по умолчанию — все)
+        """
+        result = DistributionSketch(columns)
+        pending = []
+
+        for partition in self._selected(genres):
+            for part in partition["parts"]:
+                path = self.directory / partition["dir"] / part / SKETCH_NAME
+                try:
+                    stored = DistributionSketch.load(path)
+                    result.merge(stored.select(columns))
+                except (OSError, ValueError, KeyError):
+                    pending.append((partition, part))
+
+        if pending:
+            frames = (self._read_part(partition, part, columns) for partition, part in pending)
+            result.merge(sketch_frames(frames, columns))
+        return result
+
+    def iter_partitions(self, columns: Optional[List[str]] = None,
+                        genres: Optional[List[str]] = None) -> Iterator[Tuple[str, pd.DataFrame]]:
+        """
+        Партиции целиком по одной: (значение, DataFrame всех её частей)
+
+        В памяти одновременно только одна партиция (один жанр).
+        """
+        for partition in self._selected(genres):
+            frames = [self._read_part(partition, part, columns) for part in partition["parts"]]
+            if len(frames) == 1:
+                yield partition["value"], frames[0]
+            else:
+                yield partition["value"], _concat_frames(frames)
+
+
+def _concat_frames(frames: List[pd.DataFrame]) -> pd.DataFrame:
+    """Склеить части, сохранив категориальные колонки (словари частей различаются)"""
+    df = pd.concat(frames, ignore_index=True)
+    for name, dtype in DATASET_SCHEMA.items():
+        if dtype == 'category' and name in df.columns \
+                and not isinstance(df[name].dtype, pd.CategoricalDtype):
+            df[name] = df[name].astype('category')
+    return df
+
+
+class _PartitionWriter:
+    """Буферы строк по партициям и запись частей"""
+
+    def __init__(self, directory: Path, partition_by: str, part_rows: int):
+        self.directory = directory
+        self.partition_by = partition_by
+        self.part_rows = part_rows
+        self.columns: List[str] = []
+        self.rows = 0
+        self.skipped = 0
+        # Всего строк в буферах всех партиций
+        self.max_buffered = 4 * part_rows
+        # значение → {"dir", "rows", "parts"}
+        self._partitions: Dict[str, Dict] = {}
+        self._buffers: Dict[str, List[pd.DataFrame]] = {}
+        self._buffered: Dict[str, int] = {}
+
+    def add(self, chunk: pd.DataFrame):
+        if not self.columns:
+            self.columns = [str(name) for name in chunk.columns]
+
+        values = chunk[self.partition_by]
+        missing = values.isna()
+        if missing.any():
+            # Строку без значения партиции некуда положить
+            self.skipped += int(missing.sum())
+            chunk, values = chunk[~missing], values[~missing]
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            values = values.cat.remove_unused_categories()
+
+        for value, frame in chunk.groupby(values, observed=True, sort=False):
+            value = str(value)
+            if value not in self._partitions:
+                self._partitions[value] = {
+                    "value": value, "dir": f"p-{len(self._partitions):03d}", "rows": 0, "parts": []
+                }
+                self._buffers[value] = []
+                self._buffered[value] = 0
+
+            self._buffers[value].append(frame)
+            self._buffered[value] += len(frame)
+            if self._buffered[value] >= self.part_rows:
+                self._flush(value)
+
+        # Память ограничена: при переполнении пишется самый большой буфер
+        while sum(self._buffered.values()) > self.max_buffered:
+            self._flush(max(self._buffered, key=self._buffered.get))
+
+    def _flush(self, value: str):
+        frames = self._buffers[value]
+        if not frames:
+            return
+
+        df = _concat_frames(frames)
+        partition = self._partitions[value]
+        part = f"part-{len(partition['parts']):05d}"
+        part_dir = self.directory / partition["dir"] / part
+        part_dir.mkdir(parents=True)
+
+        columns = [save_column(part_dir, index, name, df[name]) for index, name in enumerate(df.columns)]
+        with open(part_dir / MANIFEST_NAME, 'w', encoding='utf-8') as f:
+            json.dump({"rows": int(len(df)), "columns": columns}, f, ensure_ascii=False)
+
+        # Сводка числовых колонок; зерно сжатия зависит только от пути части
+        numeric = [
+            name for name in df.columns
+            if pd.api.types.is_numeric_dtype(df[name]) and not isinstance(df[name].dtype, pd.CategoricalDtype)
+        ]
+        seed = zlib.crc32(f"{partition['dir']}/{part}".encode())
+        DistributionSketch.from_frame(df, numeric, seed=seed).save(part_dir / SKETCH_NAME)
+
+        partition["parts"].append(part)
+        partition["rows"] += int(len(df))
+        self.rows += int(len(df))
+        self._buffers[value] = []
+        self._buffered[value] = 0
+
+    def flush_all(self):
+        for value in self._buffers:
+            self._flush(value)
+
+    def partitions(self) -> List[Dict]:
+        return list(self._partitions.values())
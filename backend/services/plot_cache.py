@@ -0,0 +1,166 @@
+"""
+Кэш отрисованных графиков
+
+Картинка графика зависит только от версии датасета и параметров графика,
+поэтому готовые байты хранятся по ключу sha256(версия, имя, параметры):
+в памяти (LRU) и на диске в plots/cache/<версия>/<ключ>.<формат>.
+Тот же ключ служит сильным ETag для HTTP-ответов.
+
+Когда версия датасета меняется (перезагрузка, /data/append), картинки
+прежних версий больше не запрашиваются: их папки удаляются.
+"""
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class PlotCache:
+    """LRU-кэш картинок в памяти + копия на диске"""
+
+    def __init__(self, directory: Path, max_items: int = 64):
+        self.directory = Path(directory)
+        self.max_items = max_items
+        self._items: "OrderedDict[str, bytes]" = OrderedDict()
+        self._version: Optional[str] = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(version: str, name: str, params: Optional[Dict] = None) -> str:
+        """
+        Ключ картинки
+
+        Args:
+            version: Токен версии датасета
+            name: Имя графика
+            params: Параметры графика
+
+        Returns:
+            str: sha256 в hex виде
+        """
+        payload = json.dumps(
+            {"version": version, "name": name, "params": params or {}},
+            sort_keys=True, ensure_ascii=False, default=str
+        )
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def etag(key: str) -> str:
+        """Сильный ETag для ключа"""
+        return f'"{key}"'
+
+    def _path(self, version: str, key: str, extension: str) -> Path:
+        return self.directory / version / f"{key}.{extension}"
+
+    def _switch(self, version: str):
+        """Перейти на другую версию датасета, удалив картинки остальных версий"""
+        with self._lock:
+            if version == self._version:
+                return
+            self._version = version
+            self._items.clear()
+
+        try:
+            entries = list(self.directory.iterdir())
+        except OSError:
+            return
+
+        for entry in entries:
+            if entry.name == version:
+                continue
+            try:
+                if entry.is_dir():
+                    shutil.rmtree(entry, ignore_errors=True)
+                else:
+                    entry.unlink()
+            except OSError as e:
+                logger.warning(f"Не удалось удалить устаревший кэш графиков {entry}: {e}")
+
+    def _remember(self, key: str, data: bytes):
+        with self._lock:
+            self._items[key] = data
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_items:
+                self._items.popitem(last=False)
+
+    def get(self, version: str, key: str, extension: str = "png") -> Optional[bytes]:
+        """Картинка из памяти или с диска (None, если её нет)"""
+        self._switch(version)
+        with self._lock:
+            data = self._items.get(key)
+            if data is not None:
+                self._items.move_to_end(key)
+                return data
+
+        path = self._path(version, key, extension)
+        try:
+            data = path.read_bytes()
+        except OSError:
+            return None
+
+        self._remember(key, data)
+        return data
+
+    def put(self, version: str, key: str, data: bytes, extension: str = "png",
+            persist: bool = True):
+        """
+        Сохранить картинку в память и на диск
+
+        Args:
+            version: Токен версии датасета (папка на диске)
+            key: Ключ (см. make_key)
+            data: Байты картинки
+            extension: Расширение файла на диске
+            persist: Записать копию на диск. Картинки с произвольными
+                параметрами запроса (фильтры строк) держатся только в LRU:
+                файлы на диске не вытесняются
+        """
+        # Картинка, отрисованная до смены версии, уже никому не нужна
+        if version != self._version:
+            return
+
+        self._remember(key, data)
+        if not persist:
+            return
+
+        try:
+            path = self._path(version, key, extension)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = path.with_name(f"{path.name}.tmp-{os.getpid()}")
+            tmp_path.write_bytes(data)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"Не удалось сохранить график в кэш: {e}")
+
+    def get_or_render(self, version: str, key: str, render: Callable[[], bytes],
+                      extension: str = "png") -> bytes:
+        """
+        Вернуть картинку из кэша или отрисовать её
+
+        Args:
+            version: Токен версии датасета
+            key: Ключ (см. make_key)
+            render: Функция, возвращающая байты картинки
+            extension: Расширение файла на диске
+
+        Returns:
+            bytes: Байты картинки
+        """
+        data = self.get(version, key, extension)
+        if data is None:
+            data = render()
+            self.put(version, key, data, extension)
+        return data
+
+    def clear(self):
+        """Очистить кэш в памяти"""
+        with self._lock:
+            self._version = None
+            self._items.clear()
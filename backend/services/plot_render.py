@@ -0,0 +1,307 @@
+"""
+Отрисовка графиков без глобального состояния pyplot
+
+Функции модуля строят matplotlib.figure.Figure с холстом FigureCanvasAgg
+и возвращают байты картинки. Они принимают только подготовленные данные
+(массивы NumPy, подписи), поэтому их можно безопасно вызывать из
+нескольких потоков и отправлять в пул процессов.
+"""
+from io import BytesIO
+from typing import Dict, List, Sequence
+
+import numpy as np
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.colors import LogNorm
+from matplotlib.figure import Figure
+import seaborn as sns
+
+# Поддерживаемые форматы картинок и их MIME-типы
+IMAGE_FORMATS = {
+    'png': 'image/png',
+    'webp': 'image/webp',
+    'svg': 'image/svg+xml'
+}
+
+
+def new_figure(figsize) -> Figure:
+    """Новая фигура с собственным Agg-холстом (без pyplot)"""
+    fig = Figure(figsize=figsize)
+    FigureCanvasAgg(fig)
+    return fig
+
+
+def figure_to_bytes(fig: Figure, image_format: str = 'png') -> bytes:
+    """Сохранить фигуру в байты указанного формата"""
+    if image_format not in IMAGE_FORMATS:
+        raise ValueError(f"Неподдерживаемый формат изображения: '{image_format}'")
+
+    buffer = BytesIO()
+    fig.savefig(buffer, format=image_format, bbox_inches='tight', dpi=100)
+    return buffer.getvalue()
+
+
+def render_scatter(x: str, y: str, x_values: np.ndarray, y_values: np.ndarray,
+                   trend: Sequence[float], image_format: str = 'png') -> bytes:
+    """
+    Scatter plot с линией тренда
+
+    Args:
+        x, y: Названия колонок (для подписей)
+        x_values, y_values: Точки для отрисовки
+        trend: Коэффициенты линии тренда (наклон, сдвиг)
+        image_format: Формат картинки
+    """
+    fig = new_figure((12, 8))
+    ax = fig.add_subplot()
+
+    # Создаём scatter plot с градиентом цвета
+    scatter = ax.scatter(
+        x_values,
+        y_values,
+        alpha=0.5,
+        c=y_values,
+        cmap='viridis',
+        s=30,
+        edgecolors='none'
+    )
+
+    # Добавляем линию тренда
+    x_sorted = np.sort(x_values)
+    ax.plot(x_sorted, np.polyval(trend, x_sorted), "r--", alpha=0.8, linewidth=2, label='Тренд')
+
+    # Настройка графика
+    ax.set_xlabel(x.replace('_', ' ').title(), fontsize=14, fontweight='bold')
+    ax.set_ylabel(y.replace('_', ' ').title(), fontsize=14, fontweight='bold')
+    ax.set_title(f'Зависимость {y} от {x}', fontsize=16, fontweight='bold', pad=20)
+    ax.grid(True, alpha=0.3)
+    ax.legend()
+
+    # Добавляем colorbar
+    cbar = fig.colorbar(scatter, ax=ax)
+    cbar.set_label(y.replace('_', ' ').title(), fontsize=12)
+
+    fig.tight_layout()
+
+    return figure_to_bytes(fig, image_format)
+
+
+def render_density(x: str, y: str, counts: np.ndarray, extent: Sequence[float],
+                   trend: Sequence[float], n: int, image_format: str = 'png') -> bytes:
+    """
+    Scatter в виде растра плотности по всем точкам
+
+    Args:
+        x, y: Названия колонок (для подписей)
+        counts: 2D гистограмма (высота × ширина), строка 0 — минимальный y
+        extent: Границы растра (x_min, x_max, y_min, y_max)
+        trend: Коэффициенты линии тренда (наклон, сдвиг)
+        n: Число точек
+        image_format: Формат картинки
+    """
+    fig = new_figure((12, 8))
+    ax = fig.add_subplot()
+
+    # Пустые корзины остаются прозрачными, плотность — в логарифмической шкале
+    density = np.ma.masked_equal(counts, 0)
+    image = ax.imshow(
+        density,
+        origin='lower',
+        extent=extent,
+        aspect='auto',
+        cmap='viridis',
+        norm=LogNorm(vmin=1, vmax=max(int(counts.max()), 2)),
+        interpolation='nearest'
+    )
+
+    # Линия тренда по всем точкам
+    x_line = np.array([extent[0], extent[1]])
+    ax.plot(x_line, np.polyval(trend, x_line), "r--", alpha=0.8, linewidth=2, label='Тренд')
+
+    # Настройка графика
+    ax.set_xlabel(x.replace('_', ' ').title(), fontsize=14, fontweight='bold')
+    ax.set_ylabel(y.replace('_', ' ').title(), fontsize=14, fontweight='bold')
+    ax.set_title(f'Зависимость {y} от {x} (все {n:,} треков)', fontsize=16, fontweight='bold', pad=20)
+    ax.grid(True, alpha=0.3)
+    ax.legend()
+
+    cbar = fig.colorbar(image, ax=ax)
+    cbar.set_label('Количество треков', fontsize=12)
+
+    fig.tight_layout()
+
+    return figure_to_bytes(fig, image_format)
+
+
+def render_histogram(column: str, counts: np.ndarray, edges: np.ndarray,
+                     n: int, mean: float, median: float, std: float,
+                     image_format: str = 'png') -> bytes:
+    """
+    Гистограмма по заранее посчитанным корзинам
+
+    Args:
+        column: Название колонки
+        counts, edges: Результат np.histogram
+        n, mean, median, std: Статистики колонки
+        image_format: Формат картинки
+    """
+    fig = new_figure((12, 8))
+    ax = fig.add_subplot()
+
+    # Столбцы строятся из готовых счётчиков, а не из 232k значений
+    ax.hist(
+        edges[:-1],
+        bins=edges,
+        weights=counts,
+        color='steelblue',
+        edgecolor='black',
+        alpha=0.7,
+        linewidth=1.2
+    )
+
+    # Добавляем вертикальные линии для статистик
+    ax.axvline(mean, color='red', linestyle='--', linewidth=2.5,
+               label=f'Среднее: {mean:.2f}')
+    ax.axvline(median, color='green', linestyle='--', linewidth=2.5,
+               label=f'Медиана: {median:.2f}')
+
+    # Добавляем область ±1 стандартное отклонение
+    ax.axvspan(mean - std, mean + std,
+               alpha=0.2, color='yellow', label=f'±1σ ({std:.2f})')
+
+    # Настройка графика
+    ax.set_xlabel(column.replace('_', ' ').title(), fontsize=14, fontweight='bold')
+    ax.set_ylabel('Количество треков', fontsize=14, fontweight='bold')
+    ax.set_title(f'Распределение {column}', fontsize=16, fontweight='bold', pad=20)
+    ax.grid(True, alpha=0.3, axis='y')
+    ax.legend(fontsize=11, loc='upper right')
+
+    # Добавляем текст со статистикой
+    stats_text = f'n = {n:,}\nμ = {mean:.2f}\nσ = {std:.2f}'
+    ax.text(0.02, 0.98, stats_text, transform=ax.transAxes,
+            verticalalignment='top', bbox=dict(boxstyle='round', facecolor='wheat', alpha=0.5),
+            fontsize=10, family='monospace')
+
+    fig.tight_layout()
+
+    return figure_to_bytes(fig, image_format)
+
+
+def render_heatmap(matrix: np.ndarray, labels: List[str], image_format: str = 'png') -> bytes:
+    """
+    Тепловая карта корреляционной матрицы
+
+    Args:
+        matrix: Квадратная матрица корреляций
+        labels: Названия признаков
+        image_format: Формат картинки
+    """
+    fig = new_figure((14, 12))
+    ax = fig.add_subplot()
+
+    # Создаём маску для верхнего треугольника (чтобы не дублировать)
+    mask = np.triu(np.ones_like(matrix, dtype=bool))
+
+    # Создаём heatmap
+    sns.heatmap(
+        matrix,
+        mask=mask,
+        annot=True,
+        fmt='.2f',
+        cmap='coolwarm',
+        center=0,
+        square=True,
+        linewidths=1,
+        cbar_kws={"shrink": 0.8, "label": "Корреляция"},
+        vmin=-1,
+        vmax=1,
+        xticklabels=labels,
+        yticklabels=labels,
+        ax=ax
+    )
+
+    # Настройка графика
+    ax.set_title('Корреляционная матрица аудио-характеристик',
+                 fontsize=16, fontweight='bold', pad=20)
+
+    # Поворачиваем метки для лучшей читаемости
+    ax.tick_params(axis='x', labelrotation=45)
+    for label in ax.get_xticklabels():
+        label.set_horizontalalignment('right')
+    ax.tick_params(axis='y', labelrotation=0)
+
+    fig.tight_layout()
+
+    return figure_to_bytes(fig, image_format)
+
+
+def render_feature_importance(features: List[str], importances: List[float],
+                              top_n: int, image_format: str = 'png') -> bytes:
+    """
+    Горизонтальная диаграмма важности признаков
+
+    Args:
+        features, importances: Уже отсортированные топ-N признаков
+        top_n: Число признаков (для заголовка)
+        image_format: Формат картинки
+    """
+    fig = new_figure((12, 8))
+    ax = fig.add_subplot()
+
+    # Горизонтальный bar plot
+    bars = ax.barh(
+        features[::-1],
+        importances[::-1],
+        color='steelblue',
+        edgecolor='black',
+        linewidth=1.2
+    )
+
+    # Добавляем значения на столбцах
+    for bar in bars:
+        width = bar.get_width()
+        ax.text(width, bar.get_y() + bar.get_height()/2,
+                f'{width:.4f}',
+                ha='left', va='center', fontsize=10, fontweight='bold')
+
+    # Настройка графика
+    ax.set_xlabel('Важность признака', fontsize=14, fontweight='bold')
+    ax.set_ylabel('Признак', fontsize=14, fontweight='bold')
+    ax.set_title(f'Топ-{top_n} важных признаков (Random Forest)',
+                 fontsize=16, fontweight='bold', pad=20)
+    ax.grid(True, alpha=0.3, axis='x')
+
+    fig.tight_layout()
+
+    return figure_to_bytes(fig, image_format)
+
+
+def render_comparison(y_true: np.ndarray, y_pred_lr: np.ndarray, y_pred_rf: np.ndarray,
+                      y_range: Sequence[float], image_format: str = 'png') -> bytes:
+    """
+    Сравнение предсказаний двух моделей с реальными значениями
+
+    Args:
+        y_true, y_pred_lr, y_pred_rf: Выборка реальных и предсказанных значений
+        y_range: Минимум и максимум реальных значений (для диагонали)
+        image_format: Формат картинки
+    """
+    fig = new_figure((16, 7))
+    ax1, ax2 = fig.subplots(1, 2)
+
+    panels: Dict[str, tuple] = {
+        'Linear Regression': (ax1, y_pred_lr, None),
+        'Random Forest': (ax2, y_pred_rf, 'green')
+    }
+
+    for title, (ax, y_pred, color) in panels.items():
+        ax.scatter(y_true, y_pred, alpha=0.3, s=20, color=color)
+        ax.plot(list(y_range), list(y_range), 'r--', lw=2, label='Идеальное предсказание')
+        ax.set_xlabel('Реальная популярность', fontsize=12, fontweight='bold')
+        ax.set_ylabel('Предсказанная популярность', fontsize=12, fontweight='bold')
+        ax.set_title(title, fontsize=14, fontweight='bold')
+        ax.grid(True, alpha=0.3)
+        ax.legend()
+
+    fig.tight_layout()
+
+    return figure_to_bytes(fig, image_format)
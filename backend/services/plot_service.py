@@ -1,163 +1,249 @@
-
 import pandas as pd
 import matplotlib
 matplotlib.use('Agg')  # Backend без GUI
-import matplotlib.pyplot as plt
-import seaborn as sns
 import numpy as np
+import asyncio
 import base64
-from io import BytesIO
-from typing import Tuple
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from typing import Callable, Dict, Optional, Tuple
 import warnings
+from backend.config import (
+    PLOT_CACHE_DIR, PLOT_CACHE_SIZE, PLOT_RENDER_WORKERS, PLOT_DENSITY_BINS
+)
+from backend.services.plot_cache import PlotCache
+from backend.services import plot_render
+from backend.services.plot_render import IMAGE_FORMATS
 warnings.filterwarnings('ignore')
 
+logger = logging.getLogger(__name__)
+
 
 class PlotService:
+    """
+    Подготовка данных для графиков и их отрисовка
+
+    Данные (выборки, гистограммы, матрицы) готовятся в процессе приложения,
+    а сама отрисовка выполняется функциями plot_render — синхронно или
+    в ограниченном пуле процессов (PLOT_RENDER_WORKERS).
+    """
+
+    def __init__(self):
+        self.cache = PlotCache(PLOT_CACHE_DIR, max_items=PLOT_CACHE_SIZE)
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._pool_lock = threading.Lock()
+
+    # ========== ПУЛ ОТРИСОВКИ ==========
+
+    def _get_pool(self) -> Optional[ProcessPoolExecutor]:
+        if PLOT_RENDER_WORKERS <= 0:
+            return None
+
+        with self._pool_lock:
+            if self._pool is None:
+                # spawn: дочерние процессы не наследуют потоки и состояние приложения
+                self._pool = ProcessPoolExecutor(
+                    max_workers=PLOT_RENDER_WORKERS,
+                    mp_context=multiprocessing.get_context('spawn')
+                )
+                logger.info(f"Пул отрисовки графиков: {PLOT_RENDER_WORKERS} процессов")
+            return self._pool
+
+    def shutdown(self):
+        """Остановить пул отрисовки"""
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False)
+                self._pool = None
+
+    async def _render_async(self, renderer: Callable, inputs: Dict, image_format: str) -> bytes:
+        """Отрисовать картинку в пуле процессов, не блокируя event loop"""
+        loop = asyncio.get_running_loop()
+        task = partial(renderer, image_format=image_format, **inputs)
+        return await loop.run_in_executor(self._get_pool(), task)
+
+    # ========== ФОРМАТЫ ==========
 
     @staticmethod
-    def _fig_to_base64(fig: plt.Figure) -> str:
+    def to_data_uri(image: bytes, image_format: str = 'png') -> str:
+        """Обернуть картинку в data URI для текущего frontend"""
+        image_base64 = base64.b64encode(image).decode()
+        return f"data:{IMAGE_FORMATS[image_format]};base64,{image_base64}"
 
-        buffer = BytesIO()
-        fig.savefig(buffer, format='png', bbox_inches='tight', dpi=100)
-        buffer.seek(0)
-        image_base64 = base64.b64encode(buffer.read()).decode()
-        plt.close(fig)
-        return f"data:image/png;base64,{image_base64}"
+    # ========== ПОДГОТОВКА ДАННЫХ ==========
+
+    # Режимы scatter: выборка точек или растр плотности по всем строкам
+    SCATTER_MODES = ('points', 'density')
 
     @staticmethod
-    def create_scatter_plot(df: pd.DataFrame, x: str, y: str,
-                            sample_size: int = 5000) -> str:
+    def _linear_trend(x_values: np.ndarray, y_values: np.ndarray) -> np.ndarray:
+        """
+        Линия тренда методом наименьших квадратов в замкнутом виде, O(n)
+
+        Returns:
+            np.ndarray: [наклон, сдвиг] (как у np.polyfit(..., 1))
+        """
+        x_mean = x_values.mean()
+        y_mean = y_values.mean()
+        x_centered = x_values - x_mean
+        denominator = np.dot(x_centered, x_centered)
+        slope = np.dot(x_centered, y_values - y_mean) / denominator if denominator > 0 else 0.0
+        return np.array([slope, y_mean - slope * x_mean])
 
-        if x not in df.columns or y not in df.columns:
-            raise ValueError(f"Колонки '{x}' или '{y}' не найдены в датасете")
+    @staticmethod
+    def _axis_bins(values: np.ndarray, n_bins: int,
+                   discrete: bool) -> Tuple[np.ndarray, int, float, float]:
+        """
+        Номера корзин по одной оси
 
-        # Создаём фигуру
-        fig, ax = plt.subplots(figsize=(12, 8))
+        Для целочисленных колонок (popularity) корзин не больше, чем
+        различных значений, а границы проходят посередине между целыми —
+        иначе в растре появляются пустые полосы.
 
-        # Берём случайную выборку для лучшей визуализации
-        sample_df = df.sample(min(sample_size, len(df)), random_state=42)
-
-        # Создаём scatter plot с градиентом цвета
-        scatter = ax.scatter(
-            sample_df[x],
-            sample_df[y],
-            alpha=0.5,
-            c=sample_df[y],
-            cmap='viridis',
-            s=30,
-            edgecolors='none'
-        )
+        Returns:
+            Tuple: номера корзин, число корзин, нижняя и верхняя граница
+        """
+        low, high = float(values.min()), float(values.max())
 
-        # Добавляем линию тренда
-        z = np.polyfit(sample_df[x].dropna(), sample_df[y].dropna(), 1)
-        p = np.poly1d(z)
-        x_sorted = np.sort(sample_df[x].dropna())
-        ax.plot(x_sorted, p(x_sorted), "r--", alpha=0.8, linewidth=2, label='Тренд')
+        if discrete:
+            low, high = low - 0.5, high + 0.5
+            n_bins = min(n_bins, int(high - low))
 
-        # Настройка графика
-        ax.set_xlabel(x.replace('_', ' ').title(), fontsize=14, fontweight='bold')
-        ax.set_ylabel(y.replace('_', ' ').title(), fontsize=14, fontweight='bold')
-        ax.set_title(f'Зависимость {y} от {x}', fontsize=16, fontweight='bold', pad=20)
-        ax.grid(True, alpha=0.3)
-        ax.legend()
+        span = (high - low) or 1.0
+        indices = ((values - low) * (n_bins / span)).astype(np.int64)
+        np.clip(indices, 0, n_bins - 1, out=indices)
+        return indices, n_bins, low, low + span
 
-        # Добавляем colorbar
-        cbar = plt.colorbar(scatter, ax=ax)
-        cbar.set_label(y.replace('_', ' ').title(), fontsize=12)
+    @staticmethod
+    def _density_grid(x_values: np.ndarray, y_values: np.ndarray, bins: Tuple[int, int],
+                      discrete: Tuple[bool, bool] = (False, False)) -> Tuple[np.ndarray, list]:
+        """
+        2D гистограмма всех точек векторизованным биннингом
 
-        plt.tight_layout()
+        Стоимость — O(n) на биннинг и O(ширина × высота) на отрисовку,
+        вне зависимости от числа строк.
+        """
+        ix, width, x_low, x_high = PlotService._axis_bins(x_values, bins[0], discrete[0])
+        iy, height, y_low, y_high = PlotService._axis_bins(y_values, bins[1], discrete[1])
 
-        return PlotService._fig_to_base64(fig)
+        counts = np.bincount(iy * width + ix, minlength=width * height).reshape(height, width)
+        return counts, [x_low, x_high, y_low, y_high]
 
     @staticmethod
-    def create_histogram(df: pd.DataFrame, column: str, bins: int = 50) -> str:
+    def _scatter_inputs(df: pd.DataFrame, x: str, y: str, sample_size: int,
+                        mode: str = 'points') -> Dict:
+
+        if x not in df.columns or y not in df.columns:
+            raise ValueError(f"Колонки '{x}' или '{y}' не найдены в датасете")
+
+        if mode not in PlotService.SCATTER_MODES:
+            raise ValueError(f"Неизвестный режим scatter: '{mode}'")
+
+        data = df[[x, y]].dropna()
+        x_all = data[x].to_numpy(dtype=np.float64)
+        y_all = data[y].to_numpy(dtype=np.float64)
+
+        # Тренд всегда считается по всем строкам
+        trend = PlotService._linear_trend(x_all, y_all)
+
+        if mode == 'density':
+            discrete = (
+                pd.api.types.is_integer_dtype(data[x]),
+                pd.api.types.is_integer_dtype(data[y])
+            )
+            counts, extent = PlotService._density_grid(x_all, y_all, PLOT_DENSITY_BINS, discrete)
+            return {
+                "x": x,
+                "y": y,
+                "counts": counts,
+                "extent": extent,
+                "trend": trend,
+                "n": int(len(x_all))
+            }
+
+        # Берём случайную выборку для лучшей визуализации
+        sample_df = data.sample(min(sample_size, len(data)), random_state=42)
+
+        return {
+            "x": x,
+            "y": y,
+            "x_values": sample_df[x].to_numpy(dtype=np.float64),
+            "y_values": sample_df[y].to_numpy(dtype=np.float64),
+            "trend": trend
+        }
+
+    @staticmethod
+    def _scatter_renderer(mode: str) -> Callable:
+        return plot_render.render_density if mode == 'density' else plot_render.render_scatter
+
+    @staticmethod
+    def _histogram_inputs(df: pd.DataFrame, column: str, bins: int) -> Dict:
 
         if column not in df.columns:
             raise ValueError(f"Колонка '{column}' не найдена в датасете")
 
-        # Создаём фигуру
-        fig, ax = plt.subplots(figsize=(12, 8))
-
         # Данные без пропусков
         data = df[column].dropna()
+        counts, edges = np.histogram(data.to_numpy(dtype=np.float64), bins=bins)
+
+        return {
+            "column": column,
+            "counts": counts,
+            "edges": edges,
+            "n": int(len(data)),
+            "mean": float(data.mean()),
+            "median": float(data.median()),
+            "std": float(data.std())
+        }
 
-        # Создаём гистограмму
-        n, bins_edges, patches = ax.hist(
-            data,
-            bins=bins,
-            color='steelblue',
-            edgecolor='black',
-            alpha=0.7,
-            linewidth=1.2
-        )
+    @staticmethod
+    def _heatmap_inputs(corr_matrix: pd.DataFrame) -> Dict:
+
+        return {
+            "matrix": corr_matrix.to_numpy(dtype=np.float64),
+            "labels": [str(label) for label in corr_matrix.columns]
+        }
+
+    # ========== СИНХРОННАЯ ОТРИСОВКА ==========
 
-        # Вычисляем статистики
-        mean_val = data.mean()
-        median_val = data.median()
-        std_val = data.std()
+    @staticmethod
+    def create_scatter_plot(df: pd.DataFrame, x: str, y: str,
+                            sample_size: int = 5000) -> str:
 
-        # Добавляем вертикальные линии для статистик
-        ax.axvline(mean_val, color='red', linestyle='--', linewidth=2.5,
-                   label=f'Среднее: {mean_val:.2f}')
-        ax.axvline(median_val, color='green', linestyle='--', linewidth=2.5,
-                   label=f'Медиана: {median_val:.2f}')
+        return PlotService.to_data_uri(PlotService.scatter_image(df, x, y, sample_size))
 
-        # Добавляем область ±1 стандартное отклонение
-        ax.axvspan(mean_val - std_val, mean_val + std_val,
-                   alpha=0.2, color='yellow', label=f'±1σ ({std_val:.2f})')
+    @staticmethod
+    def scatter_image(df: pd.DataFrame, x: str, y: str, sample_size: int = 5000,
+                      image_format: str = 'png', mode: str = 'points') -> bytes:
 
-        # Настройка графика
-        ax.set_xlabel(column.replace('_', ' ').title(), fontsize=14, fontweight='bold')
-        ax.set_ylabel('Количество треков', fontsize=14, fontweight='bold')
-        ax.set_title(f'Распределение {column}', fontsize=16, fontweight='bold', pad=20)
-        ax.grid(True, alpha=0.3, axis='y')
-        ax.legend(fontsize=11, loc='upper right')
+        inputs = PlotService._scatter_inputs(df, x, y, sample_size, mode)
+        return PlotService._scatter_renderer(mode)(image_format=image_format, **inputs)
+
+    @staticmethod
+    def create_histogram(df: pd.DataFrame, column: str, bins: int = 50) -> str:
 
-        # Добавляем текст со статистикой
-        stats_text = f'n = {len(data):,}\nμ = {mean_val:.2f}\nσ = {std_val:.2f}'
-        ax.text(0.02, 0.98, stats_text, transform=ax.transAxes,
-                verticalalignment='top', bbox=dict(boxstyle='round', facecolor='wheat', alpha=0.5),
-                fontsize=10, family='monospace')
+        return PlotService.to_data_uri(PlotService.histogram_image(df, column, bins))
 
-        plt.tight_layout()
+    @staticmethod
+    def histogram_image(df: pd.DataFrame, column: str, bins: int = 50,
+                        image_format: str = 'png') -> bytes:
 
-        return PlotService._fig_to_base64(fig)
+        inputs = PlotService._histogram_inputs(df, column, bins)
+        return plot_render.render_histogram(image_format=image_format, **inputs)
 
     @staticmethod
     def create_heatmap(corr_matrix: pd.DataFrame) -> str:
-        # Создаём фигуру
-        fig, ax = plt.subplots(figsize=(14, 12))
-
-        # Создаём маску для верхнего треугольника (чтобы не дублировать)
-        mask = np.triu(np.ones_like(corr_matrix, dtype=bool))
-
-        # Создаём heatmap
-        sns.heatmap(
-            corr_matrix,
-            mask=mask,
-            annot=True,
-            fmt='.2f',
-            cmap='coolwarm',
-            center=0,
-            square=True,
-            linewidths=1,
-            cbar_kws={"shrink": 0.8, "label": "Корреляция"},
-            vmin=-1,
-            vmax=1,
-            ax=ax
-        )
 
-        # Настройка графика
-        ax.set_title('Корреляционная матрица аудио-характеристик',
-                     fontsize=16, fontweight='bold', pad=20)
+        return PlotService.to_data_uri(PlotService.heatmap_image(corr_matrix))
 
-        # Поворачиваем метки для лучшей читаемости
-        plt.xticks(rotation=45, ha='right')
-        plt.yticks(rotation=0)
-
-        plt.tight_layout()
+    @staticmethod
+    def heatmap_image(corr_matrix: pd.DataFrame, image_format: str = 'png') -> bytes:
 
-        return PlotService._fig_to_base64(fig)
+        inputs = PlotService._heatmap_inputs(corr_matrix)
+        return plot_render.render_heatmap(image_format=image_format, **inputs)
 
     @staticmethod
     def create_feature_importance_plot(features: list, importances: list,
@@ -169,73 +255,56 @@ class PlotService:
             'importance': importances
         }).sort_values('importance', ascending=False).head(top_n)
 
-        # Создаём фигуру
-        fig, ax = plt.subplots(figsize=(12, 8))
-
-        # Горизонтальный bar plot
-        bars = ax.barh(
-            importance_df['feature'][::-1],
-            importance_df['importance'][::-1],
-            color='steelblue',
-            edgecolor='black',
-            linewidth=1.2
+        image = plot_render.render_feature_importance(
+            importance_df['feature'].tolist(),
+            importance_df['importance'].tolist(),
+            top_n
         )
-
-        # Добавляем значения на столбцах
-        for i, bar in enumerate(bars):
-            width = bar.get_width()
-            ax.text(width, bar.get_y() + bar.get_height()/2,
-                    f'{width:.4f}',
-                    ha='left', va='center', fontsize=10, fontweight='bold')
-
-        # Настройка графика
-        ax.set_xlabel('Важность признака', fontsize=14, fontweight='bold')
-        ax.set_ylabel('Признак', fontsize=14, fontweight='bold')
-        ax.set_title(f'Топ-{top_n} важных признаков (Random Forest)',
-                     fontsize=16, fontweight='bold', pad=20)
-        ax.grid(True, alpha=0.3, axis='x')
-
-        plt.tight_layout()
-
-        return PlotService._fig_to_base64(fig)
+        return PlotService.to_data_uri(image)
 
     @staticmethod
     def create_comparison_plot(y_true, y_pred_lr, y_pred_rf,
                                sample_size: int = 1000) -> str:
 
-        # Создаём фигуру с двумя подграфиками
-        fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(16, 7))
-
         # Случайная выборка
         indices = np.random.choice(len(y_true), min(sample_size, len(y_true)), replace=False)
         y_true_sample = y_true.iloc[indices] if hasattr(y_true, 'iloc') else y_true[indices]
-        y_pred_lr_sample = y_pred_lr[indices]
-        y_pred_rf_sample = y_pred_rf[indices]
-
-        # Linear Regression
-        ax1.scatter(y_true_sample, y_pred_lr_sample, alpha=0.3, s=20)
-        ax1.plot([y_true.min(), y_true.max()], [y_true.min(), y_true.max()],
-                 'r--', lw=2, label='Идеальное предсказание')
-        ax1.set_xlabel('Реальная популярность', fontsize=12, fontweight='bold')
-        ax1.set_ylabel('Предсказанная популярность', fontsize=12, fontweight='bold')
-        ax1.set_title('Linear Regression', fontsize=14, fontweight='bold')
-        ax1.grid(True, alpha=0.3)
-        ax1.legend()
-
-        # Random Forest
-        ax2.scatter(y_true_sample, y_pred_rf_sample, alpha=0.3, s=20, color='green')
-        ax2.plot([y_true.min(), y_true.max()], [y_true.min(), y_true.max()],
-                 'r--', lw=2, label='Идеальное предсказание')
-        ax2.set_xlabel('Реальная популярность', fontsize=12, fontweight='bold')
-        ax2.set_ylabel('Предсказанная популярность', fontsize=12, fontweight='bold')
-        ax2.set_title('Random Forest', fontsize=14, fontweight='bold')
-        ax2.grid(True, alpha=0.3)
-        ax2.legend()
-
-        plt.tight_layout()
-
-        return PlotService._fig_to_base64(fig)
+
+        image = plot_render.render_comparison(
+            np.asarray(y_true_sample),
+            np.asarray(y_pred_lr)[indices],
+            np.asarray(y_pred_rf)[indices],
+            (float(np.min(y_true)), float(np.max(y_true)))
+        )
+        return PlotService.to_data_uri(image)
+
+    # ========== АСИНХРОННАЯ ОТРИСОВКА (ПУЛ ПРОЦЕССОВ) ==========
+
+    async def scatter_image_async(self, df: pd.DataFrame, x: str, y: str,
+                                  sample_size: int = 5000, image_format: str = 'png',
+                                  mode: str = 'points') -> bytes:
+
+        loop = asyncio.get_running_loop()
+        inputs = await loop.run_in_executor(
+            None, PlotService._scatter_inputs, df, x, y, sample_size, mode
+        )
+        return await self._render_async(PlotService._scatter_renderer(mode), inputs, image_format)
+
+    async def histogram_image_async(self, df: pd.DataFrame, column: str, bins: int = 50,
+                                    image_format: str = 'png') -> bytes:
+
+        loop = asyncio.get_running_loop()
+        inputs = await loop.run_in_executor(
+            None, PlotService._histogram_inputs, df, column, bins
+        )
+        return await self._render_async(plot_render.render_histogram, inputs, image_format)
+
+    async def heatmap_image_async(self, corr_matrix: pd.DataFrame,
+                                  image_format: str = 'png') -> bytes:
+
+        inputs = PlotService._heatmap_inputs(corr_matrix)
+        return await self._render_async(plot_render.render_heatmap, inputs, image_format)
 
 
 # Глобальный экземпляр сервиса
-plot_service = PlotService()
\ No newline at end of file
+plot_service = PlotService()
@@ -0,0 +1,169 @@
+"""
+Микробатчинг одиночных предсказаний
+
+Одновременные запросы /model/predict не вызывают модель по отдельности:
+MicroBatcher собирает их в asyncio-очередь, ждёт не дольше max_wait_ms
+(или пока не наберётся max_batch строк), считает всю порцию одним
+векторным вызовом в пуле потоков и раздаёт результаты обратно.
+
+Статистика: перцентили задержки (p50/p90/p99) и гистограмма размеров порций.
+"""
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+from backend.config import PREDICT_BATCH_MAX_WAIT_MS, PREDICT_BATCH_MAX_SIZE
+from backend.services.model_service import model_service
+
+logger = logging.getLogger(__name__)
+
+# Сколько последних задержек и размеров порций хранить для статистики
+STATS_WINDOW = 10000
+
+
+class MicroBatcher:
+    """Объединение одновременных запросов в порции"""
+
+    def __init__(self, process: Callable[[List[Any]], List[Any]],
+                 max_wait_ms: float = PREDICT_BATCH_MAX_WAIT_MS,
+                 max_batch: int = PREDICT_BATCH_MAX_SIZE):
+        """
+        Args:
+            process: Функция порции: список входов → список результатов
+                (элемент-исключение означает ошибку для этого входа)
+            max_wait_ms: Сколько ждать новые запросы после первого в порции
+            max_batch: Максимальный размер порции
+        """
+        self.process = process
+        self.max_wait_ms = max_wait_ms
+        self.max_batch = max(int(max_batch), 1)
+
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._full: Optional[asyncio.Event] = None
+        self._worker: Optional[asyncio.Task] = None
+
+        self.reset_stats()
+
+    # ========== ОЧЕРЕДЬ ==========
+
+    def _ensure_worker(self):
+        """Создать очередь и обработчик в текущем event loop"""
+        loop = asyncio.get_running_loop()
+        if self._loop is loop and self._worker is not None and not self._worker.done():
+            return
+
+        self._loop = loop
+        self._queue = asyncio.Queue()
+        self._full = asyncio.Event()
+        self._worker = loop.create_task(self._run())
+
+    async def submit(self, item: Any) -> Any:
+        """
+        Поставить вход в очередь и дождаться результата
+
+        Raises:
+            Exception: Ошибка, которую функция порции вернула для этого входа
+        """
+        self._ensure_worker()
+
+        future = self._loop.create_future()
+        self._queue.put_nowait((item, future, time.perf_counter()))
+        # Первый запрос порции уже у обработчика: порция полна при max_batch - 1 в очереди
+        if self._queue.qsize() >= self.max_batch - 1:
+            self._full.set()
+
+        result = await future
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    async def _next_batch(self) -> List:
+        """Первый запрос + всё, что пришло за max_wait_ms (не больше max_batch)"""
+        batch = [await self._queue.get()]
+
+        if self.max_wait_ms > 0 and self._queue.qsize() < self.max_batch - 1:
+            self._full.clear()
+            try:
+                await asyncio.wait_for(self._full.wait(), self.max_wait_ms / 1000)
+            except asyncio.TimeoutError:
+                pass
+
+        while len(batch) < self.max_batch and not self._queue.empty():
+            batch.append(self._queue.get_nowait())
+
+        return batch
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+
+        while True:
+            batch = await self._next_batch()
+            items = [item for item, _, _ in batch]
+
+            try:
+                results = await loop.run_in_executor(None, self.process, items)
+            except Exception as e:
+                logger.error(f"Ошибка обработки порции из {len(items)} запросов: {e}")
+                results = [e] * len(items)
+
+            finished = time.perf_counter()
+            for (_, future, started), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+                self._latencies.append((finished - started) * 1000)
+
+            self._record_batch(len(batch))
+
+    def shutdown(self):
+        """Остановить обработчик очереди"""
+        if self._worker is not None:
+            self._worker.cancel()
+            self._worker = None
+
+    # ========== СТАТИСТИКА ==========
+
+    def reset_stats(self):
+        self._latencies = deque(maxlen=STATS_WINDOW)
+        self._histogram: Dict[int, int] = {}
+        self.total_requests = 0
+        self.total_batches = 0
+
+    def _record_batch(self, size: int):
+        # Корзины по степеням двойки: 1, 2, 3-4, 5-8, ...
+        upper = 1 << (size - 1).bit_length()
+        self._histogram[upper] = self._histogram.get(upper, 0) + 1
+        self.total_requests += size
+        self.total_batches += 1
+
+    def stats(self) -> Dict:
+        """Задержки (мс) и распределение размеров порций"""
+        latencies = np.asarray(self._latencies, dtype=np.float64)
+        percentiles = {}
+        if latencies.size:
+            p50, p90, p99 = np.percentile(latencies, [50, 90, 99])
+            percentiles = {"p50": float(p50), "p90": float(p90), "p99": float(p99),
+                           "max": float(latencies.max())}
+
+        histogram = {}
+        for upper in sorted(self._histogram):
+            lower = upper // 2 + 1
+            label = str(upper) if lower >= upper else f"{lower}-{upper}"
+            histogram[label] = self._histogram[upper]
+
+        return {
+            "settings": {"max_wait_ms": self.max_wait_ms, "max_batch": self.max_batch},
+            "requests": self.total_requests,
+            "batches": self.total_batches,
+            "mean_batch_size": self.total_requests / self.total_batches if self.total_batches else 0.0,
+            "latency_ms": percentiles,
+            "batch_size_histogram": histogram
+        }
+
+
+# Глобальный экземпляр сервиса
+prediction_batcher = MicroBatcher(model_service.predict_records)
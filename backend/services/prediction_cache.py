@@ -0,0 +1,117 @@
+"""
+Кэш предсказаний /model/predict
+
+Форма предсказания на frontend отправляет значения слайдеров, и одни и те же
+комбинации признаков приходят снова и снова. Результат хранится в LRU-кэше
+с временем жизни под ключом «версия модели + вектор признаков», округлённый
+до PREDICT_CACHE_DECIMALS знаков. Предсказание считается по тому же
+округлённому вектору, поэтому ответ не зависит от того, попал ли запрос в кэш.
+
+Версия модели входит в ключ, а при подмене моделей кэш очищается целиком.
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+
+class PredictionCache:
+    """LRU + TTL кэш предсказаний по квантованному вектору признаков"""
+
+    def __init__(self, max_items: int = 10000, ttl: float = 3600.0,
+                 decimals: Optional[int] = 4):
+        """
+        Args:
+            max_items: Максимум записей (0 — кэш выключен)
+            ttl: Время жизни записи в секундах (0 — без ограничения)
+            decimals: Знаков после запятой при квантовании (None — без округления)
+        """
+        self.max_items = max_items
+        self.ttl = ttl
+        self.decimals = decimals
+        self._items: "OrderedDict[Tuple, Tuple[float, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.reset_stats()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_items > 0
+
+    def canonicalize(self, vector: np.ndarray) -> np.ndarray:
+        """Квантованный вектор признаков (-0.0 приводится к 0.0)"""
+        if self.decimals is None:
+            return vector + 0.0
+        return np.round(vector, self.decimals) + 0.0
+
+    @staticmethod
+    def make_key(model_version: Optional[str], vector: np.ndarray) -> Tuple:
+        """Ключ: версия модели + байты канонического вектора"""
+        return model_version, vector.tobytes()
+
+    def get(self, key: Tuple) -> Optional[float]:
+        """Предсказание из кэша или None"""
+        if not self.enabled:
+            return None
+
+        with self._lock:
+            entry = self._items.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            value, expires_at = entry
+            if expires_at and expires_at < time.monotonic():
+                del self._items[key]
+                self.expired += 1
+                self.misses += 1
+                return None
+
+            self._items.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: Tuple, value: float):
+        """Сохранить предсказание"""
+        if not self.enabled:
+            return
+
+        expires_at = time.monotonic() + self.ttl if self.ttl > 0 else 0.0
+        with self._lock:
+            self._items[key] = (value, expires_at)
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_items:
+                self._items.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        """Удалить все записи (например, после подмены моделей)"""
+        with self._lock:
+            if self._items:
+                self.invalidations += 1
+            self._items.clear()
+
+    def reset_stats(self):
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expired = 0
+        self.invalidations = 0
+
+    def stats(self) -> Dict:
+        """Счётчики попаданий и промахов"""
+        total = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "size": len(self._items),
+            "max_items": self.max_items,
+            "ttl_seconds": self.ttl,
+            "decimals": self.decimals,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "evictions": self.evictions,
+            "expired": self.expired,
+            "invalidations": self.invalidations
+        }
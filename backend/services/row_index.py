@@ -0,0 +1,338 @@
+"""
+Индекс строк для фильтров /analysis/* и /plots/*
+
+Создаётся при загрузке датасета (и после дополнения), чтобы фильтр
+вида «genre=Rock, popularity 60..100, tempo 100..140» превращался в номера
+строк без прохода по всем колонкам:
+
+    категориальные колонки — списки строк по кодам: строки, упорядоченные
+        по коду (устойчивая сортировка), и начало отрезка каждого кода;
+        строки значения — отрезок, уже упорядоченный по номеру
+    числовые колонки — строки, упорядоченные по значению, и сами значения
+        в этом порядке; диапазон [min, max] — два бинарных поиска и отрезок
+
+Запрос: для каждого условия размер его отрезка известен без чтения строк,
+кандидатами берутся строки самого избирательного условия, остальные условия
+проверяются только на них. Если даже самое избирательное условие оставляет
+больше ROW_INDEX_SCAN_FRACTION строк, дешевле обычный проход маской.
+
+Индексируются только колонки ROW_INDEX_COLUMNS, и каждая — при первом
+фильтре по ней, поэтому неиспользуемые колонки не занимают память.
+
+Дополнение датасета (RowIndex.extend) не сортирует колонки заново: новые
+строки сортируются отдельно и вставляются в готовые отрезки.
+"""
+import threading
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from backend.config import ROW_INDEX_COLUMNS, ROW_INDEX_SCAN_FRACTION
+from backend.services.groupby import GroupKey
+
+Range = Tuple[Optional[float], Optional[float]]
+
+
+class RowFilter:
+    """
+    Условия на строки датасета
+
+    Атрибуты:
+        values: {категориальная колонка: допустимые значения}
+        ranges: {числовая колонка: (min, max)} — границы включаются,
+            None — без границы
+    """
+
+    def __init__(self, values: Optional[Dict[str, Sequence]] = None,
+                 ranges: Optional[Dict[str, Range]] = None):
+        self.values = {column: sorted({str(value) for value in items})
+                       for column, items in (values or {}).items()}
+        self.ranges: Dict[str, Range] = {}
+        for column, (low, high) in (ranges or {}).items():
+            self.add_range(column, low, high)
+
+    def add_range(self, column: str, low: Optional[float], high: Optional[float]):
+        """Добавить диапазон (пересекается с уже заданным для колонки)"""
+        current_low, current_high = self.ranges.get(column, (None, None))
+        if low is not None:
+            low = float(low) if current_low is None else max(current_low, float(low))
+        else:
+            low = current_low
+        if high is not None:
+            high = float(high) if current_high is None else min(current_high, float(high))
+        else:
+            high = current_high
+
+        if low is not None and high is not None and low > high:
+            raise ValueError(f"Пустой диапазон '{column}': {low} > {high}")
+        if low is not None or high is not None:
+            self.ranges[column] = (low, high)
+
+    @classmethod
+    def parse(cls, genres: Optional[List[str]] = None,
+              popularity_min: Optional[float] = None, popularity_max: Optional[float] = None,
+              ranges: Optional[List[str]] = None) -> "RowFilter":
+        """
+        Фильтр из параметров запроса
+
+        Args:
+            genres: Допустимые жанры
+            popularity_min, popularity_max: Диапазон популярности
+            ranges: Диапазоны вида 'tempo:100:140' ('tempo:100:' — только
+                нижняя граница, 'tempo::140' — только верхняя)
+        """
+        row_filter = cls({'genre': genres} if genres else None)
+        row_filter.add_range('popularity', popularity_min, popularity_max)
+
+        for item in ranges or []:
+            parts = item.split(":")
+            if len(parts) != 3 or not parts[0].strip():
+                raise ValueError(f"Диапазон '{item}' должен иметь вид признак:min:max")
+            column, low, high = (part.strip() for part in parts)
+            try:
+                low, high = (float(low) if low else None), (float(high) if high else None)
+            except ValueError:
+                raise ValueError(f"Границы диапазона '{item}' должны быть числами")
+            row_filter.add_range(column, low, high)
+        return row_filter
+
+    def __bool__(self) -> bool:
+        return bool(self.values or self.ranges)
+
+    def columns(self) -> List[str]:
+        return list(self.values) + list(self.ranges)
+
+    def to_dict(self) -> Dict:
+        """Условия в каноническом виде (для ответа и ключей кэша)"""
+        result: Dict = {column: self.values[column] for column in sorted(self.values)}
+        result.update({column: list(self.ranges[column]) for column in sorted(self.ranges)})
+        return result
+
+
+class _Postings:
+    """Строки каждого значения категориальной колонки"""
+
+    def __init__(self, key: GroupKey):
+        self.key = key
+        self.order = np.argsort(key.codes, kind='stable').astype(np.int32)
+        counts = np.bincount(key.codes[key.codes >= 0], minlength=len(key.labels))
+        # Строки с пропуском (код -1) стоят в начале order
+        self.starts = len(key.codes) - counts.sum() + np.r_[0, np.cumsum(counts)]
+
+    def extend(self, key: GroupKey, start: int) -> Optional["_Postings"]:
+        """
+        Списки для колонки, дополненной строками start.. (None — строить заново)
+
+        Новые строки идут после всех прежних, поэтому в отрезке каждого кода
+        они встают в конец: достаточно одной вставки в готовый order.
+        """
+        n_labels = len(self.key.labels)
+        if key.labels[:n_labels] != self.key.labels:
+            return None
+
+        codes = key.codes[start:]
+        new_order = np.argsort(codes, kind='stable')
+        new_codes = codes[new_order]
+        # Конец отрезка каждого кода; у новых кодов отрезок пока пустой (в конце)
+        ends = np.r_[self.starts[1:], np.full(len(key.labels) - n_labels, self.starts[-1])]
+        positions = np.where(new_codes >= 0, ends[np.maximum(new_codes, 0)], self.starts[0])
+
+        extended = _Postings.__new__(_Postings)
+        extended.key = key
+        extended.order = np.insert(self.order, positions, (new_order + start).astype(np.int32))
+        counts = np.r_[np.diff(self.starts), np.zeros(len(key.labels) - n_labels, dtype=np.int64)]
+        counts += np.bincount(codes[codes >= 0], minlength=len(key.labels))
+        extended.starts = len(key.codes) - counts.sum() + np.r_[0, np.cumsum(counts)]
+        return extended
+
+    def candidates(self, values: Sequence) -> Tuple[int, Callable]:
+        table = self.key.allowed(values)
+        codes = np.flatnonzero(table)
+        size = int(sum(self.starts[c + 1] - self.starts[c] for c in codes))
+
+        def rows() -> np.ndarray:
+            parts = [self.order[self.starts[c]:self.starts[c + 1]] for c in codes]
+            if len(parts) == 1:
+                return parts[0]
+            return np.sort(np.concatenate(parts)) if parts else np.empty(0, dtype=np.int32)
+
+        return size, rows
+
+    def check(self, values: Sequence, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        codes = self.key.codes if rows is None else self.key.codes[rows]
+        return self.key.allowed(values)[codes] & (codes >= 0)
+
+
+class _SortedColumn:
+    """Строки числовой колонки, упорядоченные по значению"""
+
+    def __init__(self, values: np.ndarray):
+        self.values = values
+        self.order = np.argsort(values, kind='stable').astype(np.int32)
+        self.sorted = values[self.order]
+        # NaN при сортировке уходят в конец и в диапазоны не попадают
+        self.valid = int(len(values) - np.isnan(values).sum()) if values.dtype.kind == 'f' else len(values)
+
+    def extend(self, values: np.ndarray, start: int) -> "_SortedColumn":
+        """Колонка, дополненная строками start..: новые значения вставляются в порядок"""
+        new = values[start:]
+        new_order = np.argsort(new, kind='stable')
+        new_sorted = new[new_order]
+        new_valid = int(len(new) - np.isnan(new).sum()) if new.dtype.kind == 'f' else len(new)
+
+        # Равные значения: прежние строки раньше новых ('right'); NaN — в конец
+        positions = np.r_[
+            np.searchsorted(self.sorted[:self.valid], new_sorted[:new_valid], 'right'),
+            np.full(len(new) - new_valid, len(self.sorted))
+        ].astype(np.int64)
+
+        extended = _SortedColumn.__new__(_SortedColumn)
+        extended.values = values
+        extended.order = np.insert(self.order, positions, (new_order + start).astype(np.int32))
+        extended.sorted = np.insert(self.sorted, positions, new_sorted)
+        extended.valid = self.valid + new_valid
+        return extended
+
+    def _bound(self, bound: float):
+        # Граница сравнивается в типе колонки, как при маске df[col] >= bound
+        return self.values.dtype.type(bound) if self.values.dtype.kind == 'f' else bound
+
+    def _slice(self, low: Optional[float], high: Optional[float]) -> slice:
+        start = 0 if low is None else int(np.searchsorted(self.sorted[:self.valid], self._bound(low), 'left'))
+        stop = self.valid if high is None else int(np.searchsorted(self.sorted[:self.valid], self._bound(high), 'right'))
+        return slice(start, max(start, stop))
+
+    def candidates(self, bounds: Range) -> Tuple[int, Callable]:
+        span = self._slice(*bounds)
+        return span.stop - span.start, lambda: np.sort(self.order[span])
+
+    def check(self, bounds: Range, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        values = self.values if rows is None else self.values[rows]
+        low, high = bounds
+        mask = ~np.isnan(values) if values.dtype.kind == 'f' else np.ones(len(values), dtype=bool)
+        if low is not None:
+            mask &= values >= self._bound(low)
+        if high is not None:
+            mask &= values <= self._bound(high)
+        return mask
+
+
+class RowIndex:
+    """
+    Индекс строк датафрейма: списки по кодам и упорядоченные числовые колонки
+
+    Индексируются только колонки, по которым фильтрует RowFilter
+    (ROW_INDEX_COLUMNS). Индекс колонки строится при первом запросе к ней:
+    упорядоченная копия значений и номера строк — столько же памяти, сколько
+    сама колонка, и в режиме общей памяти она выделяется в каждом воркере.
+    """
+
+    def __init__(self, df: pd.DataFrame, columns: Sequence[str] = ROW_INDEX_COLUMNS):
+        self.rows = len(df)
+        self._columns = list(columns)
+        self._categorical: Dict[str, pd.Series] = {}
+        self._numeric: Dict[str, pd.Series] = {}
+        self._built: Dict[str, object] = {}
+        self._lock = threading.Lock()
+
+        for column in columns:
+            if column not in df.columns:
+                continue
+            series = df[column]
+            if isinstance(series.dtype, pd.CategoricalDtype):
+                self._categorical[column] = series
+            elif pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series):
+                self._numeric[column] = series
+
+    def columns(self) -> List[str]:
+        return list(self._categorical) + list(self._numeric)
+
+    def _index(self, column: str):
+        """Индекс колонки (строится при первом обращении)"""
+        index = self._built.get(column)
+        if index is not None:
+            return index
+
+        with self._lock:
+            if column not in self._built:
+                if column in self._categorical:
+                    self._built[column] = _Postings(GroupKey.from_series(self._categorical[column]))
+                else:
+                    self._built[column] = _SortedColumn(self._numeric[column].to_numpy())
+            return self._built[column]
+
+    def extend(self, df: pd.DataFrame) -> "RowIndex":
+        """
+        Индекс датафрейма, дополненного строками в конце
+
+        Уже построенные колонки дополняются новыми строками (одна вставка
+        в готовые массивы вместо повторной сортировки), остальные
+        по-прежнему строятся при первом фильтре.
+
+        Args:
+            df: Датафрейм, первые self.rows строк которого — прежние
+        """
+        index = RowIndex(df, self._columns)
+        with self._lock:
+            built = dict(self._built)
+
+        for column, current in built.items():
+            if column in index._categorical:
+                extended = current.extend(GroupKey.from_series(index._categorical[column]), self.rows)
+            elif column in index._numeric:
+                extended = current.extend(index._numeric[column].to_numpy(), self.rows)
+            else:
+                extended = None
+            if extended is not None:
+                index._built[column] = extended
+        return index
+
+    def _conditions(self, row_filter: RowFilter) -> list:
+        """Условия фильтра: (индекс колонки, аргумент)"""
+        conditions = []
+        for column, values in row_filter.values.items():
+            if column not in self._categorical:
+                raise ValueError(f"Фильтр по значениям '{column}' не поддерживается. "
+                                 f"Доступны: {list(self._categorical)}")
+            conditions.append((self._index(column), values))
+        for column, bounds in row_filter.ranges.items():
+            if column not in self._numeric:
+                raise ValueError(f"Фильтр по диапазону '{column}' не поддерживается. "
+                                 f"Доступны: {list(self._numeric)}")
+            conditions.append((self._index(column), bounds))
+        return conditions
+
+    def lookup(self, row_filter: RowFilter, scan_fraction: float = ROW_INDEX_SCAN_FRACTION) -> np.ndarray:
+        """
+        Номера строк, удовлетворяющих фильтру (по возрастанию)
+
+        Args:
+            row_filter: Условия
+            scan_fraction: Доля строк, начиная с которой вместо индекса
+                проверяется маска по всем строкам
+
+        Returns:
+            np.ndarray: Номера строк int32 (пустой фильтр — все строки)
+        """
+        conditions = self._conditions(row_filter)
+        if not conditions:
+            return np.arange(self.rows, dtype=np.int32)
+
+        # Размер отрезка каждого условия известен без чтения строк
+        sized = [(index.candidates(argument), index, argument) for index, argument in conditions]
+        sized.sort(key=lambda item: item[0][0])
+        (size, rows), _, _ = sized[0]
+
+        if size > scan_fraction * self.rows:
+            mask = np.ones(self.rows, dtype=bool)
+            for _, index, argument in sized:
+                mask &= index.check(argument)
+            return np.flatnonzero(mask).astype(np.int32)
+
+        candidates = rows()
+        for _, index, argument in sized[1:]:
+            if not len(candidates):
+                break
+            candidates = candidates[index.check(argument, candidates)]
+        return candidates
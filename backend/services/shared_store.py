@@ -0,0 +1,386 @@
+"""
+Общее хранилище моделей для нескольких воркеров uvicorn
+
+Процесс, обучивший модели, публикует их массивы (коэффициенты линейной
+регрессии и «развёрнутые» деревья ансамблей) в data/shared/ как .npy
+файлы. Остальные воркеры открывают их через memory-map только для чтения,
+поэтому страницы памяти делятся между процессами средствами ОС, и
+потребление RAM не растёт с числом воркеров.
+
+Датасет делится тем же способом через бинарный кэш (см. dataset_cache.py).
+"""
+import json
+import logging
+import os
+import shutil
+import time
+import uuid
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+CURRENT_NAME = "CURRENT"
+META_NAME = "meta.json"
+
+# Недописанные папки старше этого возраста (с) остались от упавших процессов
+STALE_TMP_SECONDS = 3600
+
+# Массивы ансамбля деревьев, которые публикуются в хранилище.
+# Предсказание = baseline + scale * сумма листьев; float32 — сравнивать
+# признаки в float32 (как RandomForest) или в float64 (как HistGradientBoosting)
+FOREST_ARRAYS = ['roots', 'feature', 'threshold', 'left', 'right', 'value',
+                 'scale', 'baseline', 'float32']
+
+# Разделитель ключа модели и имени массива: linear_regression__coef.npy
+ARRAY_SEPARATOR = "__"
+
+
+def flatten_forest(forest) -> Dict[str, np.ndarray]:
+    """
+    Развернуть деревья RandomForestRegressor в плоские массивы
+
+    Узлы всех деревьев идут подряд; индексы потомков сдвинуты на начало
+    соответствующего дерева, у листьев left == right == -1.
+
+    Args:
+        forest: Обученный RandomForestRegressor
+
+    Returns:
+        Dict[str, np.ndarray]: roots, feature, threshold, left, right, value
+            и параметры агрегации scale, baseline, float32
+    """
+    roots, features, thresholds, lefts, rights, values = [], [], [], [], [], []
+    offset = 0
+
+    for estimator in forest.estimators_:
+        tree = estimator.tree_
+        left = tree.children_left.astype(np.int32)
+        right = tree.children_right.astype(np.int32)
+        is_leaf = left == -1
+
+        roots.append(offset)
+        features.append(np.where(is_leaf, 0, tree.feature).astype(np.int32))
+        thresholds.append(tree.threshold.astype(np.float64))
+        lefts.append(np.where(is_leaf, -1, left + offset).astype(np.int32))
+        rights.append(np.where(is_leaf, -1, right + offset).astype(np.int32))
+        values.append(tree.value.reshape(tree.node_count, -1)[:, 0].astype(np.float64))
+        offset += tree.node_count
+
+    return {
+        'roots': np.asarray(roots, dtype=np.int32),
+        'feature': np.concatenate(features),
+        'threshold': np.concatenate(thresholds),
+        'left': np.concatenate(lefts),
+        'right': np.concatenate(rights),
+        'value': np.concatenate(values),
+        'scale': np.asarray(1.0 / len(roots)),
+        'baseline': np.asarray(0.0),
+        'float32': np.asarray(True)
+    }
+
+
+def flatten_boosting(model) -> Dict[str, np.ndarray]:
+    """
+    Развернуть деревья HistGradientBoostingRegressor в те же плоские массивы
+
+    Значения листьев уже умножены на learning_rate, предсказание —
+    начальное значение плюс сумма листьев всех деревьев. Признаки
+    сравниваются в float64, переход влево при x <= num_threshold.
+
+    Args:
+        model: Обученный HistGradientBoostingRegressor
+
+    Returns:
+        Dict[str, np.ndarray]: Массивы в формате flatten_forest
+    """
+    roots, features, thresholds, lefts, rights, values = [], [], [], [], [], []
+    offset = 0
+
+    for iteration in model._predictors:
+        for predictor in iteration:
+            nodes = predictor.nodes
+            is_leaf = nodes['is_leaf'].astype(bool)
+            left = nodes['left'].astype(np.int32)
+            right = nodes['right'].astype(np.int32)
+
+            roots.append(offset)
+            features.append(np.where(is_leaf, 0, nodes['feature_idx']).astype(np.int32))
+            thresholds.append(nodes['num_threshold'].astype(np.float64))
+            lefts.append(np.where(is_leaf, -1, left + offset).astype(np.int32))
+            rights.append(np.where(is_leaf, -1, right + offset).astype(np.int32))
+            values.append(np.where(is_leaf, nodes['value'], 0.0).astype(np.float64))
+            offset += len(nodes)
+
+    return {
+        'roots': np.asarray(roots, dtype=np.int32),
+        'feature': np.concatenate(features),
+        'threshold': np.concatenate(thresholds),
+        'left': np.concatenate(lefts),
+        'right': np.concatenate(rights),
+        'value': np.concatenate(values),
+        'scale': np.asarray(1.0),
+        'baseline': np.asarray(float(np.ravel(model._baseline_prediction)[0])),
+        'float32': np.asarray(False)
+    }
+
+
+def predict_forest(arrays: Dict[str, np.ndarray], X: np.ndarray,
+                   chunk_size: int = 4096) -> np.ndarray:
+    """
+    Предсказание по развёрнутому ансамблю (векторизованный обход всех деревьев)
+
+    Сравнение идёт так же, как в sklearn: признаки приводятся к float32
+    (случайный лес) или остаются float64 (бустинг), переход влево при
+    x <= threshold.
+
+    Args:
+        arrays: Массивы из flatten_forest или flatten_boosting
+        X: Матрица признаков (n_samples, n_features)
+        chunk_size: Сколько строк обрабатывать за раз
+
+    Returns:
+        np.ndarray: Предсказания (n_samples,)
+    """
+    use_float32 = bool(arrays.get('float32', True))
+    X = np.ascontiguousarray(X, dtype=np.float32 if use_float32 else np.float64)
+    roots = np.asarray(arrays['roots'])
+    feature, threshold = arrays['feature'], arrays['threshold']
+    left, right, value = arrays['left'], arrays['right'], arrays['value']
+    n_trees = len(roots)
+
+    result = np.empty(len(X), dtype=np.float64)
+    for start in range(0, len(X), chunk_size):
+        block = X[start:start + chunk_size]
+        n = len(block)
+
+        # Одна «позиция» на каждую пару (дерево, строка)
+        node = np.repeat(roots, n)
+        rows = np.tile(np.arange(n), n_trees)
+
+        active = np.flatnonzero(left[node] != -1)
+        while active.size:
+            current = node[active]
+            go_left = block[rows[active], feature[current]] <= threshold[current]
+            node[active] = np.where(go_left, left[current], right[current])
+            active = active[left[node[active]] != -1]
+
+        result[start:start + n] = value[node].reshape(n_trees, n).sum(axis=0)
+
+    scale = float(arrays['scale']) if 'scale' in arrays else 1.0 / n_trees
+    baseline = float(arrays['baseline']) if 'baseline' in arrays else 0.0
+    return baseline + scale * result
+
+
+def model_group(arrays: Dict[str, np.ndarray], model_key: str) -> Dict[str, np.ndarray]:
+    """Массивы одной модели без префикса ключа"""
+    prefix = f"{model_key}{ARRAY_SEPARATOR}"
+    return {name[len(prefix):]: array for name, array in arrays.items() if name.startswith(prefix)}
+
+
+def predict_arrays(arrays: Dict[str, np.ndarray], model_key: str, X: np.ndarray) -> np.ndarray:
+    """
+    Предсказание моделью по её массивам
+
+    Тип модели определяется по составу массивов: coef/intercept —
+    линейная, roots/feature/... — ансамбль деревьев.
+    """
+    group = model_group(arrays, model_key)
+
+    if 'coef' in group:
+        return np.asarray(X, dtype=np.float64) @ group['coef'] + float(group['intercept'])
+
+    if 'roots' in group:
+        return predict_forest(group, X)
+
+    raise ValueError(f"Модель '{model_key}' не опубликована")
+
+
+def save_model_dir(target: Path, arrays: Dict[str, np.ndarray], meta: Dict):
+    """Записать массивы моделей и метаданные в папку версии"""
+    target.mkdir(parents=True, exist_ok=True)
+
+    for name, array in arrays.items():
+        np.save(target / f"{name}.npy", np.asarray(array))
+
+    with open(target / META_NAME, 'w', encoding='utf-8') as f:
+        json.dump(meta, f, ensure_ascii=False)
+
+
+def open_model_dir(source: Path, version: str) -> "SharedModels":
+    """
+    Открыть папку версии: массивы через memory-map только для чтения
+
+    Raises:
+        OSError, ValueError: Папка отсутствует или повреждена
+    """
+    with open(source / META_NAME, 'r', encoding='utf-8') as f:
+        meta = json.load(f)
+    arrays = {
+        _legacy_name(path.stem): np.load(path, mmap_mode='r')
+        for path in source.glob("*.npy")
+    }
+    if "best_model_key" not in meta:
+        meta["best_model_key"] = LEGACY_BEST_MODELS.get(meta.get("best_model"), "linear_regression")
+    return SharedModels(version, meta, arrays)
+
+
+# Версии, сохранённые до MODEL_BACKENDS: массивы lr_*/rf_* и только название лучшей модели
+LEGACY_PREFIXES = {"lr_": "linear_regression", "rf_": "random_forest"}
+LEGACY_BEST_MODELS = {"Linear Regression": "linear_regression", "Random Forest": "random_forest"}
+
+
+def _legacy_name(name: str) -> str:
+    if ARRAY_SEPARATOR in name:
+        return name
+    for prefix, model_key in LEGACY_PREFIXES.items():
+        if name.startswith(prefix):
+            return f"{model_key}{ARRAY_SEPARATOR}{name[len(prefix):]}"
+    return name
+
+
+class SharedModels:
+    """Опубликованные модели, открытые через memory-map"""
+
+    def __init__(self, version: str, meta: Dict, arrays: Dict[str, np.ndarray]):
+        self.version = version
+        self.meta = meta
+        self.arrays = arrays
+
+    @property
+    def feature_names(self) -> list:
+        return self.meta["feature_names"]
+
+    def predict(self, model: str, X: np.ndarray) -> np.ndarray:
+        """
+        Предсказание опубликованной моделью
+
+        Args:
+            model: Ключ модели из MODEL_BACKENDS
+            X: Матрица признаков в порядке feature_names
+        """
+        return predict_arrays(self.arrays, model, X)
+
+
+class SharedModelStore:
+    """Хранилище опубликованных моделей в data/shared/"""
+
+    def __init__(self, directory: Path, keep: int = 3):
+        self.directory = Path(directory)
+        # Сколько последних версий хранить: воркер может ещё читать
+        # предыдущую, пока не переключился на новую
+        self.keep = max(1, keep)
+
+    def current_version(self) -> Optional[str]:
+        """Версия последних опубликованных моделей (или None)"""
+        try:
+            return (self.directory / CURRENT_NAME).read_text(encoding='utf-8').strip() or None
+        except OSError:
+            return None
+
+    def current_stamp(self) -> Optional[Tuple[int, int]]:
+        """
+        Отметка файла CURRENT: (inode, mtime в нс) или None
+
+        CURRENT подменяется через os.replace, поэтому новая публикация
+        меняет отметку — файл перечитывается только тогда.
+        """
+        try:
+            stat = (self.directory / CURRENT_NAME).stat()
+        except OSError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns
+
+    def current_meta(self) -> Optional[Dict]:
+        """Метаданные текущей опубликованной версии (или None)"""
+        version = self.current_version()
+        if version is None:
+            return None
+
+        try:
+            with open(self.directory / version / META_NAME, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def publish(self, arrays: Dict[str, np.ndarray], meta: Dict) -> str:
+        """
+        Опубликовать развёрнутые массивы моделей для всех воркеров
+
+        Args:
+            arrays: Массивы из model_backends.export_arrays
+            meta: Метаданные (feature_names, metrics, best_model, best_model_key)
+
+        Returns:
+            str: Версия публикации
+        """
+        token = uuid.uuid4().hex[:12]
+        version = f"{time.strftime('%Y%m%d-%H%M%S')}-{token}"
+
+        # Папка пишется во временное место и переименовывается целиком,
+        # как в ModelRegistry.register: другие процессы не видят её частично
+        tmp = self.directory / f".tmp-{token}"
+        save_model_dir(tmp, arrays, meta)
+        os.replace(tmp, self.directory / version)
+
+        # Атомарно переключаем указатель на новую версию
+        pointer_tmp = self.directory / f"{CURRENT_NAME}.tmp-{token}"
+        pointer_tmp.write_text(version, encoding='utf-8')
+        os.replace(pointer_tmp, self.directory / CURRENT_NAME)
+
+        self._cleanup()
+        logger.info(f"✓ Модели опубликованы в общее хранилище: {version}")
+        return version
+
+    def attach(self, version: Optional[str] = None) -> Optional[SharedModels]:
+        """
+        Открыть опубликованные модели только для чтения
+
+        Args:
+            version: Версия (по умолчанию — текущая)
+
+        Returns:
+            Optional[SharedModels]: Модели или None, если ничего не опубликовано
+        """
+        version = version or self.current_version()
+        if version is None:
+            return None
+
+        try:
+            return open_model_dir(self.directory / version, version)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Не удалось открыть опубликованные модели {version}: {e}")
+            return None
+
+    def _cleanup(self):
+        """
+        Удалить старые версии, кроме self.keep последних
+
+        Версия, на которую указывает CURRENT, не удаляется никогда (её могла
+        только что опубликовать другая копия процесса). Временные папки
+        публикаций, идущих в других процессах, не трогаются. На Linux/macOS
+        уже открытые через mmap файлы остаются доступны воркерам до
+        переключения на новую версию.
+        """
+        versions, now = [], time.time()
+        for path in self.directory.iterdir():
+            if not path.is_dir():
+                continue
+            try:
+                modified = path.stat().st_mtime
+            except OSError:
+                continue
+            if path.name.startswith("."):
+                if now - modified > STALE_TMP_SECONDS:
+                    shutil.rmtree(path, ignore_errors=True)
+                continue
+            versions.append((modified, path))
+
+        # Указатель читается после переключения: это последняя публикация любого процесса
+        current = self.current_version()
+        versions.sort(key=lambda item: (item[0], item[1].name))
+        for _, path in versions[:-self.keep]:
+            if path.name != current:
+                shutil.rmtree(path, ignore_errors=True)
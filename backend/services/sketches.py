@@ -0,0 +1,325 @@
+"""
+Сливаемые сводки распределений (для данных больше оперативной памяти)
+
+Сводка строится по порции строк (части партиции, куску CSV) и сливается
+с другими сводками без повторного чтения данных: части считаются
+параллельно, а новые строки добавляются к готовой сводке.
+
+- MomentSketch — число значений, среднее и центральные суммы степеней
+  2–4, минимум и максимум. Слияние по формулам Чана/Пебая точное:
+  результат совпадает с расчётом по всем строкам до ошибки округления
+  (относительно ~1e-12), поэтому mean, std, skew и kurtosis точные.
+- KLLSketch — квантили по сводке KLL (Karnin, Lang, Liberty, 2016):
+  уровни сжатия с весами 2^h, при переполнении уровень сортируется и
+  каждый второй элемент со случайным сдвигом уходит на уровень выше.
+  Память — O(k) значений на колонку при любом числе строк.
+
+Точность квантилей: ошибка ранга (доля строк между точным и найденным
+значением) не превышает KLL_RANK_ERROR ≈ 1.7% с вероятностью 99% при
+k = 200 (оценка для KLL с параметром k, как в Apache DataSketches).
+Пока строк не больше k, квантили точные и совпадают с Series.quantile.
+Проверка на датасете — scripts/check_sketches.py.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from backend.config import SKETCH_K, SKETCH_WORKERS
+from backend.services.stats_kernel import (
+    DEFAULT_QUANTILES, central_moments, moment_statistics, numeric_block,
+    quantile_name, value_range
+)
+
+# Ошибка ранга квантилей при k = 200 с вероятностью 99%
+KLL_RANK_ERROR = 0.017
+
+
+class MomentSketch:
+    """Моменты колонок блока; сливается точно (формулы Чана/Пебая)"""
+
+    FIELDS = ('n', 'mean', 'm2', 'm3', 'm4', 'min', 'max')
+
+    def __init__(self, n_columns: int):
+        self.n = np.zeros(n_columns)
+        self.mean = np.zeros(n_columns)
+        self.m2 = np.zeros(n_columns)
+        self.m3 = np.zeros(n_columns)
+        self.m4 = np.zeros(n_columns)
+        self.min = np.full(n_columns, np.nan)
+        self.max = np.full(n_columns, np.nan)
+
+    @classmethod
+    def from_block(cls, block: np.ndarray) -> "MomentSketch":
+        """Сводка по блоку строки × колонки (NaN пропускаются)"""
+        sketch = cls(block.shape[1])
+        counts, mean, m2, m3, m4 = central_moments(block)
+        sketch.n = counts.astype(np.float64)
+        sketch.mean = np.where(counts > 0, mean, 0.0)
+        sketch.m2, sketch.m3, sketch.m4 = m2, m3, m4
+        sketch.min, sketch.max = value_range(block)
+        return sketch
+
+    def merge(self, other: "MomentSketch") -> "MomentSketch":
+        """Добавить другую сводку (на месте)"""
+        na, nb = self.n, other.n
+        n = na + nb
+        delta = other.mean - self.mean
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            ratio_a = np.where(n > 0, na / n, 0.0)
+            ratio_b = np.where(n > 0, nb / n, 0.0)
+            mean = self.mean + delta * ratio_b
+            m2 = self.m2 + other.m2 + delta ** 2 * na * ratio_b
+            m3 = (self.m3 + other.m3
+                  + delta ** 3 * na * ratio_b * (ratio_a - ratio_b)
+                  + 3 * delta * (ratio_a * other.m2 - ratio_b * self.m2))
+            m4 = (self.m4 + other.m4
+                  + delta ** 4 * na * ratio_b * (ratio_a ** 2 - ratio_a * ratio_b + ratio_b ** 2)
+                  + 6 * delta ** 2 * (ratio_a ** 2 * other.m2 + ratio_b ** 2 * self.m2)
+                  + 4 * delta * (ratio_a * other.m3 - ratio_b * self.m3))
+
+        self.n, self.mean, self.m2, self.m3, self.m4 = n, mean, m2, m3, m4
+        self.min = np.fmin(self.min, other.min)
+        self.max = np.fmax(self.max, other.max)
+        return self
+
+    def statistics(self) -> Dict[str, np.ndarray]:
+        std, skewness, kurtosis = moment_statistics(self.n, self.m2, self.m3, self.m4)
+        return {
+            "count": self.n.astype(np.int64),
+            "mean": np.where(self.n > 0, self.mean, np.nan),
+            "std": std,
+            "min": self.min,
+            "max": self.max,
+            "skewness": skewness,
+            "kurtosis": kurtosis
+        }
+
+    def to_arrays(self) -> Dict[str, np.ndarray]:
+        return {field: getattr(self, field) for field in self.FIELDS}
+
+    @classmethod
+    def from_arrays(cls, arrays: Dict[str, np.ndarray]) -> "MomentSketch":
+        sketch = cls(len(arrays['n']))
+        for field in cls.FIELDS:
+            setattr(sketch, field, np.asarray(arrays[field], dtype=np.float64))
+        return sketch
+
+
+class KLLSketch:
+    """Сводка квантилей одной колонки (KLL)"""
+
+    # Уменьшение ёмкости каждого следующего уровня вниз от верхнего
+    CAPACITY_DECAY = 2 / 3
+
+    def __init__(self, k: int = SKETCH_K, seed=None):
+        self.k = k
+        self.n = 0
+        self.levels: List[np.ndarray] = [np.empty(0)]
+        self._rng = np.random.default_rng(seed)
+
+    def _capacity(self, level: int) -> int:
+        depth = len(self.levels) - level - 1
+        return max(2, int(np.ceil(self.k * self.CAPACITY_DECAY ** depth)))
+
+    def _compress(self):
+        """Сжимать нижний переполненный уровень, пока сводка не уложится в ёмкость"""
+        while sum(len(items) for items in self.levels) > \
+                sum(self._capacity(h) for h in range(len(self.levels))):
+            level = next(h for h in range(len(self.levels)) if len(self.levels[h]) >= self._capacity(h))
+            if level + 1 == len(self.levels):
+                self.levels.append(np.empty(0))
+
+            items = np.sort(self.levels[level])
+            # При нечётном числе элементов один остаётся на уровне: вес сохраняется
+            kept, items = items[:len(items) % 2], items[len(items) % 2:]
+            promoted = items[self._rng.integers(2)::2]
+            self.levels[level + 1] = np.concatenate([self.levels[level + 1], promoted])
+            self.levels[level] = kept
+
+    def update(self, values: np.ndarray) -> "KLLSketch":
+        """Добавить значения (NaN пропускаются)"""
+        values = np.asarray(values, dtype=np.float64)
+        values = values[~np.isnan(values)]
+        if len(values):
+            self.levels[0] = np.concatenate([self.levels[0], values])
+            self.n += len(values)
+            self._compress()
+        return self
+
+    def merge(self, other: "KLLSketch") -> "KLLSketch":
+        """Добавить другую сводку (на месте)"""
+        while len(self.levels) < len(other.levels):
+            self.levels.append(np.empty(0))
+        for level, items in enumerate(other.levels):
+            self.levels[level] = np.concatenate([self.levels[level], items])
+        self.n += other.n
+        self._compress()
+        return self
+
+    def _weighted(self):
+        """Значения по возрастанию и их веса"""
+        items = np.concatenate(self.levels)
+        weights = np.concatenate([
+            np.full(len(level), 2.0 ** h) for h, level in enumerate(self.levels)
+        ])
+        order = np.argsort(items, kind='stable')
+        return items[order], weights[order]
+
+    def quantiles(self, fractions: Sequence[float]) -> np.ndarray:
+        """
+        Квантили с линейной интерполяцией
+
+        Элемент веса w заменяет w соседних строк; его позиция — середина
+        этого диапазона рангов. Пока сжатий не было (все веса 1), результат
+        совпадает с Series.quantile.
+        """
+        if self.n == 0:
+            return np.full(len(fractions), np.nan)
+        items, weights = self._weighted()
+        positions = np.cumsum(weights) - (weights + 1) / 2
+        return np.interp(np.asarray(fractions, dtype=np.float64) * (self.n - 1), positions, items)
+
+    def rank(self, value: float) -> float:
+        """Оценка доли значений не больше value"""
+        if self.n == 0:
+            return np.nan
+        items, weights = self._weighted()
+        return float(weights[:np.searchsorted(items, value, side='right')].sum() / self.n)
+
+    def to_arrays(self) -> Dict[str, np.ndarray]:
+        return {
+            "items": np.concatenate(self.levels),
+            "sizes": np.array([len(level) for level in self.levels]),
+            "info": np.array([self.k, self.n])
+        }
+
+    @classmethod
+    def from_arrays(cls, arrays: Dict[str, np.ndarray], seed=None) -> "KLLSketch":
+        k, n = (int(value) for value in arrays["info"])
+        sketch = cls(k, seed)
+        sketch.n = n
+        sketch.levels = np.split(np.asarray(arrays["items"], dtype=np.float64),
+                                 np.cumsum(arrays["sizes"])[:-1])
+        return sketch
+
+
+class DistributionSketch:
+    """
+    Сводка распределений нескольких колонок: моменты + квантили KLL
+
+    Пример:
+        sketch = DistributionSketch.from_frame(chunk, ['tempo', 'loudness'])
+        sketch.merge(DistributionSketch.from_frame(next_chunk, ['tempo', 'loudness']))
+        sketch.statistics()  # {колонка: {count, mean, std, ..., q25, q50, q75}}
+    """
+
+    def __init__(self, columns: List[str], k: int = SKETCH_K, seed=None):
+        self.columns = list(columns)
+        self.k = k
+        self.moments = MomentSketch(len(self.columns))
+        self.quantile_sketches = [KLLSketch(k, seed) for _ in self.columns]
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame, columns: List[str],
+                   k: int = SKETCH_K, seed=None) -> "DistributionSketch":
+        """Сводка по порции строк"""
+        sketch = cls(columns, k, seed)
+        block = numeric_block(df, sketch.columns)
+        sketch.moments = MomentSketch.from_block(block)
+        for j, quantile_sketch in enumerate(sketch.quantile_sketches):
+            quantile_sketch.update(block[:, j])
+        return sketch
+
+    def update(self, df: pd.DataFrame) -> "DistributionSketch":
+        """Добавить новые строки (на месте)"""
+        return self.merge(DistributionSketch.from_frame(df, self.columns, self.k))
+
+    def merge(self, other: "DistributionSketch") -> "DistributionSketch":
+        """Слить с другой сводкой тех же колонок (на месте)"""
+        if other.columns != self.columns:
+            raise ValueError(f"Сводки по разным колонкам: {self.columns} и {other.columns}")
+        self.moments.merge(other.moments)
+        for mine, theirs in zip(self.quantile_sketches, other.quantile_sketches):
+            mine.merge(theirs)
+        return self
+
+    def select(self, columns: List[str]) -> "DistributionSketch":
+        """Сводка по части колонок"""
+        missing = [column for column in columns if column not in self.columns]
+        if missing:
+            raise ValueError(f"В сводке нет колонок: {missing}")
+        index = [self.columns.index(column) for column in columns]
+        arrays = self.moments.to_arrays()
+
+        sketch = DistributionSketch(columns, self.k)
+        sketch.moments = MomentSketch.from_arrays({field: values[index] for field, values in arrays.items()})
+        sketch.quantile_sketches = [self.quantile_sketches[j] for j in index]
+        return sketch
+
+    def statistics(self, quantiles: Sequence[float] = DEFAULT_QUANTILES) -> Dict[str, Dict[str, float]]:
+        """Статистика колонок в формате stats_kernel.describe"""
+        stats = self.moments.statistics()
+        for i, q in enumerate(quantiles):
+            stats[quantile_name(q)] = np.array([
+                quantile_sketch.quantiles([q])[0] for quantile_sketch in self.quantile_sketches
+            ])
+        return {
+            column: {
+                name: int(values[j]) if name == "count" else float(values[j])
+                for name, values in stats.items()
+            }
+            for j, column in enumerate(self.columns)
+        }
+
+    def save(self, path: Path):
+        arrays = {"columns": np.array(self.columns), "k": np.array(self.k)}
+        arrays.update({f"moments_{name}": values for name, values in self.moments.to_arrays().items()})
+        for j, quantile_sketch in enumerate(self.quantile_sketches):
+            arrays.update({f"kll{j}_{name}": values for name, values in quantile_sketch.to_arrays().items()})
+        np.savez(path, **arrays)
+
+    @classmethod
+    def load(cls, path: Path, seed=None) -> "DistributionSketch":
+        with np.load(path, allow_pickle=False) as arrays:
+            sketch = cls([str(column) for column in arrays["columns"]], int(arrays["k"]), seed)
+            sketch.moments = MomentSketch.from_arrays({
+                field: arrays[f"moments_{field}"] for field in MomentSketch.FIELDS
+            })
+            sketch.quantile_sketches = [
+                KLLSketch.from_arrays({name: arrays[f"kll{j}_{name}"] for name in ("items", "sizes", "info")}, seed)
+                for j in range(len(sketch.columns))
+            ]
+        return sketch
+
+
+def sketch_frames(frames: Iterable[pd.DataFrame], columns: List[str],
+                  k: int = SKETCH_K, workers: int = SKETCH_WORKERS,
+                  seed: Optional[int] = 0) -> DistributionSketch:
+    """
+    Сводка по последовательности порций: порции сводятся параллельно
+    (потоки — сортировка и суммы NumPy отпускают GIL) и сливаются
+
+    Args:
+        frames: Порции строк (например, PartitionedDataset.iter_frames)
+        columns: Числовые колонки
+        k: Параметр точности KLL
+        workers: Число потоков
+        seed: Зерно сдвигов сжатия (порция i получает зерно (seed, i))
+
+    Returns:
+        DistributionSketch: Сводка по всем порциям
+    """
+    def build(item):
+        index, frame = item
+        chunk_seed = None if seed is None else (seed, index)
+        return DistributionSketch.from_frame(frame, columns, k, chunk_seed)
+
+    result = DistributionSketch(columns, k, seed)
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        for sketch in pool.map(build, enumerate(frames)):
+            result.merge(sketch)
+    return result
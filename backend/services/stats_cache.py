@@ -0,0 +1,122 @@
+"""
+Кэш результатов статистического анализа
+
+Результаты /analysis/* зависят только от датасета, поэтому они хранятся
+в памяти и на диске (data/cache/analysis/<версия>.json) под токеном версии
+датасета. Когда DataService загружает другой датасет, токен меняется,
+и кэш начинает заполняться заново.
+"""
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class StatsCache:
+    """Кэш вычисленных статистик, привязанный к версии датасета"""
+
+    def __init__(self, directory: Path, persist: bool = True, max_transient: int = 128):
+        self.directory = Path(directory)
+        self.persist = persist
+        self.max_transient = max_transient
+        self._version: Optional[str] = None
+        self._entries: Dict[str, Any] = {}
+        # Результаты с параметрами из запроса: только в памяти, LRU
+        self._transient: "OrderedDict[str, Any]" = OrderedDict()
+        self._lock = threading.RLock()
+
+    @staticmethod
+    def make_key(name: str, params: Optional[Dict] = None) -> str:
+        """Ключ записи: имя анализа + его параметры"""
+        if not params:
+            return name
+        return f"{name}:{json.dumps(params, sort_keys=True, ensure_ascii=False, default=str)}"
+
+    def _path(self, version: str) -> Path:
+        return self.directory / f"{version}.json"
+
+    def _switch(self, version: str):
+        """Перейти на другую версию датасета, подняв сохранённый кэш с диска"""
+        self._version = version
+        self._entries = {}
+        self._transient.clear()
+
+        if not self.persist:
+            return
+
+        path = self._path(version)
+        if path.exists():
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    self._entries = json.load(f)
+                logger.info(f"✓ Кэш статистик загружен с диска: {len(self._entries)} записей")
+            except (OSError, ValueError) as e:
+                logger.warning(f"Не удалось прочитать кэш статистик {path}: {e}")
+
+    def _save(self):
+        if not self.persist or self._version is None:
+            return
+
+        try:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            path = self._path(self._version)
+            tmp_path = path.with_name(f"{path.name}.tmp-{os.getpid()}")
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self._entries, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+        except (OSError, TypeError, ValueError) as e:
+            logger.warning(f"Не удалось сохранить кэш статистик: {e}")
+
+    def get_or_compute(self, version: str, key: str, compute: Callable[[], Any],
+                       persist: bool = True) -> Any:
+        """
+        Вернуть результат из кэша или вычислить и запомнить его
+
+        Args:
+            version: Токен версии датасета
+            key: Ключ записи (см. make_key)
+            compute: Функция, вычисляющая результат
+            persist: Сохранить запись в файл версии. Результаты с параметрами
+                из запроса (жанры, ключи группировки, признаки) передают False:
+                их сочетаний неограниченно много, а файл переписывается
+                целиком при каждой новой записи. Такие записи держатся в LRU
+                на max_transient элементов
+
+        Returns:
+            Any: Результат (JSON-совместимый)
+        """
+        with self._lock:
+            if version != self._version:
+                self._switch(version)
+
+            if key in self._entries:
+                return self._entries[key]
+            if key in self._transient:
+                self._transient.move_to_end(key)
+                return self._transient[key]
+
+        value = compute()
+
+        with self._lock:
+            if version == self._version:
+                if persist:
+                    self._entries[key] = value
+                    self._save()
+                else:
+                    self._transient[key] = value
+                    while len(self._transient) > self.max_transient:
+                        self._transient.popitem(last=False)
+
+        return value
+
+    def clear(self):
+        """Очистить кэш в памяти"""
+        with self._lock:
+            self._version = None
+            self._entries = {}
+            self._transient.clear()
@@ -0,0 +1,222 @@
+"""
+Описательная статистика колонок за один векторизованный проход
+
+Колонки собираются в один 2D-блок NumPy (строки × колонки, float64), и все
+моменты считаются сразу для всех колонок операциями по оси 0:
+число значений, среднее, центральные суммы 2–4 степени (отсюда std,
+асимметрия и эксцесс), минимум и максимум. Квантили выбираются
+частичным упорядочиванием (np.partition) каждой колонки — без полной
+сортировки.
+
+Формулы совпадают с pandas: std с ddof=1, skew и kurtosis — несмещённые
+оценки (как Series.skew / Series.kurtosis), квантили — линейная
+интерполяция (как Series.quantile). Пропуски (NaN) не учитываются.
+"""
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+# Квантили по умолчанию
+DEFAULT_QUANTILES = (0.25, 0.5, 0.75)
+
+
+def numeric_block(df: pd.DataFrame, columns: List[str]) -> np.ndarray:
+    """
+    Колонки датафрейма одним блоком float64 (строки × колонки)
+
+    Блок в порядке Fortran: каждая колонка лежит в памяти подряд, и
+    редукции по оси 0 и выборка квантилей идут по непрерывным участкам.
+    """
+    block = np.empty((len(df), len(columns)), dtype=np.float64, order='F')
+    for j, column in enumerate(columns):
+        block[:, j] = df[column].to_numpy(dtype=np.float64, na_value=np.nan)
+    return block
+
+
+def _select(values: np.ndarray, kth: List[int]) -> Dict[int, float]:
+    """
+    Порядковые статистики kth (по возрастанию) одного массива
+
+    Массив частично упорядочивается на месте: после разбиения по средней
+    из позиций каждая следующая ищется только в своей половине, а
+    позиция на краю отрезка — это его минимум или максимум. Так выходит
+    около двух проходов по колонке вместо одного на каждую позицию, как
+    у np.partition со списком kth.
+    """
+    found = {}
+    stack = [(0, len(values), kth)]
+    while stack:
+        lo, hi, positions = stack.pop()
+        if not positions:
+            continue
+        segment = values[lo:hi]
+        if positions == [lo]:
+            found[lo] = segment.min()
+            continue
+        if positions == [hi - 1]:
+            found[hi - 1] = segment.max()
+            continue
+
+        middle = positions[len(positions) // 2]
+        segment.partition(middle - lo)
+        found[middle] = values[middle]
+        stack.append((lo, middle, [k for k in positions if k < middle]))
+        stack.append((middle + 1, hi, [k for k in positions if k > middle]))
+    return found
+
+
+def column_quantiles(values: np.ndarray, quantiles: Sequence[float]) -> np.ndarray:
+    """
+    Квантили одного массива без NaN (линейная интерполяция, как в pandas)
+
+    Массив переставляется на месте — передавайте копию.
+    """
+    count = len(values)
+    if count == 0:
+        return np.full(len(quantiles), np.nan)
+
+    positions = np.asarray(quantiles, dtype=np.float64) * (count - 1)
+    lower = np.floor(positions).astype(np.intp)
+    upper = np.minimum(lower + 1, count - 1)
+    found = _select(values, sorted(set(lower.tolist()) | set(upper.tolist())))
+
+    low = np.array([found[k] for k in lower])
+    high = np.array([found[k] for k in upper])
+    return low + (high - low) * (positions - lower)
+
+
+def _order_statistics(block: np.ndarray, counts: np.ndarray,
+                      quantiles: Sequence[float]) -> np.ndarray:
+    """Квантили каждой колонки (строки результата — по одной на квантиль)"""
+    result = np.full((len(quantiles), block.shape[1]), np.nan)
+
+    for j in range(block.shape[1]):
+        column = block[:, j]
+        # Копия: выборка переставляет значения на месте
+        values = column.copy() if counts[j] == len(column) else column[~np.isnan(column)]
+        result[:, j] = column_quantiles(values, quantiles)
+    return result
+
+
+def central_moments(block: np.ndarray) -> Tuple[np.ndarray, ...]:
+    """
+    Число значений, среднее и центральные суммы степеней 2–4 по колонкам
+
+    Returns:
+        Tuple: (count, mean, m2, m3, m4), где m_p — сумма (x - mean)^p
+    """
+    missing = np.isnan(block)
+    has_missing = missing.any(axis=0)
+    counts = block.shape[0] - missing.sum(axis=0)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        if has_missing.any():
+            mean = np.where(missing, 0.0, block).sum(axis=0) / counts
+            centered = np.where(missing, 0.0, block - mean)
+        else:
+            mean = block.sum(axis=0) / counts
+            centered = block - mean
+
+    # Второй проход по блоку нужен для точности: суммы от среднего, а не от нуля
+    squared = centered * centered
+    m2 = squared.sum(axis=0)
+    m3 = (squared * centered).sum(axis=0)
+    m4 = (squared * squared).sum(axis=0)
+    return counts, mean, m2, m3, m4
+
+
+def moment_statistics(counts: np.ndarray, m2: np.ndarray, m3: np.ndarray,
+                      m4: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    std, асимметрия и эксцесс по центральным суммам — как в pandas
+
+    Returns:
+        Tuple: (std с ddof=1, несмещённая асимметрия, несмещённый эксцесс)
+    """
+    n = np.asarray(counts, dtype=np.float64)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        std = np.sqrt(m2 / (n - 1))
+        std[n < 2] = np.nan
+
+        skewness = n * np.sqrt(n - 1) / (n - 2) * m3 / m2 ** 1.5
+        skewness[m2 == 0] = 0.0
+        skewness[n < 3] = np.nan
+
+        adjust = 3 * (n - 1) ** 2 / ((n - 2) * (n - 3))
+        denominator = (n - 2) * (n - 3) * m2 ** 2
+        kurtosis = n * (n + 1) * (n - 1) * m4 / denominator - adjust
+        kurtosis[denominator == 0] = 0.0
+        kurtosis[n < 4] = np.nan
+
+    return std, skewness, kurtosis
+
+
+def describe_block(block: np.ndarray,
+                   quantiles: Sequence[float] = DEFAULT_QUANTILES) -> Dict[str, np.ndarray]:
+    """
+    Все моменты и квантили для каждой колонки блока
+
+    Args:
+        block: Массив строки × колонки
+        quantiles: Доли 0..1
+
+    Returns:
+        Dict[str, np.ndarray]: count, mean, std, min, max, skewness,
+        kurtosis и q<процент> (q25, q50, q75) — массивы по колонкам
+    """
+    block = np.asarray(block, dtype=np.float64)
+    if block.ndim == 1:
+        block = block[:, None]
+    if not block.flags.f_contiguous:
+        block = np.asfortranarray(block)
+
+    counts, mean, m2, m3, m4 = central_moments(block)
+    std, skewness, kurtosis = moment_statistics(counts, m2, m3, m4)
+    minimum, maximum = value_range(block)
+    order = _order_statistics(block, counts, quantiles)
+
+    result = {
+        "count": counts,
+        "mean": mean,
+        "std": std,
+        "min": minimum,
+        "max": maximum,
+        "skewness": skewness,
+        "kurtosis": kurtosis
+    }
+    for i, q in enumerate(quantiles):
+        result[quantile_name(q)] = order[i]
+    return result
+
+
+def value_range(block: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Минимум и максимум колонок без учёта NaN (колонка из одних NaN даёт NaN)"""
+    if not block.shape[0]:
+        empty = np.full(block.shape[1], np.nan)
+        return empty, empty.copy()
+    return np.fmin.reduce(block, axis=0), np.fmax.reduce(block, axis=0)
+
+
+def quantile_name(q: float) -> str:
+    """Имя метрики квантиля: 0.25 → 'q25'"""
+    return f"q{round(q * 100):g}"
+
+
+def describe(df: pd.DataFrame, columns: List[str],
+             quantiles: Sequence[float] = DEFAULT_QUANTILES) -> Dict[str, Dict[str, float]]:
+    """
+    Статистика числовых колонок датафрейма
+
+    Returns:
+        Dict[str, Dict[str, float]]: {колонка: {метрика: значение}}
+    """
+    stats = describe_block(numeric_block(df, columns), quantiles)
+    return {
+        column: {
+            name: int(values[j]) if name == "count" else float(values[j])
+            for name, values in stats.items()
+        }
+        for j, column in enumerate(columns)
+    }
@@ -0,0 +1,115 @@
+"""
+Чтение CSV, Parquet и папки партиций порциями строк
+
+Файл целиком в память не загружается: в каждый момент времени в памяти
+одна порция (STREAM_CHUNK_SIZE строк) нужных колонок. Типы колонок
+приводятся к DATASET_SCHEMA, как при обычной загрузке датасета.
+Папка партиций (partition_store.py) читается по частям.
+"""
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+import pandas as pd
+
+from backend.config import DATASET_SCHEMA, STREAM_CHUNK_SIZE
+
+# Поддерживаемые форматы источников
+SOURCE_FORMATS = {'.csv': 'csv', '.parquet': 'parquet', '.pq': 'parquet'}
+
+
+class SourceReader:
+    """
+    Итератор по порциям DataFrame из CSV, Parquet или папки партиций
+
+    Пример:
+        reader = SourceReader(path, columns=['energy', 'popularity'])
+        for frame in reader:
+            ...
+            print(reader.progress)  # доля прочитанного файла 0..1
+    """
+
+    def __init__(self, path: Path, columns: Optional[List[str]] = None,
+                 chunk_size: int = STREAM_CHUNK_SIZE,
+                 schema: Optional[Dict[str, str]] = None):
+        self.path = Path(path)
+        self.columns = columns
+        self.chunk_size = chunk_size
+        self.schema = DATASET_SCHEMA if schema is None else schema
+        if not self.path.exists():
+            raise FileNotFoundError(self.path)
+
+        if self.path.is_dir():
+            self.format = 'partitions'
+        else:
+            self.format = SOURCE_FORMATS.get(self.path.suffix.lower())
+        if self.format is None:
+            raise ValueError(
+                f"Неподдерживаемый формат '{self.path.suffix}'. "
+                f"Доступны: {', '.join(SOURCE_FORMATS)} или папка партиций"
+            )
+
+        self.rows = 0
+        self.chunks = 0
+        self.progress = 0.0
+
+    def _dtypes(self, names) -> Dict[str, str]:
+        return {name: dtype for name, dtype in self.schema.items() if name in names}
+
+    def _csv_frames(self) -> Iterator[pd.DataFrame]:
+        size = max(self.path.stat().st_size, 1)
+        usecols = (lambda name: name in self.columns) if self.columns else None
+        dtype = self._dtypes(self.columns) if self.columns else self.schema
+
+        with open(self.path, 'rb') as f:
+            for frame in pd.read_csv(f, chunksize=self.chunk_size, usecols=usecols, dtype=dtype):
+                # Позиция в файле — с точностью до буфера разбора
+                self.progress = min(f.tell() / size, 1.0)
+                yield frame
+
+    def _parquet_frames(self) -> Iterator[pd.DataFrame]:
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ValueError("Для Parquet нужен пакет pyarrow (pip install pyarrow)")
+
+        parquet = pq.ParquetFile(self.path)
+        total = max(parquet.metadata.num_rows, 1)
+        names = [name for name in self.columns if name in parquet.schema_arrow.names] \
+            if self.columns else None
+        read = 0
+
+        for batch in parquet.iter_batches(batch_size=self.chunk_size, columns=names):
+            frame = batch.to_pandas()
+            frame = frame.astype(self._dtypes(frame.columns))
+            read += len(frame)
+            self.progress = read / total
+            yield frame
+
+    def _partition_frames(self) -> Iterator[pd.DataFrame]:
+        # Импорт здесь: partition_store сам читает источники через SourceReader
+        from backend.services.partition_store import PartitionedDataset
+
+        dataset = PartitionedDataset(self.path)
+        total = max(dataset.rows, 1)
+        read = 0
+
+        for frame in dataset.iter_frames(self.columns):
+            read += len(frame)
+            self.progress = read / total
+            yield frame
+
+    def __iter__(self) -> Iterator[pd.DataFrame]:
+        frames = {
+            'csv': self._csv_frames,
+            'parquet': self._parquet_frames,
+            'partitions': self._partition_frames
+        }[self.format]()
+        for frame in frames:
+            if self.chunks == 0 and self.columns:
+                missing = [name for name in self.columns if name not in frame.columns]
+                if missing:
+                    raise ValueError(f"В источнике нет колонок: {missing}")
+            self.rows += len(frame)
+            self.chunks += 1
+            yield frame
+        self.progress = 1.0
@@ -0,0 +1,424 @@
+"""
+Параллельное обучение моделей и кросс-валидация
+
+Задача обучения раскладывается на независимые части: для каждой модели —
+k фолдов кросс-валидации и итоговое обучение на всей обучающей выборке.
+Все части выполняются одновременно в пуле процессов (spawn). Тот же пул
+выполняет пробы подбора гиперпараметров (см. tuning_service.py).
+
+Матрица признаков не передаётся процессам через pickle: она один раз
+записывается в .npy в TRAINING_DATA_DIR, и каждый процесс открывает её
+через memory-map, поэтому страницы памяти общие для всех процессов.
+Разбиение на фолды детерминировано (KFold с random_state), каждый процесс
+вычисляет индексы своего фолда сам.
+
+При TRAINING_PROCESSES = 0 те же части выполняются по очереди в текущем
+процессе.
+
+Случайный лес в обоих режимах обучается порциями деревьев (warm_start):
+после каждой порции часть сообщает прогресс и проверяет отмену. Процессы
+пула передают шаги через очередь multiprocessing.Manager и читают флаг
+отмены оттуда же. Остальные модели и пробы подбора обучаются одним вызовом
+fit: при отмене уже запущенная часть дорабатывает в своём процессе, а её
+результат отбрасывается.
+"""
+import logging
+import multiprocessing
+import queue
+import shutil
+import threading
+import time
+import tracemalloc
+import uuid
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional
+
+import numpy as np
+from sklearn.metrics import r2_score, mean_squared_error, mean_absolute_error
+from sklearn.model_selection import KFold
+
+from backend.config import (
+    CV_FOLDS, TRAINING_PROCESSES, TRAINING_DATA_DIR, RANDOM_STATE, RF_PROGRESS_STEP
+)
+from backend.services.job_service import JobCancelled
+from backend.services.model_backends import ModelBackend, get_backend, model_size_bytes
+
+logger = logging.getLogger(__name__)
+
+# Метрики фолда, которые усредняются по кросс-валидации
+CV_METRICS = ["r2_score", "rmse", "mae", "fit_time_s"]
+
+
+def fit_estimator(backend: ModelBackend, X, y, params: Optional[Dict] = None,
+                  n_jobs: Optional[int] = None,
+                  on_step: Optional[Callable[[int, int], None]] = None):
+    """
+    Обучить модель
+
+    Args:
+        backend: Модель из MODEL_BACKENDS
+        X, y: Обучающие данные
+        params: Гиперпараметры поверх backend.params (процессы пула получают
+            параметры вызывающего процесса явно, а не читают config заново)
+        n_jobs: Переопределить n_jobs модели (1 внутри процессов пула)
+        on_step: Колбэк (деревьев готово, всего) — случайный лес тогда
+            обучается через warm_start порциями по RF_PROGRESS_STEP деревьев.
+            Результат совпадает с обучением за один вызов fit. Колбэк может
+            бросить JobCancelled, чтобы прервать обучение между порциями
+    """
+    overrides = dict(params or {})
+    if n_jobs is not None and "n_jobs" in {**backend.params, **overrides}:
+        overrides["n_jobs"] = n_jobs
+
+    if backend.kind == "forest" and on_step is not None:
+        n_total = int({**backend.params, **overrides}.get("n_estimators", 100))
+        overrides.update(n_estimators=0, warm_start=True)
+        model = backend.create(**overrides)
+        n_trees = 0
+        # Часть, начатая после отмены, прерывается до первой порции
+        on_step(n_trees, n_total)
+        while n_trees < n_total:
+            n_trees = min(n_trees + RF_PROGRESS_STEP, n_total)
+            model.set_params(n_estimators=n_trees)
+            model.fit(X, y)
+            on_step(n_trees, n_total)
+        model.set_params(warm_start=False)
+        return model
+
+    model = backend.create(**overrides)
+    model.fit(X, y)
+    return model
+
+
+def fold_indices(n_samples: int, n_folds: int, fold: int):
+    """Индексы (train, test) фолда; одинаковы во всех процессах"""
+    splitter = KFold(n_splits=n_folds, shuffle=True, random_state=RANDOM_STATE)
+    for i, indices in enumerate(splitter.split(np.arange(n_samples))):
+        if i == fold:
+            return indices
+    raise ValueError(f"Фолд {fold} вне диапазона 0..{n_folds - 1}")
+
+
+def load_matrix(data_dir: str):
+    """X и y, записанные TrainingPool.shared_matrix (через memory-map)"""
+    return (np.load(Path(data_dir) / "X.npy", mmap_mode='r'),
+            np.load(Path(data_dir) / "y.npy", mmap_mode='r'))
+
+
+def run_task(model_key: str, data_dir: str, fold: Optional[int], n_folds: int,
+             params: Optional[Dict] = None, n_jobs: Optional[int] = None,
+             on_step: Optional[Callable[[int, int], None]] = None) -> Dict:
+    """
+    Одна часть обучения (выполняется в процессе пула)
+
+    Args:
+        model_key: Ключ модели из MODEL_BACKENDS
+        data_dir: Папка с X.npy и y.npy
+        fold: Номер фолда или None — обучение на всей выборке
+        n_folds: Число фолдов
+        params: Гиперпараметры модели
+        n_jobs: n_jobs модели
+        on_step: Колбэк прогресса случайного леса (в пуле — RemoteSteps)
+
+    Returns:
+        Dict: Метрики фолда или обученная модель со временем обучения
+    """
+    backend = get_backend(model_key)
+    X, y = load_matrix(data_dir)
+
+    if fold is not None:
+        train_idx, test_idx = fold_indices(len(X), n_folds, fold)
+        X_train, y_train = X[train_idx], y[train_idx]
+    else:
+        X_train, y_train = X, y
+
+    wall_start, cpu_start = time.perf_counter(), time.process_time()
+    model = fit_estimator(backend, X_train, y_train, params, n_jobs=n_jobs, on_step=on_step)
+    fit_time = time.perf_counter() - wall_start
+    cpu_time = time.process_time() - cpu_start
+
+    if fold is None:
+        return {"model_key": model_key, "fold": None, "model": model,
+                "train_time_s": fit_time, "cpu_time_s": cpu_time}
+
+    pred = model.predict(X[test_idx])
+    y_test = y[test_idx]
+    return {
+        "model_key": model_key,
+        "fold": fold,
+        "r2_score": float(r2_score(y_test, pred)),
+        "rmse": float(np.sqrt(mean_squared_error(y_test, pred))),
+        "mae": float(mean_absolute_error(y_test, pred)),
+        "fit_time_s": fit_time,
+        "cpu_time_s": cpu_time
+    }
+
+
+def run_trial(model_key: str, data_dir: str, params: Dict, n_rows: int, n_validation: int,
+              n_jobs: Optional[int] = None) -> Dict:
+    """
+    Одна проба подбора гиперпараметров (выполняется в процессе пула)
+
+    Строки матрицы заранее перемешаны: первые n_validation — проверочная
+    выборка, модель обучается на следующих n_rows строках. Поэтому выборки
+    разных ступеней вложены друг в друга и одинаковы во всех процессах.
+
+    Returns:
+        Dict: R² на проверочной выборке, время, пик памяти и размер модели.
+            Пик памяти считается через tracemalloc (NumPy и Python),
+            без внутренних буферов деревьев sklearn
+    """
+    backend = get_backend(model_key)
+    X, y = load_matrix(data_dir)
+    X_fit = X[n_validation:n_validation + n_rows]
+    y_fit = y[n_validation:n_validation + n_rows]
+
+    tracemalloc.start()
+    try:
+        wall_start, cpu_start = time.perf_counter(), time.process_time()
+        model = fit_estimator(backend, X_fit, y_fit, params, n_jobs=n_jobs)
+        fit_time = time.perf_counter() - wall_start
+        cpu_time = time.process_time() - cpu_start
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    pred = model.predict(X[:n_validation])
+    return {
+        "model_key": model_key,
+        "params": params,
+        "n_rows": int(len(X_fit)),
+        "score": float(r2_score(y[:n_validation], pred)),
+        "wall_time_s": fit_time,
+        "cpu_time_s": cpu_time,
+        "peak_memory_mb": peak / 1024 ** 2,
+        "model_size_mb": model_size_bytes(model) / 1024 ** 2
+    }
+
+
+class RemoteSteps:
+    """
+    Колбэк on_step части, выполняемой в процессе пула
+
+    Шаги (деревьев готово, всего) отправляются в очередь Manager, откуда их
+    читает TrainingPool.execute; перед каждой порцией деревьев проверяется
+    флаг отмены. Очередь и флаг — прокси Manager, они передаются в spawn.
+    """
+
+    def __init__(self, steps, cancelled, task: int):
+        self.steps = steps
+        self.cancelled = cancelled
+        self.task = task
+
+    def __call__(self, done: int, total: int):
+        if self.cancelled.is_set():
+            raise JobCancelled("Обучение отменено")
+        self.steps.put((self.task, done, total))
+
+
+def summarize_folds(folds: List[Dict]) -> Dict:
+    """Среднее и стандартное отклонение метрик по фолдам"""
+    summary = {"folds": len(folds)}
+    for name in CV_METRICS:
+        values = np.array([fold[name] for fold in folds], dtype=np.float64)
+        summary[f"{name}_mean"] = float(values.mean())
+        summary[f"{name}_std"] = float(values.std(ddof=1)) if len(values) > 1 else 0.0
+    return summary
+
+
+class TrainingPool:
+    """Пул процессов для обучения моделей, кросс-валидации и подбора параметров"""
+
+    def __init__(self, processes: int = TRAINING_PROCESSES,
+                 data_dir: Path = TRAINING_DATA_DIR):
+        self.processes = processes
+        self.data_dir = Path(data_dir)
+        self._pool: Optional[ProcessPoolExecutor] = None
+        # Сервер очередей прогресса и флагов отмены для процессов пула
+        self._manager = None
+        self._pool_lock = threading.Lock()
+
+    def _get_pool(self) -> Optional[ProcessPoolExecutor]:
+        if self.processes <= 0:
+            return None
+
+        with self._pool_lock:
+            if self._pool is None:
+                # spawn: дочерние процессы не наследуют потоки и состояние приложения
+                context = multiprocessing.get_context('spawn')
+                self._pool = ProcessPoolExecutor(max_workers=self.processes, mp_context=context)
+                self._manager = context.Manager()
+                logger.info(f"Пул обучения моделей: {self.processes} процессов")
+            return self._pool
+
+    def shutdown(self):
+        """Остановить пул обучения"""
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False, cancel_futures=True)
+                self._pool = None
+            if self._manager is not None:
+                self._manager.shutdown()
+                self._manager = None
+
+    @contextmanager
+    def shared_matrix(self, X: np.ndarray, y: np.ndarray) -> Iterator[str]:
+        """Записать X и y в .npy для процессов пула; папка удаляется после выхода"""
+        run_dir = self.data_dir / uuid.uuid4().hex
+        run_dir.mkdir(parents=True, exist_ok=True)
+        try:
+            np.save(run_dir / "X.npy", np.ascontiguousarray(X, dtype=np.float64))
+            np.save(run_dir / "y.npy", np.ascontiguousarray(y, dtype=np.float64))
+            yield str(run_dir)
+        finally:
+            shutil.rmtree(run_dir, ignore_errors=True)
+
+    def execute(self, fn: Callable[..., Dict], tasks: List[Dict],
+                report: Callable[[float, str], None],
+                describe: Callable[[Dict], str],
+                stepped: Optional[Callable[[Dict], Optional[str]]] = None) -> List[Dict]:
+        """
+        Выполнить независимые части: одновременно в пуле или по очереди
+
+        Args:
+            fn: Функция уровня модуля (передаётся в процессы spawn)
+            tasks: Аргументы fn для каждой части
+            report: Колбэк (доля 0..1, сообщение); может бросить JobCancelled
+            describe: Описание результата части для прогресса
+            stepped: Для частей, которые обучаются порциями деревьев и
+                принимают on_step, — подпись для прогресса (иначе None)
+
+        Returns:
+            List[Dict]: Результаты в порядке завершения
+        """
+        pool = self._get_pool()
+        labels = [stepped(task) if stepped else None for task in tasks]
+        results = []
+
+        if pool is None:
+            for task, label in zip(tasks, labels):
+                done = len(results)
+                extra = {}
+                if label is not None:
+                    extra["on_step"] = lambda n_trees, n_total, done=done, label=label: report(
+                        (done + n_trees / n_total) / len(tasks), f"{label}: деревьев {n_trees}/{n_total}"
+                    )
+                result = fn(**task, **extra)
+                results.append(result)
+                logger.info(f"✓ {describe(result)}")
+                report(len(results) / len(tasks), describe(result))
+            return results
+
+        steps, cancelled = self._manager.Queue(), self._manager.Event()
+        # Внутри процессов пула модели однопоточные: параллелизм даёт сам пул
+        futures = {}
+        for i, (task, label) in enumerate(zip(tasks, labels)):
+            extra = {"on_step": RemoteSteps(steps, cancelled, i)} if label is not None else {}
+            futures[pool.submit(fn, **task, **extra, n_jobs=1)] = i
+
+        pending = set(futures)
+        partial: Dict[int, float] = {}
+        try:
+            report(0.0, f"Частей: {len(tasks)}, процессов: {self.processes}")
+            while pending:
+                done, pending = wait(pending, timeout=1.0, return_when=FIRST_COMPLETED)
+                for future in done:
+                    result = future.result()
+                    partial.pop(futures[future], None)
+                    results.append(result)
+                    logger.info(f"✓ {describe(result)}")
+                    report((len(results) + sum(partial.values())) / len(tasks), describe(result))
+
+                # Шаги деревьев от процессов пула; заодно точка отмены
+                message = None
+                while True:
+                    try:
+                        i, n_trees, n_total = steps.get_nowait()
+                    except queue.Empty:
+                        break
+                    if any(futures[future] == i for future in pending):
+                        partial[i] = n_trees / n_total
+                        message = f"{labels[i]}: деревьев {n_trees}/{n_total}"
+                if not done or message:
+                    report((len(results) + sum(partial.values())) / len(tasks),
+                           message or f"Готово частей: {len(results)}/{len(tasks)}")
+        except BrokenProcessPool:
+            # Процесс пула упал (например, не хватило памяти): следующее
+            # обучение создаст новый пул
+            self.shutdown()
+            raise
+        except BaseException:
+            # Запущенные части леса остановятся перед следующей порцией деревьев
+            cancelled.set()
+            for future in pending:
+                future.cancel()
+            raise
+
+        return results
+
+    def run(self, X: np.ndarray, y: np.ndarray, model_keys: List[str],
+            n_folds: int = CV_FOLDS,
+            progress: Optional[Callable[[float, str], None]] = None,
+            params: Optional[Dict[str, Dict]] = None) -> Dict[str, Dict]:
+        """
+        Обучить модели на всей выборке и оценить их кросс-валидацией
+
+        Args:
+            X, y: Обучающая выборка
+            model_keys: Ключи моделей из MODEL_BACKENDS
+            n_folds: Число фолдов (меньше 2 — без кросс-валидации)
+            progress: Колбэк (доля 0..1, сообщение). Может бросить
+                JobCancelled — тогда невыполненные части отменяются
+            params: Гиперпараметры поверх backend.params: {ключ модели: параметры}
+
+        Returns:
+            Dict[str, Dict]: Для каждой модели — model, train_time_s,
+                cpu_time_s и cv (сводка по фолдам или None)
+        """
+        report = progress or (lambda value, message="": None)
+        folds = list(range(n_folds)) if n_folds >= 2 else []
+        # Итоговое обучение — самые долгие части, они идут первыми
+        parts = [(key, None) for key in model_keys] + [(key, fold) for fold in folds for key in model_keys]
+
+        def describe(result: Dict) -> str:
+            label = get_backend(result["model_key"]).label
+            if result["fold"] is None:
+                return f"{label}: обучена на всей выборке"
+            return f"{label}: фолд {result['fold'] + 1}/{n_folds}, R² = {result['r2_score']:.4f}"
+
+        def stepped(task: Dict) -> Optional[str]:
+            # Случайный лес обучается порциями деревьев: прогресс и отмена между ними
+            backend = get_backend(task["model_key"])
+            if backend.kind != "forest":
+                return None
+            if task["fold"] is None:
+                return backend.label
+            return f"{backend.label}, фолд {task['fold'] + 1}/{n_folds}"
+
+        with self.shared_matrix(X, y) as data_dir:
+            tasks = [
+                {"model_key": key, "data_dir": data_dir, "fold": fold, "n_folds": n_folds,
+                 "params": {**get_backend(key).params, **(params or {}).get(key, {})}}
+                for key, fold in parts
+            ]
+            results = self.execute(run_task, tasks, report, describe, stepped)
+
+        trained = {}
+        for key in model_keys:
+            full = next(r for r in results if r["model_key"] == key and r["fold"] is None)
+            fold_results = sorted((r for r in results if r["model_key"] == key and r["fold"] is not None),
+                                  key=lambda r: r["fold"])
+            trained[key] = {
+                "model": full["model"],
+                "train_time_s": full["train_time_s"],
+                "cpu_time_s": full["cpu_time_s"],
+                "cv": summarize_folds(fold_results) if fold_results else None
+            }
+        return trained
+
+
+# Глобальный экземпляр сервиса
+training_pool = TrainingPool()
@@ -0,0 +1,417 @@
+"""
+Подбор гиперпараметров моделей (successive halving)
+
+Кандидаты выбираются из сетки TUNING_SPACES и оцениваются ступенями: на
+первой ступени каждая конфигурация обучается на небольшой подвыборке строк,
+на следующую проходит 1/ETA лучших, а подвыборка растёт в ETA раз — пока не
+дойдёт до всей обучающей выборки. Пробы одной ступени выполняются
+параллельно в пуле обучения (training_pool.py).
+
+Каждая проба (параметры, число строк, R², время, память, размер модели)
+сохраняется в SQLite. Повторный подбор на той же версии датасета берёт
+готовые пробы из базы, а лучшие прошлые конфигурации добавляются
+к новым кандидатам (тёплый старт).
+"""
+import itertools
+import json
+import logging
+import math
+import sqlite3
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from backend.config import (
+    TUNING_SPACES, TUNING_CANDIDATES, TUNING_ETA, TUNING_MIN_ROWS,
+    TUNING_VALIDATION_FRACTION, TUNING_WARM_START_TOP, TUNING_DB_PATH,
+    RANDOM_STATE, TEST_SIZE
+)
+from backend.services.job_service import JobCancelled
+from backend.services.model_backends import get_backend
+from backend.services.model_service import model_service
+from backend.services.training_pool import training_pool, run_trial
+
+logger = logging.getLogger(__name__)
+
+# Колбэк прогресса: (этап, доля 0..1, сообщение)
+ProgressCallback = Callable[..., None]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id TEXT PRIMARY KEY,
+    model_key TEXT NOT NULL,
+    dataset_key TEXT NOT NULL,
+    status TEXT NOT NULL,
+    settings TEXT NOT NULL,
+    best_params TEXT,
+    best_score REAL,
+    started_at REAL NOT NULL,
+    finished_at REAL
+);
+CREATE TABLE IF NOT EXISTS trials (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    run_id TEXT NOT NULL,
+    model_key TEXT NOT NULL,
+    dataset_key TEXT NOT NULL,
+    params TEXT NOT NULL,
+    n_rows INTEGER NOT NULL,
+    rung INTEGER NOT NULL,
+    score REAL NOT NULL,
+    wall_time_s REAL,
+    cpu_time_s REAL,
+    peak_memory_mb REAL,
+    model_size_mb REAL,
+    reused INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS trials_lookup ON trials (model_key, dataset_key, params, n_rows);
+CREATE TABLE IF NOT EXISTS applied (
+    model_key TEXT PRIMARY KEY,
+    params TEXT NOT NULL,
+    run_id TEXT NOT NULL,
+    score REAL,
+    applied_at REAL NOT NULL
+);
+"""
+
+# Результаты пробы, которые сохраняются в базе
+TRIAL_FIELDS = ["score", "wall_time_s", "cpu_time_s", "peak_memory_mb", "model_size_mb"]
+
+
+def params_key(params: Dict) -> str:
+    """Каноническая запись параметров (ключ поиска в базе)"""
+    return json.dumps(params, sort_keys=True)
+
+
+class TrialStore:
+    """Хранилище проб и подборов в SQLite"""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._initialized = False
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.path, timeout=30)
+        connection.row_factory = sqlite3.Row
+        if not self._initialized:
+            connection.executescript(SCHEMA)
+            self._initialized = True
+        return connection
+
+    def _execute(self, query: str, args: tuple = ()) -> List[sqlite3.Row]:
+        with self._lock:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            connection = self._connect()
+            try:
+                with connection:
+                    return connection.execute(query, args).fetchall()
+            finally:
+                connection.close()
+
+    def start_run(self, run_id: str, model_key: str, dataset_key: str, settings: Dict):
+        self._execute(
+            "INSERT INTO runs (id, model_key, dataset_key, status, settings, started_at) "
+            "VALUES (?, ?, ?, 'running', ?, ?)",
+            (run_id, model_key, dataset_key, json.dumps(settings), time.time())
+        )
+
+    def finish_run(self, run_id: str, status: str, best_params: Optional[Dict] = None,
+                   best_score: Optional[float] = None):
+        self._execute(
+            "UPDATE runs SET status = ?, best_params = ?, best_score = ?, finished_at = ? WHERE id = ?",
+            (status, json.dumps(best_params) if best_params is not None else None,
+             best_score, time.time(), run_id)
+        )
+
+    def add_trial(self, run_id: str, model_key: str, dataset_key: str, trial: Dict,
+                  rung: int, reused: bool):
+        self._execute(
+            "INSERT INTO trials (run_id, model_key, dataset_key, params, n_rows, rung, score, "
+            "wall_time_s, cpu_time_s, peak_memory_mb, model_size_mb, reused, created_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (run_id, model_key, dataset_key, params_key(trial["params"]), trial["n_rows"], rung,
+             *[trial.get(name) for name in TRIAL_FIELDS], int(reused), time.time())
+        )
+
+    def find_trial(self, model_key: str, dataset_key: str, params: Dict,
+                   n_rows: int) -> Optional[Dict]:
+        """Уже выполненная проба с теми же параметрами и числом строк"""
+        rows = self._execute(
+            "SELECT * FROM trials WHERE model_key = ? AND dataset_key = ? AND params = ? "
+            "AND n_rows = ? AND reused = 0 ORDER BY id DESC LIMIT 1",
+            (model_key, dataset_key, params_key(params), n_rows)
+        )
+        if not rows:
+            return None
+        row = dict(rows[0])
+        return {"params": params, "n_rows": n_rows, **{name: row[name] for name in TRIAL_FIELDS}}
+
+    def best_params(self, model_key: str, dataset_key: str, limit: int) -> List[Dict]:
+        """Лучшие конфигурации прошлых подборов (на самой большой подвыборке)"""
+        rows = self._execute(
+            "SELECT params FROM trials WHERE model_key = ? AND dataset_key = ? "
+            "ORDER BY n_rows DESC, score DESC",
+            (model_key, dataset_key)
+        )
+        unique = dict.fromkeys(row["params"] for row in rows)
+        return [json.loads(params) for params in list(unique)[:limit]]
+
+    def apply_params(self, model_key: str, params: Dict, run_id: str, score: Optional[float]):
+        """Сохранить параметры подбора для следующих обучений модели"""
+        self._execute(
+            "INSERT OR REPLACE INTO applied (model_key, params, run_id, score, applied_at) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (model_key, params_key(params), run_id, score, time.time())
+        )
+
+    def applied_params(self) -> Dict[str, Dict]:
+        """Применённые параметры: {ключ модели: параметры}"""
+        rows = self._execute("SELECT model_key, params FROM applied")
+        return {row["model_key"]: json.loads(row["params"]) for row in rows}
+
+    def list_runs(self, limit: int = 50) -> List[Dict]:
+        rows = self._execute("SELECT * FROM runs ORDER BY started_at DESC LIMIT ?", (limit,))
+        return [self._run_dict(row) for row in rows]
+
+    def get_run(self, run_id: str) -> Dict:
+        rows = self._execute("SELECT * FROM runs WHERE id = ?", (run_id,))
+        if not rows:
+            raise KeyError(run_id)
+
+        run = self._run_dict(rows[0])
+        trials = self._execute("SELECT * FROM trials WHERE run_id = ? ORDER BY rung, score DESC", (run_id,))
+        run["trials"] = [
+            {**dict(row), "params": json.loads(row["params"]), "reused": bool(row["reused"])}
+            for row in trials
+        ]
+        return run
+
+    @staticmethod
+    def _run_dict(row: sqlite3.Row) -> Dict:
+        run = dict(row)
+        run["settings"] = json.loads(run["settings"])
+        run["best_params"] = json.loads(run["best_params"]) if run["best_params"] else None
+        return run
+
+
+class TuningService:
+    def __init__(self, db_path: Path = TUNING_DB_PATH):
+        self.store = TrialStore(db_path)
+
+    @staticmethod
+    def new_run_id() -> str:
+        return uuid.uuid4().hex[:12]
+
+    @staticmethod
+    def check_model(model_key: str):
+        """Проверить, что для модели задано пространство поиска"""
+        if model_key not in TUNING_SPACES:
+            raise ValueError(f"Для модели '{model_key}' нет пространства поиска. "
+                             f"Доступные модели: {list(TUNING_SPACES)}")
+        get_backend(model_key)
+
+    def applied_params(self) -> Dict[str, Dict]:
+        """
+        Параметры, применённые подбором с apply=True
+
+        Хранятся в базе подборов, а не в backend.params: их видят все воркеры
+        и они переживают перезапуск. Передаются в model_service.train_models.
+        """
+        return self.store.applied_params()
+
+    @staticmethod
+    def dataset_key(dataset_version: Optional[str], n_rows: int) -> str:
+        """Ключ данных проб: пробы переиспользуются только на тех же данных и разбиении"""
+        return (f"{dataset_version or 'unknown'}:{n_rows}:{RANDOM_STATE}:"
+                f"{TEST_SIZE}:{TUNING_VALIDATION_FRACTION}")
+
+    @staticmethod
+    def sample_candidates(model_key: str, n_candidates: int, seed: int = RANDOM_STATE) -> List[Dict]:
+        """Случайные различные конфигурации из сетки TUNING_SPACES"""
+        space = TUNING_SPACES[model_key]
+        names = list(space)
+        grid = list(itertools.product(*(space[name] for name in names)))
+
+        rng = np.random.RandomState(seed)
+        chosen = rng.choice(len(grid), size=min(n_candidates, len(grid)), replace=False)
+        return [dict(zip(names, grid[i])) for i in sorted(chosen)]
+
+    @staticmethod
+    def rung_sizes(n_candidates: int, n_available: int, eta: int, min_rows: int) -> List[int]:
+        """Число строк на каждой ступени: последняя — вся выборка"""
+        n_rungs = int(math.floor(math.log(max(n_candidates, 1), eta) + 1e-9)) + 1
+        first = max(min_rows, int(n_available / eta ** (n_rungs - 1)))
+        sizes = []
+        for rung in range(n_rungs):
+            size = min(first * eta ** rung, n_available)
+            if sizes and size <= sizes[-1]:
+                break
+            sizes.append(size)
+        sizes[-1] = n_available
+        return sizes
+
+    def tune(self, df: pd.DataFrame, model_key: str = "random_forest",
+             n_candidates: int = TUNING_CANDIDATES, eta: int = TUNING_ETA,
+             min_rows: int = TUNING_MIN_ROWS, warm_start: bool = True, apply: bool = False,
+             progress: Optional[ProgressCallback] = None,
+             dataset_version: Optional[str] = None, run_id: Optional[str] = None) -> Dict:
+        """
+        Подобрать гиперпараметры модели
+
+        Args:
+            df: Датафрейм
+            model_key: Ключ модели из TUNING_SPACES
+            n_candidates: Число кандидатов на первой ступени
+            eta: Во сколько раз сокращаются кандидаты и растут подвыборки
+            min_rows: Минимум строк на первой ступени
+            warm_start: Брать готовые пробы и лучшие конфигурации из базы
+            apply: Сохранить лучшие параметры в базе: следующие обучения
+                (в любом воркере и после перезапуска) берут их через applied_params()
+            progress: Колбэк (этап, доля 0..1, сообщение); может бросить JobCancelled
+            dataset_version: Версия датасета (ключ переиспользования проб)
+            run_id: ID подбора (по умолчанию — новый)
+
+        Returns:
+            Dict: Лучшие параметры, их R² и ступени подбора
+        """
+        self.check_model(model_key)
+        if eta < 2:
+            raise ValueError("eta должно быть не меньше 2")
+
+        backend = get_backend(model_key)
+        report = progress or (lambda stage, value, message="": None)
+        run_id = run_id or self.new_run_id()
+        started = time.perf_counter()
+
+        report("data_prep", 0.0, "Подготовка данных")
+        X_train, _, y_train, _, features = model_service.prepare_data(df)
+
+        # Перемешиваем один раз: первые строки — проверочная выборка,
+        # подвыборки ступеней — префиксы остальных строк
+        order = np.random.RandomState(RANDOM_STATE).permutation(len(X_train))
+        X = X_train.to_numpy(dtype=np.float64)[order]
+        y = y_train.to_numpy(dtype=np.float64)[order]
+        n_validation = max(int(len(X) * TUNING_VALIDATION_FRACTION), 1)
+        n_available = len(X) - n_validation
+        dataset_key = self.dataset_key(dataset_version, len(X))
+
+        # Кандидаты: текущие параметры, лучшие из прошлых подборов и случайные из сетки
+        space = TUNING_SPACES[model_key]
+        defaults = backend.create(**self.applied_params().get(model_key, {})).get_params()
+        current = {name: defaults[name] for name in space}
+        candidates = [current]
+        if warm_start:
+            candidates += self.store.best_params(model_key, dataset_key, TUNING_WARM_START_TOP)
+        candidates += self.sample_candidates(model_key, n_candidates)
+        unique = {params_key(params): params for params in candidates}
+        candidates = list(unique.values())[:max(n_candidates, 1)]
+
+        sizes = self.rung_sizes(len(candidates), n_available, eta, min_rows)
+        settings = {"n_candidates": len(candidates), "eta": eta, "rungs": sizes,
+                    "warm_start": warm_start, "features": features}
+        self.store.start_run(run_id, model_key, dataset_key, settings)
+        logger.info(f"Подбор параметров {backend.label}: {len(candidates)} кандидатов, "
+                    f"ступени {sizes} строк")
+
+        rungs = []
+        survivors = candidates
+        try:
+            with training_pool.shared_matrix(X, y) as data_dir:
+                for rung, n_rows in enumerate(sizes):
+                    start, share = 0.05 + 0.9 * rung / len(sizes), 0.9 / len(sizes)
+                    report("tuning", start, f"Ступень {rung + 1}/{len(sizes)}: "
+                                            f"{len(survivors)} кандидатов × {n_rows:,} строк")
+
+                    results = self._run_rung(
+                        run_id, model_key, dataset_key, data_dir, survivors, rung,
+                        n_rows, n_validation, warm_start,
+                        lambda value, message="": report("tuning", start + share * value, message)
+                    )
+                    results.sort(key=lambda trial: -trial["score"])
+                    rungs.append({
+                        "rung": rung,
+                        "n_rows": n_rows,
+                        "candidates": len(results),
+                        "best_score": results[0]["score"],
+                        "wall_time_s": sum(trial["wall_time_s"] or 0.0 for trial in results)
+                    })
+
+                    keep = max(len(results) // eta, 1)
+                    survivors = [trial["params"] for trial in results[:keep]]
+                    if len(results) == 1:
+                        break
+
+        except JobCancelled:
+            self.store.finish_run(run_id, "cancelled")
+            raise
+        except Exception:
+            self.store.finish_run(run_id, "failed")
+            raise
+
+        best = results[0]
+        self.store.finish_run(run_id, "completed", best["params"], best["score"])
+        logger.info(f"✓ Лучшие параметры {backend.label}: {best['params']} (R² = {best['score']:.4f})")
+
+        if apply:
+            self.store.apply_params(model_key, best["params"], run_id, best["score"])
+            logger.info(f"✓ Параметры {backend.label} сохранены для следующих обучений")
+
+        return {
+            "status": "success",
+            "run_id": run_id,
+            "model": model_key,
+            "best_params": best["params"],
+            "best_score": best["score"],
+            "baseline_params": current,
+            "rungs": rungs,
+            "applied": apply,
+            "wall_time_s": time.perf_counter() - started
+        }
+
+    def _run_rung(self, run_id: str, model_key: str, dataset_key: str, data_dir: str,
+                  candidates: List[Dict], rung: int, n_rows: int, n_validation: int,
+                  reuse: bool, report: Callable) -> List[Dict]:
+        """Пробы одной ступени: готовые берутся из базы, остальные — в пуле параллельно"""
+        results, tasks = [], []
+        backend = get_backend(model_key)
+
+        for params in candidates:
+            cached = self.store.find_trial(model_key, dataset_key, params, n_rows) if reuse else None
+            if cached is not None:
+                self.store.add_trial(run_id, model_key, dataset_key, cached, rung, reused=True)
+                results.append(cached)
+            else:
+                tasks.append({"model_key": model_key, "data_dir": data_dir,
+                              "params": {**backend.params, **params},
+                              "n_rows": n_rows, "n_validation": n_validation})
+
+        if results:
+            logger.info(f"  Ступень {rung + 1}: {len(results)} проб взято из базы")
+
+        def describe(trial: Dict) -> str:
+            return f"{trial['n_rows']:,} строк, R² = {trial['score']:.4f}"
+
+        if tasks:
+            for trial in training_pool.execute(run_trial, tasks, report, describe):
+                # В базу — только подбираемые параметры, без постоянных (random_state, n_jobs)
+                trial["params"] = {name: trial["params"][name] for name in TUNING_SPACES[model_key]}
+                self.store.add_trial(run_id, model_key, dataset_key, trial, rung, reused=False)
+                results.append(trial)
+
+        return results
+
+    def list_runs(self) -> List[Dict]:
+        return self.store.list_runs()
+
+    def get_run(self, run_id: str) -> Dict:
+        return self.store.get_run(run_id)
+
+
+# Глобальный экземпляр сервиса
+tuning_service = TuningService()
@@ -34,7 +34,7 @@ class APIClient {
                 method: 'POST',
                 data: JSON.stringify(data),
                 contentType: 'application/json',
-                timeout: 180000  // 3 МИНУТЫ для обучения модели!
+                timeout: 30000  // Обучение идёт в фоне, ответ приходит сразу
             });
             return { success: true, data: response };
         } catch (error) {
@@ -96,6 +96,14 @@ class APIClient {
         return this.post(CONFIG.ENDPOINTS.TRAIN_MODEL);
     }
 
+    getJob(jobId) {
+        return this.get(`${CONFIG.ENDPOINTS.JOBS}/${jobId}`);
+    }
+
+    cancelJob(jobId) {
+        return this.post(`${CONFIG.ENDPOINTS.JOBS}/${jobId}/cancel`);
+    }
+
     getModelMetrics() {
         return this.get(CONFIG.ENDPOINTS.MODEL_METRICS);
     }
@@ -3,8 +3,30 @@
  */
 
 const ModelComponent = {
+    // Интервал опроса статуса задачи обучения (мс)
+    POLL_INTERVAL: 1000,
+
+    // Названия этапов обучения
+    STAGES: {
+        queued: 'В очереди',
+        data_prep: 'Подготовка данных',
+        training: 'Обучение и кросс-валидация',
+        updating: 'Дообучение на новых строках',
+        linear_regression: 'Linear Regression',
+        random_forest: 'Random Forest',
+        hist_gradient_boosting: 'Hist Gradient Boosting',
+        finalizing: 'Сохранение результатов',
+        done: 'Готово'
+    },
+
+    // ID текущей задачи обучения
+    currentJobId: null,
+
     /**
      * Обучить модель
+     *
+     * POST /model/train сразу возвращает ID фоновой задачи,
+     * дальше статус опрашивается через GET /model/jobs/{id}
      */
     async train() {
         const loadingId = 'loading-model';
@@ -20,18 +42,22 @@ const ModelComponent = {
         this._showTrainingProgress();
 
         try {
-            // ВАЖНО: увеличенный таймаут для обучения (2 минуты)
-            const result = await $.ajax({
-                url: `${CONFIG.API_URL}/model/train`,
+            const job = await $.ajax({
+                url: `${CONFIG.API_URL}${CONFIG.ENDPOINTS.TRAIN_MODEL}`,
                 method: 'POST',
-                timeout: 120000,  // 2 минуты (было 3 секунды!)
+                timeout: 10000,
                 dataType: 'json'
             });
 
-            if (result.status === 'success') {
-                this.render(result);
+            this.currentJobId = job.job_id;
+            const finished = await this._pollJob(job.job_id);
+
+            if (finished.status === 'completed' && finished.result && finished.result.status === 'success') {
+                this.render(finished.result);
+            } else if (finished.status === 'cancelled') {
+                throw new Error('Обучение отменено. Текущая модель не изменилась.');
             } else {
-                throw new Error('Ошибка обучения модели');
+                throw new Error(finished.error || 'Ошибка обучения модели');
             }
 
         } catch (error) {
@@ -49,10 +75,53 @@ const ModelComponent = {
 
             Utils.showError(resultId, errorMessage);
         } finally {
+            this.currentJobId = null;
             Utils.hideLoading(loadingId);
         }
     },
 
+    /**
+     * Опрашивать задачу, пока она не завершится
+     */
+    async _pollJob(jobId) {
+        while (true) {
+            const job = await $.ajax({
+                url: `${CONFIG.API_URL}${CONFIG.ENDPOINTS.JOBS}/${jobId}`,
+                method: 'GET',
+                timeout: 10000,
+                dataType: 'json'
+            });
+
+            this._updateTrainingProgress(job);
+
+            if (['completed', 'failed', 'cancelled'].includes(job.status)) {
+                return job;
+            }
+
+            await new Promise(resolve => setTimeout(resolve, this.POLL_INTERVAL));
+        }
+    },
+
+    /**
+     * Отменить текущее обучение
+     */
+    async cancel() {
+        if (!this.currentJobId) {
+            return;
+        }
+
+        try {
+            await $.ajax({
+                url: `${CONFIG.API_URL}${CONFIG.ENDPOINTS.JOBS}/${this.currentJobId}/cancel`,
+                method: 'POST',
+                timeout: 10000
+            });
+            $('#training-stage').text('Отмена...');
+        } catch (error) {
+            console.error('Ошибка отмены:', error);
+        }
+    },
+
     /**
      * Показать прогресс обучения
      */
@@ -61,33 +130,41 @@ const ModelComponent = {
             <div class="result" style="text-align: center; padding: 30px;">
                 <div style="font-size: 48px; margin-bottom: 20px;"></div>
                 <h3 style="color: #000; margin-bottom: 15px;">Обучение модели...</h3>
-                <p style="color: #666; margin-bottom: 20px;">
-                    Это может занять <strong>1-2 минуты</strong>.<br>
-                    Модель анализирует 230,000+ треков!
+                <p id="training-stage" style="color: #666; margin-bottom: 20px;">
+                    ${this.STAGES.queued}
                 </p>
                 <div style="background: #e0e0e0; height: 6px; border-radius: 0; overflow: hidden; border: 2px solid #000;">
-                    <div class="progress-bar-animated" style="
+                    <div id="training-progress-bar" style="
                         background: #000;
                         height: 100%;
                         width: 0%;
-                        animation: progress 90s linear;
+                        transition: width 0.5s linear;
                     "></div>
                 </div>
-                <p style="color: #999; margin-top: 15px; font-size: 0.9em;">
-                    Не закрывайте эту страницу...
+                <p id="training-message" style="color: #999; margin-top: 15px; font-size: 0.9em;">
+                    Модель анализирует 230,000+ треков
                 </p>
+                <button class="button" onclick="cancelTraining()">Отменить</button>
             </div>
-            <style>
-                @keyframes progress {
-                    0% { width: 0%; }
-                    100% { width: 95%; }
-                }
-            </style>
         `;
 
         $('#model-result').html(html);
     },
 
+    /**
+     * Обновить прогресс по статусу задачи
+     */
+    _updateTrainingProgress(job) {
+        const percent = Math.round(job.progress * 100);
+        const stage = this.STAGES[job.stage] || job.stage;
+
+        $('#training-progress-bar').css('width', `${percent}%`);
+        $('#training-stage').text(`${stage} — ${percent}%`);
+        if (job.message) {
+            $('#training-message').text(job.message);
+        }
+    },
+
     /**
      * Загрузить метрики
      */
@@ -136,31 +213,36 @@ const ModelComponent = {
         // Метрики моделей
         html += '<div class="metrics-container" style="margin-top: 20px;">';
 
-        // Linear Regression
-        const lr = data.metrics.linear_regression;
-        html += `
-        <div class="metric-card">
-            <h3>Linear Regression</h3>
-            <div class="metric-label">R² Score (точность)</div>
-            <div class="metric-value">${Utils.formatNumber(lr.r2_score, 4)}</div>
-            <div class="metric-label" style="margin-top: 10px;">RMSE: ${Utils.formatNumber(lr.rmse, 2)}</div>
-            <div class="metric-label">MAE: ${Utils.formatNumber(lr.mae, 2)}</div>
-            ${data.best_model === 'Linear Regression' ? '<div style="margin-top: 10px; font-size: 24px;"></div>' : ''}
-        </div>
-    `;
+        // Карточка на каждую обученную модель: точность, время, CPU и размер
+        const modelKeys = (data.models || [])
+            .map(model => model.key)
+            .filter(key => data.metrics[key]);
+        if (modelKeys.length === 0) {
+            modelKeys.push('linear_regression', 'random_forest');
+        }
+        const bestKey = data.best_model_key || modelKeys.find(key => this.STAGES[key] === data.best_model);
+        const best = data.metrics[bestKey] || data.metrics.random_forest;
 
-        // Random Forest
-        const rf = data.metrics.random_forest;
-        html += `
-        <div class="metric-card">
-            <h3>Random Forest</h3>
-            <div class="metric-label">R² Score (точность)</div>
-            <div class="metric-value">${Utils.formatNumber(rf.r2_score, 4)}</div>
-            <div class="metric-label" style="margin-top: 10px;">RMSE: ${Utils.formatNumber(rf.rmse, 2)}</div>
-            <div class="metric-label">MAE: ${Utils.formatNumber(rf.mae, 2)}</div>
-            ${data.best_model === 'Random Forest' ? '<div style="margin-top: 10px; font-size: 24px;"></div>' : ''}
-        </div>
-    `;
+        modelKeys.forEach(key => {
+            const m = data.metrics[key];
+            html += `
+            <div class="metric-card">
+                <h3>${m.label || this.STAGES[key] || key}</h3>
+                <div class="metric-label">R² Score (точность)</div>
+                <div class="metric-value">${Utils.formatNumber(m.r2_score, 4)}</div>
+                <div class="metric-label" style="margin-top: 10px;">RMSE: ${Utils.formatNumber(m.rmse, 2)}</div>
+                <div class="metric-label">MAE: ${Utils.formatNumber(m.mae, 2)}</div>
+                ${m.cv ? `
+                <div class="metric-label" style="margin-top: 10px;">CV R² (${m.cv.folds} фолдов): ${Utils.formatNumber(m.cv.r2_score_mean, 4)} ± ${Utils.formatNumber(m.cv.r2_score_std, 4)}</div>
+                ` : ''}
+                ${m.train_time_s !== undefined ? `
+                <div class="metric-label" style="margin-top: 10px;">Обучение: ${Utils.formatNumber(m.train_time_s, 1)} с (CPU ${Utils.formatNumber(m.cpu_time_s, 1)} с)</div>
+                <div class="metric-label">Размер: ${Utils.formatNumber(m.model_size_mb, 2)} МБ</div>
+                ` : ''}
+                ${key === bestKey ? '<div style="margin-top: 10px; font-size: 24px;"></div>' : ''}
+            </div>
+        `;
+        });
 
         html += '</div>';
 
@@ -170,8 +252,8 @@ const ModelComponent = {
             <h4 style="color: #000; margin-bottom: 15px; font-weight: 900;">Что означают метрики:</h4>
             <ul style="color: #333; line-height: 1.8; margin-left: 20px;">
                 <li><strong>R² Score:</strong> Показывает точность модели (0 = плохо, 1 = отлично). 
-                    Ваш результат <strong>${Utils.formatNumber(rf.r2_score, 2)}</strong> означает, что модель объясняет 
-                    <strong>${Utils.formatNumber(rf.r2_score * 100, 0)}%</strong> популярности треков.</li>
+                    Ваш результат <strong>${Utils.formatNumber(best.r2_score, 2)}</strong> означает, что модель объясняет 
+                    <strong>${Utils.formatNumber(best.r2_score * 100, 0)}%</strong> популярности треков.</li>
                 <li><strong>RMSE:</strong> Средняя ошибка предсказания. Чем меньше - тем лучше.</li>
                 <li><strong>MAE:</strong> Средняя абсолютная ошибка. Тоже чем меньше - тем лучше.</li>
             </ul>
@@ -209,7 +291,7 @@ const ModelComponent = {
                 <p><strong>Обучено на:</strong> ${data.train_size.toLocaleString()} треках</p>
                 <p><strong>Протестировано на:</strong> ${data.test_size.toLocaleString()} треках</p>
                 <p><strong>Использовано признаков:</strong> ${data.features_used.length}</p>
-                <p><strong>Улучшение Random Forest:</strong> +${Utils.formatNumber(data.improvement, 1)}% по сравнению с Linear Regression</p>
+                <p><strong>Улучшение ${data.best_model}:</strong> +${Utils.formatNumber(data.improvement, 1)}% по сравнению с Linear Regression</p>
             </div>
         </div>
     `;
@@ -220,7 +302,7 @@ const ModelComponent = {
             <ul style="color: #333; line-height: 1.8; margin-left: 20px;">
                 <li>Модель обучена и может предсказывать популярность треков</li>
                 <li>Самые важные признаки: <strong>${features[0][0]}</strong>, <strong>${features[1][0]}</strong>, <strong>${features[2][0]}</strong></li>
-                <li>Точность ${Utils.formatNumber(rf.r2_score * 100, 0)}% говорит о том, что популярность зависит не только от аудио-характеристик</li>
+                <li>Точность ${Utils.formatNumber(best.r2_score * 100, 0)}% говорит о том, что популярность зависит не только от аудио-характеристик</li>
                 <li>Другие факторы: имя артиста, маркетинг, тренды, плейлисты</li>
             </ul>
         </div>
@@ -16,6 +16,7 @@ const CONFIG = {
         HISTOGRAM: '/plots/histogram',
         HEATMAP: '/plots/heatmap',
         TRAIN_MODEL: '/model/train',
+        JOBS: '/model/jobs',
         MODEL_METRICS: '/model/metrics'
     },
 
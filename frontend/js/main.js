@@ -36,6 +36,10 @@ function trainModel() {
     ModelComponent.train();
 }
 
+function cancelTraining() {
+    ModelComponent.cancel();
+}
+
 function loadModelMetrics() {
     ModelComponent.loadMetrics();
 }
@@ -6,8 +6,14 @@ python run.py
 
 Или из папки backend:
 cd backend && python run.py
+
+Несколько воркеров с общей памятью:
+python run.py --workers 4
+(датасет один раз загружается в бинарный кэш, воркеры открывают его через mmap)
 """
 
+import argparse
+import os
 import sys
 from pathlib import Path
 
@@ -22,7 +28,42 @@ else:
 
 import uvicorn
 
+
+def preload_shared_data():
+    """
+    Подготовить общие данные до запуска воркеров
+
+    Родительский процесс строит бинарный кэш датасета, после чего каждый
+    воркер открывает те же файлы через mmap только для чтения. Активная
+    версия моделей из реестра публикуется в общее хранилище один раз здесь,
+    а не каждым воркером при старте.
+    """
+    from backend.config import DATASET_PATH, MODEL_WARM_START
+    from backend.services.data_service import data_service
+    from backend.services.model_service import model_service
+
+    if not data_service.load_dataset(DATASET_PATH, use_cache=True):
+        print("⚠  Датасет не загружен, воркеры стартуют без данных")
+
+    # Родительскому процессу данные больше не нужны
+    data_service.df = None
+    data_service.index = None
+
+    if MODEL_WARM_START:
+        try:
+            model_service.publish_registry()
+        except Exception as e:
+            print(f"⚠  Не удалось опубликовать модели из реестра: {e}")
+
+    os.environ["SPOTIFY_SHARED_MEMORY"] = "1"
+
+
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Запуск Spotify Analysis API")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Количество воркеров uvicorn (>1 включает режим общей памяти)")
+    args = parser.parse_args()
+
     print("="*60)
     print("🎵 Запуск Spotify Analysis API")
     print("="*60)
@@ -36,13 +77,19 @@ if __name__ == "__main__":
     print("   cd frontend")
     print("   python -m http.server 8080")
     print("   Откройте: http://localhost:8080")
+    if args.workers > 1:
+        print(f"\n🧩 Воркеров: {args.workers} (режим общей памяти)")
     print("\n⏸  Остановка: Ctrl+C")
     print("="*60 + "\n")
 
+    if args.workers > 1:
+        preload_shared_data()
+
     uvicorn.run(
         "api.main:app",
         host="0.0.0.0",
         port=8000,
-        reload=True,
+        reload=args.workers == 1,
+        workers=args.workers,
         log_level="info"
     )
\ No newline at end of file
@@ -0,0 +1,146 @@
+"""
+Бенчмарк /analysis/*: прежний путь через pandas (отдельный проход по
+Series на каждую метрику, groupby по жанру, DataFrame.corr) против ядра
+stats_kernel (один проход по блоку всех колонок), группировки по кодам
+(groupby.py) и матриц корреляций через BLAS (correlation.py)
+
+Замеряется вычисление при промахе кэша — именно его ждёт первый запрос
+к /analysis/* после загрузки или дополнения датасета.
+Заодно проверяется, что результаты совпадают.
+
+Запуск: python scripts/bench_analysis.py [число повторов] [путь к CSV]
+"""
+
+import sys
+import time
+from pathlib import Path
+
+# Добавляем корневую папку в путь для импортов
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import numpy as np
+import pandas as pd
+
+from backend.config import AUDIO_FEATURES, DATASET_PATH, DISTRIBUTION_FEATURES
+from backend.services.data_service import data_service
+from backend.services.analysis_service import analysis_service
+
+
+def legacy_distributions(df: pd.DataFrame, features: list) -> dict:
+    """Прежний analyze_distributions: девять проходов pandas на признак"""
+    stats = {}
+    for feature in features:
+        series = df[feature].dropna()
+        stats[feature] = {
+            "mean": float(series.mean()),
+            "median": float(series.median()),
+            "std": float(series.std()),
+            "min": float(series.min()),
+            "max": float(series.max()),
+            "q25": float(series.quantile(0.25)),
+            "q75": float(series.quantile(0.75)),
+            "skewness": float(series.skew()),
+            "kurtosis": float(series.kurtosis())
+        }
+    return stats
+
+
+def legacy_summary(df: pd.DataFrame) -> dict:
+    """Прежний get_summary_statistics"""
+    summary = {}
+    for col in df.select_dtypes(include=[np.number]).columns:
+        summary[col] = {
+            "count": int(df[col].count()),
+            "mean": float(df[col].mean()),
+            "std": float(df[col].std()),
+            "min": float(df[col].min()),
+            "25%": float(df[col].quantile(0.25)),
+            "50%": float(df[col].quantile(0.50)),
+            "75%": float(df[col].quantile(0.75)),
+            "max": float(df[col].max())
+        }
+    return summary
+
+
+def legacy_genres(df: pd.DataFrame) -> dict:
+    """Прежний analyze_genres: groupby по строкам жанра и value_counts"""
+    features = [f for f in analysis_service.GENRE_FEATURES if f in df.columns]
+    genre_stats = df.groupby('genre', observed=True)[features].mean()
+    genre_counts = df['genre'].value_counts()
+    return analysis_service._genre_summary(genre_stats, genre_counts, list(df['genre'].unique()), len(df))
+
+
+def legacy_correlations(df: pd.DataFrame, method: str) -> dict:
+    """Прежняя матрица корреляций: DataFrame.corr"""
+    return df[AUDIO_FEATURES + ['popularity']].corr(method).to_dict()
+
+
+def best_time(func, repeats: int) -> float:
+    """Лучшее время из нескольких запусков, мс"""
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return min(times) * 1000
+
+
+def max_relative_error(expected: dict, actual: dict) -> float:
+    """Наибольшее относительное расхождение метрик"""
+    error = 0.0
+    for column, metrics in expected.items():
+        for name, value in metrics.items():
+            if not np.isfinite(value):
+                continue
+            # Для значений около нуля (корреляции) — абсолютное расхождение
+            scale = max(abs(value), 1.0)
+            error = max(error, abs(actual[column][name] - value) / scale)
+    return error
+
+
+def main():
+    repeats = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    path = Path(sys.argv[2]) if len(sys.argv) > 2 else DATASET_PATH
+
+    if not data_service.load_dataset(path):
+        print(f"❌ Не удалось загрузить датасет: {path}")
+        return
+
+    df = data_service.get_dataframe()
+    features = [f for f in DISTRIBUTION_FEATURES if f in df.columns]
+    numeric_cols = df.select_dtypes(include=[np.number]).columns.tolist()
+
+    print("=" * 60)
+    print(f"📊 БЕНЧМАРК /analysis/*: {len(df):,} строк, лучший из {repeats}")
+    print("=" * 60)
+
+    cases = [
+        (f"distributions ({len(features)} призн.)",
+         lambda: legacy_distributions(df, features),
+         lambda: analysis_service.analyze_distributions(df)["distributions"]),
+        (f"summary ({len(numeric_cols)} колонок)",
+         lambda: legacy_summary(df),
+         lambda: analysis_service.get_summary_statistics(df)),
+        ("genres (группировка)",
+         lambda: legacy_genres(df)["genre_statistics"],
+         lambda: analysis_service.analyze_genres(df)["genre_statistics"]),
+        ("correlations (pearson)",
+         lambda: legacy_correlations(df, 'pearson'),
+         lambda: analysis_service.get_correlation_matrix(df).to_dict()),
+        ("correlations (spearman)",
+         lambda: legacy_correlations(df, 'spearman'),
+         lambda: analysis_service.get_correlation_matrix(df, method='spearman').to_dict()),
+    ]
+
+    for name, legacy, kernel in cases:
+        before = best_time(legacy, repeats)
+        after = best_time(kernel, repeats)
+        error = max_relative_error(legacy(), kernel())
+        print(f"{name:28s} pandas: {before:8.1f} мс   ядро: {after:8.1f} мс   "
+              f"×{before / after:5.1f}   расхождение: {error:.1e}")
+
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
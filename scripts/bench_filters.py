@@ -0,0 +1,98 @@
+"""
+Бенчмарк фильтров /analysis/* и /plots/*: булева маска по всем строкам
+(df[...] >= ... & ...) против индекса строк DataService (row_index.py)
+
+Замеряется только получение номеров строк по фильтру; заодно проверяется,
+что индекс отбирает те же строки, что и маска.
+
+Запуск: python scripts/bench_filters.py [число повторов] [путь к CSV]
+"""
+
+import sys
+import time
+from pathlib import Path
+
+# Добавляем корневую папку в путь для импортов
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import numpy as np
+import pandas as pd
+
+from backend.config import DATASET_PATH
+from backend.services.data_service import data_service
+from backend.services.row_index import RowFilter, RowIndex
+
+# Фильтры в виде параметров запроса: (genre, popularity_min, popularity_max, range)
+FILTERS = [
+    ("Rock", 60, None, []),
+    ("Rock", 60, None, ["tempo:100:140"]),
+    ("Pop,Rap", None, 30, ["energy:0.8:"]),
+    (None, 80, None, []),
+    (None, None, None, ["tempo:100:101"]),
+    (None, None, None, ["danceability:0.5:", "loudness::-10"]),
+]
+
+
+def legacy_mask(df: pd.DataFrame, row_filter: RowFilter) -> np.ndarray:
+    """Прежний способ: маска по всем строкам на каждое условие"""
+    mask = pd.Series(True, index=df.index)
+    for column, values in row_filter.values.items():
+        mask &= df[column].isin(values)
+    for column, (low, high) in row_filter.ranges.items():
+        if low is not None:
+            mask &= df[column] >= low
+        if high is not None:
+            mask &= df[column] <= high
+    return np.flatnonzero(mask.to_numpy())
+
+
+def best_time(func, repeats: int) -> float:
+    """Лучшее время из нескольких запусков, мс"""
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return min(times) * 1000
+
+
+def main():
+    repeats = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    path = Path(sys.argv[2]) if len(sys.argv) > 2 else DATASET_PATH
+
+    if not data_service.load_dataset(path):
+        print(f"❌ Не удалось загрузить датасет: {path}")
+        return
+
+    df = data_service.get_dataframe()
+    # Колонки индексируются при первом фильтре по ним: замеряем все сразу
+    filters = [RowFilter.parse(genre.split(",") if genre else None, low, high, ranges)
+               for genre, low, high, ranges in FILTERS]
+    build = best_time(lambda: [RowIndex(df).lookup(row_filter) for row_filter in filters], 1)
+
+    print("=" * 72)
+    print(f"🔎 БЕНЧМАРК ФИЛЬТРОВ: {len(df):,} строк, лучший из {repeats}")
+    print(f"Построение индекса по колонкам фильтров: {build:.0f} мс")
+    print("=" * 72)
+
+    all_match = True
+    for row_filter in filters:
+        before = best_time(lambda: legacy_mask(df, row_filter), repeats)
+        after = best_time(lambda: data_service.filter_rows(row_filter), repeats)
+        rows = data_service.filter_rows(row_filter)
+        match = np.array_equal(rows, legacy_mask(df, row_filter))
+        all_match &= match
+
+        name = ", ".join(
+            f"{column}={value}" for column, value in row_filter.to_dict().items()
+        )
+        print(f"{name[:40]:40s} {len(rows):7,} стр.  маска: {before:6.2f} мс  "
+              f"индекс: {after:6.3f} мс  ×{before / after:5.1f}  {'✓' if match else '✗'}")
+
+    print("=" * 72)
+    print("✓ Строки совпадают" if all_match else "✗ Строки не совпадают")
+    sys.exit(0 if all_match else 1)
+
+
+if __name__ == "__main__":
+    main()
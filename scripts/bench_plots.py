@@ -0,0 +1,81 @@
+"""
+Бенчмарк пропускной способности отрисовки /plots/heatmap
+
+Запускает N одновременных отрисовок тепловой карты (минуя кэш графиков)
+двумя способами:
+  - пул потоков, как у синхронных эндпоинтов FastAPI;
+  - пул процессов PlotService (PLOT_RENDER_WORKERS).
+
+Запуск: python scripts/bench_plots.py [число запросов] [путь к CSV]
+"""
+
+import sys
+import time
+import asyncio
+from pathlib import Path
+
+# Добавляем корневую папку в путь для импортов
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from backend.config import DATASET_PATH, PLOT_RENDER_WORKERS
+from backend.services.data_service import data_service
+from backend.services.analysis_service import analysis_service
+from backend.services.plot_service import plot_service
+
+
+async def run_threadpool(corr_matrix, n_requests: int) -> float:
+    """N одновременных отрисовок в пуле потоков (синхронный эндпоинт)"""
+    loop = asyncio.get_running_loop()
+    start = time.perf_counter()
+    await asyncio.gather(*[
+        loop.run_in_executor(None, plot_service.heatmap_image, corr_matrix)
+        for _ in range(n_requests)
+    ])
+    return time.perf_counter() - start
+
+
+async def run_process_pool(corr_matrix, n_requests: int) -> float:
+    """N одновременных отрисовок в пуле процессов PlotService"""
+    # Прогрев: запуск процессов не входит в замер
+    await asyncio.gather(*[
+        plot_service.heatmap_image_async(corr_matrix)
+        for _ in range(PLOT_RENDER_WORKERS)
+    ])
+
+    start = time.perf_counter()
+    await asyncio.gather(*[
+        plot_service.heatmap_image_async(corr_matrix)
+        for _ in range(n_requests)
+    ])
+    return time.perf_counter() - start
+
+
+def main():
+    n_requests = int(sys.argv[1]) if len(sys.argv) > 1 else 32
+    path = Path(sys.argv[2]) if len(sys.argv) > 2 else DATASET_PATH
+
+    if not data_service.load_dataset(path):
+        print(f"❌ Не удалось загрузить датасет: {path}")
+        return
+
+    corr_matrix = analysis_service.get_correlation_matrix(data_service.get_dataframe())
+
+    print("=" * 60)
+    print(f"🔥 БЕНЧМАРК /plots/heatmap: {n_requests} одновременных запросов")
+    print("=" * 60)
+
+    threads_time = asyncio.run(run_threadpool(corr_matrix, n_requests))
+    print(f"Пул потоков:              {threads_time:6.2f} с  "
+          f"{n_requests / threads_time:6.2f} запросов/с")
+
+    pool_time = asyncio.run(run_process_pool(corr_matrix, n_requests))
+    print(f"Пул процессов ({PLOT_RENDER_WORKERS} шт.):   {pool_time:6.2f} с  "
+          f"{n_requests / pool_time:6.2f} запросов/с")
+
+    plot_service.shutdown()
+    print(f"\n✓ Ускорение: ×{threads_time / pool_time:.2f}")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
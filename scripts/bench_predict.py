@@ -0,0 +1,98 @@
+"""
+Бенчмарк одиночных предсказаний: прежний путь через pandas и sklearn
+против скомпилированных массивов (CompiledPredictor)
+
+Модели берутся из активной версии реестра (data/models/); если реестр
+пуст, они обучаются на датасете.
+
+Запуск: python scripts/bench_predict.py [число вызовов] [путь к CSV]
+"""
+
+import sys
+import time
+from pathlib import Path
+
+# Добавляем корневую папку в путь для импортов
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import numpy as np
+import pandas as pd
+
+from backend.config import DATASET_PATH
+from backend.services.data_service import data_service
+from backend.services.model_service import model_service
+from backend.services.fast_predictor import CompiledPredictor
+
+
+def legacy_predict(model, feature_names: list, features: dict) -> float:
+    """Прежний predict_single: DataFrame из одной строки, fillna, model.predict"""
+    input_df = pd.DataFrame([features])
+    input_df = input_df[feature_names]
+    input_df = input_df.fillna(input_df.median())
+    return float(model.predict(input_df)[0])
+
+
+def load_models():
+    """Модели {ключ: объект sklearn} из реестра или после обучения"""
+    version = model_service.registry.active_version()
+    if version is not None:
+        models = model_service.registry.load_estimators(version)
+        return models, model_service.registry.meta(version)["feature_names"]
+
+    print("Реестр моделей пуст — обучаем модели...")
+    model_service.train_models(data_service.get_dataframe())
+    return model_service.models, model_service.feature_names
+
+
+def time_calls(fn, samples: list, n_calls: int) -> float:
+    """Среднее время одного вызова в микросекундах"""
+    start = time.perf_counter()
+    for i in range(n_calls):
+        fn(samples[i % len(samples)])
+    return (time.perf_counter() - start) / n_calls * 1e6
+
+
+def main():
+    n_calls = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    path = Path(sys.argv[2]) if len(sys.argv) > 2 else DATASET_PATH
+
+    if not data_service.load_dataset(path):
+        print(f"❌ Не удалось загрузить датасет: {path}")
+        return
+
+    models, feature_names = load_models()
+    df = data_service.get_dataframe()
+    samples = df[feature_names].dropna().sample(100, random_state=42)
+    sample_dicts = [
+        {name: float(value) for name, value in row.items()}
+        for _, row in samples.iterrows()
+    ]
+
+    print("=" * 70)
+    print(f"⚡ БЕНЧМАРК ОДИНОЧНЫХ ПРЕДСКАЗАНИЙ ({n_calls} вызовов)")
+    print("=" * 70)
+    print(f"\n{'Модель':24s} {'pandas+sklearn, мкс':>20s} {'компиляция, мкс':>16s} {'ускорение':>10s}")
+    print("-" * 70)
+
+    for key, model in models.items():
+        compiled = CompiledPredictor.from_model(key, feature_names, model)
+        name = compiled.model_used
+
+        # Предсказания должны совпадать с sklearn
+        expected = model.predict(samples)
+        actual = np.array([compiled.predict_one(features) for features in sample_dicts])
+        max_diff = float(np.max(np.abs(expected - actual)))
+
+        # Ансамбли деревьев в sklearn заметно медленнее на одной строке — вызовов меньше
+        calls = n_calls if compiled.is_linear else max(n_calls // 10, 10)
+        legacy = time_calls(lambda f: legacy_predict(model, feature_names, f), sample_dicts, calls)
+        fast = time_calls(compiled.predict_one, sample_dicts, n_calls * 10)
+
+        print(f"{name:24s} {legacy:20.1f} {fast:16.1f} {legacy / fast:9.0f}×")
+        print(f"{'':24s} макс. расхождение с sklearn: {max_diff:.2e}  {compiled.info()}")
+
+    print("=" * 70)
+
+
+if __name__ == "__main__":
+    main()
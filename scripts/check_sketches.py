@@ -0,0 +1,106 @@
+"""
+Проверка точности сливаемых сводок распределений (sketches.py)
+
+Датасет делится на порции, сводки порций строятся параллельно и
+сливаются; отдельно сводка наращивается по одной порции (как при
+добавлении строк). Результат сравнивается с точной статистикой по всем
+строкам (stats_kernel.describe):
+  - моменты и min/max — относительное расхождение не больше 1e-9;
+  - квантили — ошибка ранга не больше KLL_RANK_ERROR (проверяется
+    на 99 долях 0.01..0.99 при нескольких зёрнах сжатия).
+
+Запуск: python scripts/check_sketches.py [строк в порции] [путь к CSV]
+"""
+
+import sys
+import time
+from pathlib import Path
+
+# Добавляем корневую папку в путь для импортов
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import numpy as np
+
+from backend.config import DATASET_PATH, SKETCH_WORKERS
+from backend.services.data_service import data_service
+from backend.services.sketches import DistributionSketch, KLL_RANK_ERROR, sketch_frames
+from backend.services.stats_kernel import describe
+
+MOMENTS = ('count', 'mean', 'std', 'min', 'max', 'skewness', 'kurtosis')
+FRACTIONS = np.linspace(0.01, 0.99, 99)
+SEEDS = 10
+
+
+def rank_error(sorted_values: np.ndarray, estimate: float, fraction: float) -> float:
+    """Расстояние от fraction до диапазона рангов значения estimate"""
+    low = np.searchsorted(sorted_values, estimate, side='left') / len(sorted_values)
+    high = np.searchsorted(sorted_values, estimate, side='right') / len(sorted_values)
+    if low <= fraction <= high:
+        return 0.0
+    return min(abs(low - fraction), abs(high - fraction))
+
+
+def main():
+    chunk_rows = int(sys.argv[1]) if len(sys.argv) > 1 else 20_000
+    path = Path(sys.argv[2]) if len(sys.argv) > 2 else DATASET_PATH
+
+    if not data_service.load_dataset(path):
+        print(f"❌ Не удалось загрузить датасет: {path}")
+        return 1
+
+    df = data_service.get_dataframe()
+    columns = [name for name in df.select_dtypes(include=[np.number]).columns]
+    frames = [df.iloc[start:start + chunk_rows] for start in range(0, len(df), chunk_rows)]
+
+    print("=" * 60)
+    print(f"🧮 ПРОВЕРКА СВОДОК: {len(df):,} строк, {len(frames)} порций, {len(columns)} колонок")
+    print("=" * 60)
+
+    start = time.perf_counter()
+    exact = describe(df, columns)
+    exact_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    parallel = sketch_frames(frames, columns)
+    parallel_time = time.perf_counter() - start
+
+    incremental = DistributionSketch(columns)
+    for frame in frames:
+        incremental.update(frame)
+
+    print(f"Точный расчёт:           {exact_time * 1000:8.1f} мс")
+    print(f"Сводки ({SKETCH_WORKERS} потоков):      {parallel_time * 1000:8.1f} мс")
+
+    ok = True
+    for name, sketch in (("параллельно", parallel), ("по одной порции", incremental)):
+        approx = sketch.statistics()
+        moment_error = max(
+            abs(approx[column][metric] - exact[column][metric]) / max(abs(exact[column][metric]), 1.0)
+            for column in columns for metric in MOMENTS
+            if np.isfinite(exact[column][metric])
+        )
+        passed = moment_error <= 1e-9
+        ok &= passed
+        print(f"{'✓' if passed else '✗'} Моменты ({name}): расхождение {moment_error:.1e}")
+
+    for column in columns:
+        values = np.sort(df[column].dropna().to_numpy(dtype=np.float64))
+        worst = 0.0
+        for seed in range(SEEDS):
+            sketch = sketch_frames(frames, [column], seed=seed).quantile_sketches[0]
+            estimates = sketch.quantiles(FRACTIONS)
+            worst = max(worst, max(
+                rank_error(values, estimate, fraction) for estimate, fraction in zip(estimates, FRACTIONS)
+            ))
+        passed = worst <= KLL_RANK_ERROR
+        ok &= passed
+        print(f"{'✓' if passed else '✗'} Квантили {column:18s} ошибка ранга {worst:.2%} "
+              f"(граница {KLL_RANK_ERROR:.1%})")
+
+    print("=" * 60)
+    print("✓ Все проверки пройдены" if ok else "✗ Есть расхождения сверх границ")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
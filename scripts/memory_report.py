@@ -0,0 +1,60 @@
+"""
+Отчёт о потреблении памяти датасетом: типы pandas по умолчанию
+против схемы DATASET_SCHEMA из backend/config.py
+
+Запуск: python scripts/memory_report.py [путь к CSV]
+"""
+
+import sys
+from pathlib import Path
+
+# Добавляем корневую папку в путь для импортов
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import pandas as pd
+
+from backend.config import DATASET_PATH, DATASET_SCHEMA
+
+
+def memory_by_column(df: pd.DataFrame) -> pd.Series:
+    """Память по колонкам в байтах (с учётом содержимого строк)"""
+    return df.memory_usage(deep=True, index=False)
+
+
+def main():
+    path = Path(sys.argv[1]) if len(sys.argv) > 1 else DATASET_PATH
+
+    if not path.exists():
+        print(f"❌ ОШИБКА: Файл не найден - {path}")
+        return
+
+    print("=" * 70)
+    print("🧮 ПАМЯТЬ ДАТАСЕТА: ДО И ПОСЛЕ СХЕМЫ ТИПОВ")
+    print("=" * 70)
+
+    before_df = pd.read_csv(path)
+    after_df = pd.read_csv(path, dtype=DATASET_SCHEMA)
+
+    before = memory_by_column(before_df)
+    after = memory_by_column(after_df)
+
+    print(f"\n{'Колонка':20s} {'Тип до':>12s} {'Тип после':>12s} {'До, МБ':>10s} {'После, МБ':>10s}")
+    print("-" * 70)
+    for column in before.index:
+        print(f"{column:20s} "
+              f"{str(before_df[column].dtype):>12s} "
+              f"{str(after_df[column].dtype):>12s} "
+              f"{before[column] / 1024 ** 2:10.2f} "
+              f"{after[column] / 1024 ** 2:10.2f}")
+
+    total_before = before.sum() / 1024 ** 2
+    total_after = after.sum() / 1024 ** 2
+    print("-" * 70)
+    print(f"{'ИТОГО':20s} {'':>12s} {'':>12s} {total_before:10.2f} {total_after:10.2f}")
+    print(f"\n✓ Экономия: {total_before - total_after:.2f} МБ "
+          f"({(1 - total_after / total_before) * 100:.1f}%) на каждый воркер")
+    print("=" * 70)
+
+
+if __name__ == "__main__":
+    main()